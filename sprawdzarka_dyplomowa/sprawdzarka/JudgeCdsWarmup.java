@@ -0,0 +1,53 @@
+import java.io.*;
+import java.math.BigInteger;
+import java.util.*;
+import java.util.stream.*;
+
+// Program rozgrzewający do budowy archiwum CDS (jvm.py): używa klas biblioteki standardowej,
+// po które zwykle sięgają rozwiązania, żeby trafiły na listę klas archiwum. Wejście jest puste.
+public class JudgeCdsWarmup {
+    public static void main(String[] args) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+        StringTokenizer tokenizer = new StringTokenizer("1 2 3");
+        StreamTokenizer streamTokenizer = new StreamTokenizer(new StringReader("4 5"));
+        streamTokenizer.nextToken();
+        Scanner scanner = new Scanner(new ByteArrayInputStream("6 7.5 word\nline\n".getBytes()));
+        long sum = scanner.nextInt() + (long) scanner.nextDouble() + scanner.next().length();
+        scanner.nextLine();
+        sum += scanner.nextLine().length() + Integer.parseInt(tokenizer.nextToken()) + Long.parseLong("8");
+        if (reader.readLine() != null) {
+            sum += Arrays.stream(reader.readLine().split(" ")).mapToInt(Integer::parseInt).sum();
+        }
+
+        List<Integer> list = new ArrayList<>(List.of(3, 1, 2));
+        Collections.sort(list);
+        list.sort(Comparator.reverseOrder());
+        int[] array = {3, 1, 2};
+        Arrays.sort(array);
+        long[] longs = new long[4];
+        Arrays.fill(longs, 1L);
+        Map<String, Integer> hashMap = new HashMap<>();
+        hashMap.merge("a", 1, Integer::sum);
+        TreeMap<Integer, Integer> treeMap = new TreeMap<>(hashMap.values().stream().collect(Collectors.toMap(v -> v, v -> v)));
+        Set<Integer> set = new HashSet<>(list);
+        TreeSet<Integer> treeSet = new TreeSet<>(set);
+        Deque<Integer> deque = new ArrayDeque<>(treeSet);
+        PriorityQueue<int[]> heap = new PriorityQueue<>((a, b) -> Integer.compare(a[0], b[0]));
+        heap.add(new int[]{1, 2});
+        LinkedList<Integer> linkedList = new LinkedList<>(deque);
+        BitSet bitSet = new BitSet();
+        bitSet.set(treeMap.firstKey());
+        sum += IntStream.range(0, 10).filter(i -> i % 2 == 0).boxed().collect(Collectors.toList()).size();
+        sum += linkedList.size() + heap.poll()[1] + bitSet.cardinality() + Math.max(1, Math.abs(-2)) + (long) Math.sqrt(16.0);
+        BigInteger big = BigInteger.valueOf(sum).pow(3).mod(BigInteger.TEN);
+
+        StringBuilder builder = new StringBuilder();
+        builder.append(big).append(' ').append(String.format("%.2f", 1.5)).append(String.join(",", "a", "b"));
+        PrintWriter writer = new PrintWriter(new BufferedWriter(new OutputStreamWriter(System.out)));
+        if (builder.length() < 0) {
+            writer.println(builder);
+            System.out.printf("%d%n", sum);
+        }
+        writer.flush();
+    }
+}
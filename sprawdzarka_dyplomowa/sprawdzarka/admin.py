@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     User, Contest, ContestSigned, Lecture, ContestLecture, Task, 
     ContestTask, TestGroup, Test, Solution, SolutionTestResult, 
-    Question, ForumTopic, ForumPost
+    Question, ForumTopic, ForumPost, RejudgeBatch, RejudgeItem
 )
 
 # Register all models with Django admin
@@ -20,3 +20,5 @@ admin.site.register(SolutionTestResult)
 admin.site.register(Question)
 admin.site.register(ForumTopic)
 admin.site.register(ForumPost)
+admin.site.register(RejudgeBatch)
+admin.site.register(RejudgeItem)
@@ -0,0 +1,159 @@
+import json
+import os
+import socket
+import threading
+import uuid
+from django.conf import settings
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows - rezerwacje widzi tylko bieżący proces workera
+    fcntl = None
+
+# Kontrola przyjmowania rozwiązań do oceny po stronie workera. Zanim worker zacznie oceniać
+# rozwiązanie, rezerwuje dla niego rdzenie i pamięć z budżetu hosta (SPRAWDZARKA_ADMISSION_CPUS,
+# SPRAWDZARKA_ADMISSION_MEMORY). Rezerwacje wszystkich procesów workerów na hoście trzymane są
+# we wspólnym pliku (SPRAWDZARKA_ADMISSION_LEDGER) pod blokadą flock; wpisy procesów, które
+# przestały istnieć, są pomijane. Rozwiązanie, które się nie mieści, wraca do kolejki (tasks.py).
+
+_lock = threading.Lock()
+
+
+def host_memory():
+    """Pamięć operacyjna hosta w MB."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+def capacity():
+    """Budżet hosta: (rdzenie, pamięć w MB)."""
+    cpus = settings.SPRAWDZARKA_ADMISSION_CPUS
+    if not cpus and settings.SPRAWDZARKA_CPU_PINNING:
+        # Przy przypinaniu testów do rdzeni budżetem są rdzenie puli
+        from .cpuset import pool_capacity
+        cpus = pool_capacity()
+    return (
+        cpus or os.cpu_count() or 1,
+        settings.SPRAWDZARKA_ADMISSION_MEMORY or host_memory() * 3 // 4
+    )
+
+
+def _alive(pid):
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Proces innego użytkownika - żyje
+    return True
+
+
+class HostLedger:
+    """Plik rezerwacji hosta otwarty pod wyłączną blokadą: {id rezerwacji: rezerwacja z polem 'pid'}."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.file = open(self.path, 'a+')
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            self.file.seek(0)
+            try:
+                reservations = json.loads(self.file.read() or '{}')
+            except ValueError:
+                reservations = {}
+        except BaseException:
+            _lock.release()
+            raise
+        self.reservations = {
+            key: reservation for key, reservation in reservations.items() if _alive(reservation['pid'])
+        }
+        return self
+
+    def save(self):
+        self.file.seek(0)
+        self.file.truncate()
+        json.dump(self.reservations, self.file)
+        self.file.flush()
+
+    def usage(self):
+        return (
+            sum(reservation['cpus'] for reservation in self.reservations.values()),
+            sum(reservation['memory'] for reservation in self.reservations.values())
+        )
+
+    def __exit__(self, *exc_info):
+        try:
+            self.file.close()  # Zamknięcie pliku zwalnia też flock
+        finally:
+            _lock.release()
+
+
+def _publish(ledger):
+    cpus, memory = capacity()
+    used_cpus, used_memory = ledger.usage()
+    metrics.set_worker_value('admission_budget', {
+        'cpus': cpus,
+        'used_cpus': used_cpus,
+        'free_cpus': max(0, cpus - used_cpus),
+        'memory': memory,
+        'used_memory': used_memory,
+        'free_memory': max(0, memory - used_memory),
+        'jobs': len(ledger.reservations),
+    }, worker=socket.gethostname())
+
+
+class Reservation:
+    """Rezerwacja rdzeni i pamięci hosta; zwalniana przy wyjściu z bloku with."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def release(self):
+        with HostLedger(settings.SPRAWDZARKA_ADMISSION_LEDGER) as ledger:
+            ledger.reservations.pop(self.key, None)
+            ledger.save()
+            _publish(ledger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def try_reserve(cpus, memory, label):
+    """Rezerwuje `cpus` rdzeni i `memory` MB albo zwraca None, gdy host nie ma tyle wolnego.
+
+    Żądanie większe niż cały budżet jest do niego przycinane, więc da się je przyjąć na pustym hoście.
+    """
+    total_cpus, total_memory = capacity()
+    cpus = min(cpus, total_cpus)
+    memory = min(memory, total_memory)
+    with HostLedger(settings.SPRAWDZARKA_ADMISSION_LEDGER) as ledger:
+        used_cpus, used_memory = ledger.usage()
+        if used_cpus + cpus > total_cpus or used_memory + memory > total_memory:
+            print(f"Admission: {label} needs {cpus} CPU / {memory} MB, "
+                  f"in use {used_cpus}/{total_cpus} CPU, {used_memory}/{total_memory} MB - deferring")
+            _publish(ledger)
+            return None
+        key = uuid.uuid4().hex
+        ledger.reservations[key] = {'pid': os.getpid(), 'cpus': cpus, 'memory': memory, 'label': label}
+        ledger.save()
+        _publish(ledger)
+    return Reservation(key)
+
+
+def stats():
+    return {
+        'deferred': metrics.get('admission_deferred'),
+        'hosts': metrics.get_worker_values('admission_budget'),
+    }
@@ -0,0 +1,58 @@
+import os
+import shutil
+import time
+import uuid
+from django.conf import settings
+
+# Skompilowane programy przekazywane z etapu kompilacji do etapu uruchamiania testów
+# (SPRAWDZARKA_PIPELINE). Artefakt to katalog w SPRAWDZARKA_ARTIFACT_ROOT - wspólnym dla
+# workerów obu etapów, tak jak katalog media - a jego uchwytem w kolejce jest nazwa katalogu.
+# Artefakty porzucone (np. po awarii workera) usuwa save() po SPRAWDZARKA_ARTIFACT_MAX_AGE.
+
+
+def _path(handle):
+    return os.path.join(settings.SPRAWDZARKA_ARTIFACT_ROOT, handle)
+
+
+def save(workspace, exclude):
+    """Zapisuje pliki powstałe przy kompilacji (wszystko z katalogu poza `exclude`) i zwraca uchwyt."""
+    root = settings.SPRAWDZARKA_ARTIFACT_ROOT
+    os.makedirs(root, exist_ok=True)
+    handle = uuid.uuid4().hex
+    tmp_path = os.path.join(root, f".tmp-{handle}")
+    os.makedirs(tmp_path)
+    try:
+        for name in os.listdir(workspace):
+            path = os.path.join(workspace, name)
+            if name not in exclude and os.path.isfile(path):
+                shutil.copy(path, tmp_path)
+        # Etap uruchamiania nie zobaczy niepełnego artefaktu
+        os.rename(tmp_path, _path(handle))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    remove_expired()
+    return handle
+
+
+def restore(handle, sandbox):
+    """Kopiuje pliki artefaktu do piaskownicy. FileNotFoundError, gdy artefaktu już nie ma."""
+    path = _path(handle)
+    for name in os.listdir(path):
+        sandbox.put(os.path.join(path, name))
+
+
+def remove(handle):
+    shutil.rmtree(_path(handle), ignore_errors=True)
+
+
+def remove_expired():
+    root = settings.SPRAWDZARKA_ARTIFACT_ROOT
+    deadline = time.time() - settings.SPRAWDZARKA_ARTIFACT_MAX_AGE
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(path) < deadline:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            continue
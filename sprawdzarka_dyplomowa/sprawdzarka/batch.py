@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from django.conf import settings
+from . import test_cache
+from .capture import CHUNK_SIZE
+from .checker import iter_tokens
+from .runner import HARNESS, without_overhead
+
+# Tryb wsadowy: jeden proces w piaskownicy (judge_harness.sh) uruchamia program przez judge_runner
+# na wszystkich testach rozwiązania i odsyła po jednej linii werdyktu na test. Wejścia testów
+# podawane są harnessowi na stdin (feed_inputs), a oczekiwane wyjścia w ogóle nie trafiają do
+# piaskownicy - tylko ich skróty.
+MANIFEST_NAME = 'judge_manifest.txt'
+MARKERS_NAME = 'judge_markers.txt'
+HARNESS_PIDS = 5  # sh harnessu i potok porównujący wyjście (cat | tr | md5sum | cut)
+HARNESS_MEMORY = 8  # MB dla procesów harnessu działających obok programu
+
+VERDICT_MESSAGES = {
+    'TLE': "Przekroczenie limitu czasu",
+    'MLE': "Przekroczenie limitu pamięci",
+    'OLE': "Przekroczenie limitu wyjścia",
+}
+
+
+def expected_output_digest(test, path):
+    """Skrót oczekiwanego wyjścia w tej samej postaci, którą harness liczy dla programu."""
+    digest = hashlib.md5(b'\n')
+    with test_cache.open_test_file(test, path) as expected_out:
+        for token in iter_tokens(expected_out):
+            digest.update(token + b'\n')
+    return digest.hexdigest()
+
+
+def feed_inputs(stream, inputs):
+    """Zapisuje kolejno wejścia testów ((test, ścieżka, rozmiar)) na wejście harnessu i je zamyka."""
+    try:
+        for test, path, size in inputs:
+            with test_cache.open_test_file(test, path) as input_file:
+                remaining = size
+                while remaining > 0:
+                    chunk = input_file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    stream.write(chunk)
+                    remaining -= len(chunk)
+    except (BrokenPipeError, OSError, ValueError):
+        pass  # Harness skończył się przed ostatnim testem
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def run_tests_batch(sandbox, run_command, grouped_tests, ungrouped_tests, test_folder, results, time_limit, time_overhead=0,
+                    memory_error_markers=()):
+    """Uruchamia wszystkie testy w jednej sesji piaskownicy.
+
+    Zwraca nazwy zaliczonych grup i liczbę zaliczonych testów niepogrupowanych,
+    tak samo jak run_tests w trybie test po teście.
+    """
+    entries = [
+        (test, str(index))
+        for index, tests in enumerate(grouped_tests.values())
+        for test in tests
+    ] + [(test, '-') for test in ungrouped_tests]
+    tests_by_id = {test.id: test for test, _ in entries}
+
+    verdicts = {}
+    manifest_path = os.path.join(sandbox.workspace, MANIFEST_NAME)
+    markers_path = os.path.join(sandbox.workspace, MARKERS_NAME)
+    try:
+        manifest_lines = []
+        inputs = []
+        for test, group in entries:
+            input_path = os.path.join(test_folder, test.name, test.in_file)
+            input_size = os.path.getsize(input_path)
+            expected_digest = expected_output_digest(test, os.path.join(test_folder, test.name, test.out_file))
+            manifest_lines.append(f"{test.id} {group} {expected_digest} {input_size}\n")
+            inputs.append((test, input_path, input_size))
+
+        with open(manifest_path, 'w') as manifest:
+            manifest.writelines(manifest_lines)
+        with open(markers_path, 'w') as markers:
+            markers.writelines(f"{marker}\n" for marker in memory_error_markers)
+
+        process = sandbox.spawn(
+            ["sh", HARNESS, str(time_limit * 1000 + time_overhead), str(settings.SPRAWDZARKA_OUTPUT_LIMIT), MANIFEST_NAME, MARKERS_NAME] + run_command,
+            stdin=True
+        )
+        threading.Thread(target=feed_inputs, args=(process.stdin.buffer, inputs), daemon=True).start()
+        # Awaryjny limit na całą sesję, gdyby harness sam się zawiesił
+        watchdog = threading.Timer((time_limit + 5) * len(entries) + 30, process.kill)
+        watchdog.start()
+        try:
+            for line in process.stdout:
+                test_id, verdict, cpu_ms, wall_ms, peak_kb, code = line.split()
+                test = tests_by_id[int(test_id)]
+                if verdict == 'SKIP':
+                    print(f"Skipping test {test.name}: group already failed")
+                    continue
+
+                results.add(
+                    test, verdict == 'OK', verdict,
+                    time=without_overhead(int(cpu_ms), time_overhead),
+                    wall_time=without_overhead(int(wall_ms), time_overhead),
+                    memory=int(peak_kb)
+                )
+                verdicts[test.id] = verdict
+                print(f"Result for {test.name}: {VERDICT_MESSAGES.get(verdict, verdict)} (exit code {code}, CPU {cpu_ms} ms, {peak_kb} KB)")
+            process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        if len(verdicts) < len(entries) and process.returncode != 0:
+            print(f"Batch harness exited with code {process.returncode} before finishing all tests")
+            results.mark_unclean()
+            sandbox.kill_processes()
+    finally:
+        try:
+            for path in (manifest_path, markers_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        except Exception as cleanup_error:
+            print(f"Error during cleanup: {cleanup_error}")
+
+    passed_groups = [
+        group_name for group_name, tests in grouped_tests.items()
+        if all(verdicts.get(test.id) == 'OK' for test in tests)
+    ]
+    ungrouped_tests_passed = sum(1 for test in ungrouped_tests if verdicts.get(test.id) == 'OK')
+    return passed_groups, ungrouped_tests_passed
@@ -0,0 +1,121 @@
+import subprocess
+import tempfile
+import threading
+from django.conf import settings
+
+# Przechwytywanie wyjścia programu z testu z ograniczonym zużyciem pamięci workera:
+# stdout do SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD bajtów w pamięci, dalej w pliku tymczasowym,
+# a po przekroczeniu limitu proces jest od razu zabijany.
+CHUNK_SIZE = 64 * 1024
+STDERR_LIMIT = 64 * 1024  # Tyle bajtów stderr zostaje do logu i rozpoznawania błędów pamięci
+
+
+class CapturedOutput:
+    """Wynik procesu: `stdout` to plik ustawiony na początek, `stderr` to (przycięty) tekst."""
+
+    def __init__(self, returncode, stdout, stderr, output_exceeded):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.output_exceeded = output_exceeded
+
+    def close(self):
+        self.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_stderr(stream, chunks):
+    size = 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        if size < STDERR_LIMIT:
+            chunks.append(chunk[:STDERR_LIMIT - size])
+            size += len(chunk)
+
+
+def _feed_stdin(pipe, source):
+    try:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            pipe.write(chunk)
+    except (BrokenPipeError, ValueError):
+        pass  # Program skończył się, zanim przeczytał całe wejście
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_bounded(args, stdin=None, timeout=None, output_limit=None, on_limit=None, env=None):
+    """Uruchamia proces, przechwytując co najwyżej `output_limit` bajtów stdout.
+
+    `stdin` to plik albo obiekt z metodą read() bez deskryptora (np. plik testu z pamięci
+    podręcznej) - wtedy wejście jest podawane przez potok z osobnego wątku.
+    Po przekroczeniu limitu proces jest zabijany, a `on_limit` (np. zabicie procesów
+    w piaskownicy) wywoływane. Po upływie `timeout` rzuca subprocess.TimeoutExpired.
+    """
+    if output_limit is None:
+        output_limit = settings.SPRAWDZARKA_OUTPUT_LIMIT
+    stdin_source = None
+    if stdin is not None and not hasattr(stdin, 'fileno'):
+        stdin_source, stdin = stdin, subprocess.PIPE
+    process = subprocess.Popen(
+        args,
+        stdin=stdin if stdin is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env
+    )
+    if stdin_source is not None:
+        threading.Thread(target=_feed_stdin, args=(process.stdin, stdin_source), daemon=True).start()
+    stdout = tempfile.SpooledTemporaryFile(max_size=settings.SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD)
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=_read_stderr, args=(process.stderr, stderr_chunks), daemon=True)
+    stderr_reader.start()
+
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(timeout, on_timeout) if timeout is not None else None
+    if watchdog is not None:
+        watchdog.start()
+
+    output_exceeded = False
+    size = 0
+    try:
+        for chunk in iter(lambda: process.stdout.read1(CHUNK_SIZE), b''):
+            if size + len(chunk) > output_limit:
+                stdout.write(chunk[:output_limit - size])
+                output_exceeded = True
+                process.kill()
+                if on_limit is not None:
+                    on_limit()
+                break
+            stdout.write(chunk)
+            size += len(chunk)
+        process.stdout.close()
+        process.wait()
+        stderr_reader.join()
+    except BaseException:
+        stdout.close()
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+
+    if timed_out.is_set():
+        stdout.close()
+        raise subprocess.TimeoutExpired(args, timeout)
+
+    stdout.seek(0)
+    stderr = b''.join(stderr_chunks).decode(errors='replace')
+    return CapturedOutput(process.returncode, stdout, stderr, output_exceeded)
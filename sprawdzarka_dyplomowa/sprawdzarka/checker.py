@@ -0,0 +1,54 @@
+from itertools import zip_longest
+
+# Porównywanie wyjścia programu z oczekiwanym token po tokenie (tokeny rozdzielone białymi znakami),
+# bez wczytywania całych plików do pamięci.
+CHUNK_SIZE = 64 * 1024
+TOKEN_PREVIEW = 50  # Tyle bajtów różniącego się tokenu trafia do logu
+
+
+def iter_tokens(stream, chunk_size=CHUNK_SIZE):
+    """Zwraca kolejne tokeny (bytes) ze strumienia binarnego, czytając go kawałkami."""
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk
+        tokens = data.split()
+        # Token na końcu kawałka może być ucięty - czekamy z nim na następny kawałek
+        if tokens and not data[-1:].isspace():
+            pending = tokens.pop()
+        else:
+            pending = b''
+        yield from tokens
+    if pending:
+        yield pending
+
+
+def first_difference(output, expected):
+    """Porównuje dwa strumienie binarne i kończy na pierwszym różnym tokenie.
+
+    Zwraca None, gdy strumienie są równe, a w przeciwnym razie słownik z numerem
+    (od 1) pierwszego różnego tokenu oraz tokenami z obu stron (None, gdy strumień się skończył).
+    """
+    pairs = zip_longest(iter_tokens(output), iter_tokens(expected))
+    for position, (output_token, expected_token) in enumerate(pairs, start=1):
+        if output_token != expected_token:
+            return {
+                'position': position,
+                'output': output_token,
+                'expected': expected_token,
+            }
+    return None
+
+
+def describe_difference(difference):
+    def preview(token):
+        if token is None:
+            return "<koniec wyjścia>"
+        return repr(token[:TOKEN_PREVIEW])[2:-1]
+
+    return (
+        f"first difference at token {difference['position']}: "
+        f"got {preview(difference['output'])}, expected {preview(difference['expected'])}"
+    )
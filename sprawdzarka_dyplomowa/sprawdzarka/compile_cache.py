@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+import uuid
+from django.conf import settings
+from . import metrics
+from .fingerprint import file_hash
+from .sandbox import image_digest
+
+# Pamięć podręczna skompilowanych programów, wspólna dla workerów na jednym hoście.
+# Każdy wpis to katalog z plikami wynikowymi kompilacji; czas modyfikacji katalogu służy do LRU.
+
+
+def make_key(src_path, lang, image, compile_command):
+    key = hashlib.sha256()
+    for part in (file_hash(src_path), lang, image_digest(image), *compile_command):
+        key.update(part.encode())
+        key.update(b'\0')
+    return key.hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(settings.SPRAWDZARKA_COMPILE_CACHE_ROOT, key)
+
+
+def _entry_size(path):
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+    )
+
+
+def restore(key, sandbox):
+    """Kopiuje zapamiętane pliki do piaskownicy. Zwraca False, gdy wpisu nie ma."""
+    if not settings.SPRAWDZARKA_COMPILE_CACHE:
+        return False
+
+    path = _entry_path(key)
+    try:
+        for name in os.listdir(path):
+            sandbox.put(os.path.join(path, name))
+        os.utime(path)  # Odświeżenie pozycji w LRU
+    except FileNotFoundError:
+        metrics.incr('compile_cache_misses')
+        return False
+    except Exception as e:
+        print(f"Could not restore compilation cache entry {key}: {e}")
+        metrics.incr('compile_cache_misses')
+        return False
+
+    metrics.incr('compile_cache_hits')
+    return True
+
+
+def store(key, workspace, exclude):
+    """Zapamiętuje pliki powstałe przy kompilacji (wszystko z katalogu poza `exclude`)."""
+    if not settings.SPRAWDZARKA_COMPILE_CACHE:
+        return
+
+    root = settings.SPRAWDZARKA_COMPILE_CACHE_ROOT
+    tmp_path = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+    try:
+        os.makedirs(tmp_path)
+        for name in os.listdir(workspace):
+            path = os.path.join(workspace, name)
+            if name not in exclude and os.path.isfile(path):
+                shutil.copy(path, tmp_path)
+        # Zmiana nazwy jest atomowa, więc inne workery nie zobaczą niepełnego wpisu
+        os.rename(tmp_path, _entry_path(key))
+    except OSError as e:
+        if os.path.isdir(_entry_path(key)):
+            print(f"Compilation cache entry {key} already stored by another worker.")
+        else:
+            print(f"Could not store compilation cache entry {key}: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+
+    evict()
+
+
+def evict():
+    """Usuwa najdawniej używane wpisy, aż rozmiar pamięci zmieści się w limicie."""
+    root = settings.SPRAWDZARKA_COMPILE_CACHE_ROOT
+    limit = settings.SPRAWDZARKA_COMPILE_CACHE_SIZE * 1024 * 1024
+
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _entry_size(path), path))
+        except FileNotFoundError:
+            continue
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+        metrics.incr('compile_cache_evictions')
+
+    metrics.set_value('compile_cache_bytes', total_size)
+
+
+def stats():
+    hits = metrics.get('compile_cache_hits')
+    misses = metrics.get('compile_cache_misses')
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        'evictions': metrics.get('compile_cache_evictions'),
+        'bytes': metrics.get('compile_cache_bytes'),
+    }
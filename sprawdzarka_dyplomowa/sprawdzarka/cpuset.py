@@ -0,0 +1,129 @@
+import os
+import time
+import uuid
+from django.conf import settings
+from .admission import HostLedger
+
+# Przypinanie piaskownic z testami do rdzeni (SPRAWDZARKA_CPU_PINNING). Każda piaskownica
+# uruchamiająca testy dostaje na czas oceniania rozwiązania własny rdzeń z puli hosta
+# (SPRAWDZARKA_CPU_PINNING_CPUS), więc równoległe testy nie zabierają sobie czasu procesora.
+# Z SPRAWDZARKA_CPU_PINNING_SIBLINGS rezerwowane są też rdzenie logiczne (hyperthreading)
+# dzielące z nim rdzeń fizyczny - stoją wtedy bezczynnie. Przydział rdzeni wszystkich procesów
+# workerów na hoście trzymany jest w pliku SPRAWDZARKA_CPU_PINNING_LEDGER.
+
+POLL_INTERVAL = 0.02  # s między próbami, gdy wszystkie rdzenie puli są zajęte
+
+
+def parse_cpu_list(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def online_cpus():
+    """Rdzenie logiczne hosta w formacie listy cpuset (np. '0-7')."""
+    try:
+        with open('/sys/devices/system/cpu/online') as online:
+            return online.read().strip()
+    except OSError:
+        return f"0-{(os.cpu_count() or 1) - 1}"
+
+
+def siblings(cpu):
+    """Rdzenie logiczne dzielące z `cpu` rdzeń fizyczny (razem z nim)."""
+    try:
+        with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as siblings_list:
+            return set(parse_cpu_list(siblings_list.read()))
+    except (OSError, ValueError):
+        return {cpu}
+
+
+def pool():
+    """Rdzenie, które można przydzielać testom."""
+    if settings.SPRAWDZARKA_CPU_PINNING_CPUS:
+        return sorted(parse_cpu_list(settings.SPRAWDZARKA_CPU_PINNING_CPUS))
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pool_capacity():
+    """Ile testów naraz da się przypiąć do osobnych rdzeni puli."""
+    cpus = set(pool())
+    if not settings.SPRAWDZARKA_CPU_PINNING_SIBLINGS:
+        return len(cpus)
+    physical = set()
+    for cpu in cpus:
+        physical.add(min(siblings(cpu) & cpus))
+    return len(physical)
+
+
+def _pick(cpus, held):
+    """Wybiera wolny rdzeń: zwraca (rdzeń, zbiór rdzeni do zajęcia) albo None, gdy nic nie ma."""
+    free = [cpu for cpu in cpus if cpu not in held]
+    # Najpierw rdzenie, których rodzeństwo jest wolne - nawet bez rezerwacji nie dzielą rdzenia fizycznego
+    free.sort(key=lambda cpu: (bool((siblings(cpu) & cpus) & held), cpu))
+    for cpu in free:
+        taken = {cpu}
+        if settings.SPRAWDZARKA_CPU_PINNING_SIBLINGS:
+            taken |= siblings(cpu) & cpus
+            if taken & held:
+                continue
+        return cpu, taken
+    return None
+
+
+class Allocation:
+    """Rdzenie przydzielone jednemu rozwiązaniu; `cores` to rdzenie (napisy cpuset) dla kolejnych piaskownic."""
+
+    def __init__(self, key, cores):
+        self.key = key
+        self.cores = cores
+
+    def release(self):
+        with HostLedger(settings.SPRAWDZARKA_CPU_PINNING_LEDGER) as ledger:
+            ledger.reservations.pop(self.key, None)
+            ledger.save()
+
+
+def allocate(stack, count):
+    """Przydziela od 1 do `count` rdzeni (zwalnianych razem z `stack`) i zwraca ich listę cpuset,
+    albo None, gdy przypinanie jest wyłączone.
+
+    Czeka, aż zwolni się choć jeden rdzeń. Wszystkie rdzenie rozwiązania przydzielane są naraz,
+    więc rozwiązania nie czekają na siebie nawzajem, trzymając część rdzeni.
+    """
+    if not settings.SPRAWDZARKA_CPU_PINNING:
+        return None
+    cpus = set(pool())
+    while True:
+        with HostLedger(settings.SPRAWDZARKA_CPU_PINNING_LEDGER) as ledger:
+            held = set()
+            for reservation in ledger.reservations.values():
+                held.update(reservation['cpus'])
+            cores = []
+            while len(cores) < count:
+                picked = _pick(cpus, held)
+                if picked is None:
+                    break
+                held |= picked[1]
+                cores.append(picked)
+            if cores:
+                key = uuid.uuid4().hex
+                ledger.reservations[key] = {
+                    'pid': os.getpid(),
+                    'cpus': sorted(cpu for _, taken in cores for cpu in taken),
+                }
+                ledger.save()
+                break
+        time.sleep(POLL_INTERVAL)
+
+    allocation = Allocation(key, [str(cpu) for cpu, _ in cores])
+    stack.callback(allocation.release)
+    print(f"Pinned to cores: {', '.join(allocation.cores)}")
+    return allocation.cores
@@ -0,0 +1,118 @@
+import math
+from collections import Counter, defaultdict, deque
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Solution
+
+# Przekazywanie rozwiązań do oceny. Kolejkę (osobną dla każdego języka) wybierają
+# trasy z sprawdzarka_dyplomowa/celery.py, a tutaj ustalany jest priorytet (0 = najważniejszy).
+#
+# Przed Celery stoi sprawiedliwe kolejkowanie: nowe rozwiązanie czeka w bazie (status 'waiting',
+# bez dispatched_at), a dispatch_pending przekazuje czekające rozwiązania na zmianę po jednym
+# od każdego autora, pilnując limitu ocenianych naraz rozwiązań autora w kursie.
+JUDGE_TASKS = {
+    'C/C++': 'sprawdzarka.tasks.execute_cpp',
+    'Java': 'sprawdzarka.tasks.execute_java',
+    'C#': 'sprawdzarka.tasks.execute_cs',
+}
+
+PRIORITY_CONTEST = 0  # Trwający kurs z terminem - wyniki potrzebne od razu
+PRIORITY_PRACTICE = 3  # Kurs bez terminu (ćwiczenia)
+PRIORITY_REJUDGE = 6  # Ponowne ocenianie, gdy nikt nie czeka na wynik
+
+ACTIVE_STATUSES = ['waiting', 'testing']
+
+
+def submission_priority(contest):
+    """Priorytet zgłoszenia: trwający kurs z terminem przed ćwiczeniami."""
+    today = timezone.localdate()
+    if contest.end_date and (not contest.start_date or contest.start_date <= today) and today <= contest.end_date:
+        return PRIORITY_CONTEST
+    return PRIORITY_PRACTICE
+
+
+def send_to_judge(solution, priority, rejudge_item_id=None):
+    kwargs = {'rejudge_item_id': rejudge_item_id} if rejudge_item_id is not None else {}
+    current_app.send_task(JUDGE_TASKS[solution.lang], args=(solution.id,), kwargs=kwargs, priority=priority)
+
+
+def in_flight_since():
+    """Rozwiązanie przekazane przed tą chwilą i wciąż nieocenione (np. po awarii workera) nie jest
+    już liczone jako oceniane - nie blokuje autora ani w limicie naraz ocenianych, ani w limicie wysyłek."""
+    return timezone.now() - timedelta(seconds=settings.SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT_TIMEOUT)
+
+
+def pending_count(author, contest):
+    """Liczba rozwiązań autora w kursie, które czekają na ocenę lub są oceniane."""
+    return Solution.objects.filter(author=author, contest_task__contest=contest, status__in=ACTIVE_STATUSES).filter(
+        Q(status='waiting', dispatched_at__isnull=True) | Q(dispatched_at__gte=in_flight_since())
+    ).count()
+
+
+def enqueue_solution(solution):
+    """Ustawia zapisane rozwiązanie (status 'waiting') w kolejce do oceny."""
+    dispatch_pending()
+
+
+def dispatch_pending():
+    """Przekazuje do Celery czekające rozwiązania, które mieszczą się w limitach autorów."""
+    cap = settings.SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT
+    now = timezone.now()
+
+    in_flight = Counter({
+        (row['author_id'], row['contest_task__contest_id']): row['count']
+        for row in Solution.objects.filter(
+            status__in=ACTIVE_STATUSES, dispatched_at__gte=in_flight_since()
+        ).values('author_id', 'contest_task__contest_id').annotate(count=Count('id'))
+    })
+
+    pending = Solution.objects.filter(
+        status='waiting', dispatched_at__isnull=True
+    ).select_related('contest_task__contest').order_by('send_date', 'id')[:settings.SPRAWDZARKA_FAIR_SHARE_SCAN]
+
+    # Kolejka każdego autora w kolejności wysłania; autorzy w kolejności ich najstarszego zgłoszenia
+    queues = defaultdict(deque)
+    for solution in pending:
+        queues[solution.author_id].append(solution)
+
+    while queues:
+        for author_id in list(queues):
+            queue = queues[author_id]
+            solution = next(
+                (s for s in queue if in_flight[(author_id, s.contest_task.contest_id)] < cap),
+                None
+            )
+            if solution is None:
+                del queues[author_id]
+                continue
+            queue.remove(solution)
+            if not queue:
+                del queues[author_id]
+
+            # Warunkowa aktualizacja - rozwiązanie przekazuje tylko jeden z równoległych dispatcherów
+            if not Solution.objects.filter(id=solution.id, dispatched_at__isnull=True).update(dispatched_at=now):
+                continue
+            in_flight[(author_id, solution.contest_task.contest_id)] += 1
+            send_to_judge(solution, submission_priority(solution.contest_task.contest))
+
+
+def queue_wait_p95(since):
+    """95. percentyl czasu oczekiwania na ocenę (w sekundach) dla każdego autora od `since`."""
+    waits = defaultdict(list)
+    rows = Solution.objects.filter(
+        judging_started_at__isnull=False, send_date__gte=since
+    ).values_list('author__username', 'send_date', 'judging_started_at')
+    for username, send_date, judging_started_at in rows:
+        waits[username].append((judging_started_at - send_date).total_seconds())
+
+    report = {}
+    for username, values in waits.items():
+        values.sort()
+        report[username] = {
+            'solutions': len(values),
+            'wait_p95': values[max(0, math.ceil(0.95 * len(values)) - 1)],
+        }
+    return report
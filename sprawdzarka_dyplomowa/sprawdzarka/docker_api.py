@@ -0,0 +1,448 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import urllib.parse
+import uuid
+from django.conf import settings
+from .capture import CHUNK_SIZE, STDERR_LIMIT, CapturedOutput
+from .sandbox import DOCKER_TIMEOUT, tools_mount
+
+# Piaskownica rozmawiająca z demonem Dockera bezpośrednio przez Engine API na gnieździe
+# uniksowym, zamiast uruchamiać polecenie `docker` dla każdej kompilacji i testu.
+# Połączenia HTTP są utrzymywane w puli (na proces workera), a każde polecenie to osobny
+# kontener: create, attach (stdin/stdout/stderr), start, wait, remove.
+# Do lokalnego sprawdzania bez Dockera służy `manage.py fake_docker_daemon`.
+
+STDOUT, STDERR = 1, 2  # Numery strumieni w multipleksowanym wyjściu attach
+
+
+class DockerApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=DOCKER_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class AttachedStream:
+    """Przejęte połączenie attach: wejście kontenera do zapisu, wyjście jako ramki (strumień, dane)."""
+
+    def __init__(self, sock, buffered):
+        self.sock = sock
+        self.buffer = buffered
+
+    def feed(self, source):
+        """Przesyła całe `source` (plik albo obiekt z read()) na wejście programu i je zamyka."""
+        try:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                self.sock.sendall(chunk)
+        except (BrokenPipeError, ConnectionResetError, ValueError, OSError):
+            pass  # Program skończył się, zanim przeczytał całe wejście
+        finally:
+            try:
+                self.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def _read_exactly(self, size):
+        while len(self.buffer) < size:
+            chunk = self.sock.recv(max(CHUNK_SIZE, size - len(self.buffer)))
+            if not chunk:
+                return None
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def frames(self):
+        while True:
+            header = self._read_exactly(8)
+            if header is None:
+                return
+            stream_type, size = header[0], struct.unpack('>I', header[4:])[0]
+            data = self._read_exactly(size)
+            if data is None:
+                return
+            yield stream_type, data
+
+    def close(self):
+        self.sock.close()
+
+
+class DockerClient:
+    """Klient Engine API z pulą utrzymywanych połączeń (bezpieczny dla wątków)."""
+
+    def __init__(self, socket_path, api_version, pool_size):
+        self.socket_path = socket_path
+        self.prefix = f"/{api_version}" if api_version else ""
+        self.pool_size = pool_size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return UnixHTTPConnection(self.socket_path), False
+
+    def _release(self, connection):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def _url(self, path, params=None):
+        url = self.prefix + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        return url
+
+    def request(self, method, path, params=None, body=None):
+        """Wysyła zapytanie i zwraca zdekodowaną odpowiedź JSON (None dla pustej)."""
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in range(2):
+            connection, reused = self._acquire()
+            try:
+                connection.request(method, self._url(path, params), body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                # Demon zamknął bezczynne połączenie z puli - ponawiamy na nowym
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            if response.status >= 400:
+                try:
+                    message = json.loads(data).get('message', data)
+                except ValueError:
+                    message = data.decode(errors='replace')
+                raise DockerApiError(response.status, message)
+            return json.loads(data) if data else None
+
+    def create_container(self, config, name=None):
+        return self.request('POST', '/containers/create', {'name': name} if name else None, config)['Id']
+
+    def attach(self, container_id, stdin):
+        """Przejmuje połączenie attach (przed startem kontenera, żeby nie zgubić wyjścia)."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(None)
+        sock.connect(self.socket_path)
+        params = {'stream': 1, 'stdin': int(stdin), 'stdout': 1, 'stderr': 1}
+        sock.sendall(
+            f"POST {self._url(f'/containers/{container_id}/attach', params)} HTTP/1.1\r\n"
+            "Host: docker\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n".encode()
+        )
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                raise DockerApiError(0, "attach connection closed")
+            response += chunk
+        head, buffered = response.split(b'\r\n\r\n', 1)
+        status = int(head.split(b' ', 2)[1])
+        if status not in (101, 200):
+            sock.close()
+            raise DockerApiError(status, head.decode(errors='replace'))
+        return AttachedStream(sock, buffered)
+
+    def start(self, container_id):
+        self.request('POST', f'/containers/{container_id}/start')
+
+    def wait(self, container_id):
+        return self.request('POST', f'/containers/{container_id}/wait')['StatusCode']
+
+    def kill(self, container_id):
+        try:
+            self.request('POST', f'/containers/{container_id}/kill')
+        except DockerApiError as e:
+            # 404 - kontener już usunięty, 409 - już nie działa
+            if e.status not in (404, 409):
+                raise
+
+    def remove(self, container_id):
+        try:
+            self.request('DELETE', f'/containers/{container_id}', {'force': 1})
+        except DockerApiError as e:
+            if e.status != 404:
+                raise
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Klient procesu workera (po forku tworzony od nowa, żeby nie dzielić połączeń z rodzicem)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = DockerClient(
+                settings.SPRAWDZARKA_DOCKER_SOCKET,
+                settings.SPRAWDZARKA_DOCKER_API_VERSION,
+                settings.SPRAWDZARKA_DOCKER_API_POOL_SIZE
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def _container_name():
+    return f"sprawdzarka-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _stop(name, container_id):
+    """Zatrzymuje kontener polecenia; przed startem (albo zanim powstał) usuwa go po nazwie,
+    bo kill nie działa na kontenerze, który jeszcze nie wystartował."""
+    try:
+        if container_id is not None:
+            get_client().kill(container_id)
+        else:
+            get_client().remove(name)
+    except Exception as e:
+        print(f"Could not stop container {name}: {e}")
+
+
+class ApiProcess:
+    """Polecenie uruchomione przez spawn(): wyjście czytane na bieżąco z `stdout`, a wejście
+    (przy `stdin`) zapisywane do `stdin.buffer`, jak w Popen."""
+
+    def __init__(self, sandbox, command, stdin=False):
+        read_fd, write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, 'r')
+        self.returncode = None
+        self.container_id = None
+        self.name = _container_name()
+        self._killed = False
+        self._sink = os.fdopen(write_fd, 'wb')
+        source = None
+        self.stdin = None
+        if stdin:
+            source_fd, stdin_fd = os.pipe()
+            source = os.fdopen(source_fd, 'rb')
+            self.stdin = open(stdin_fd, 'w')
+        self._thread = threading.Thread(target=self._run, args=(sandbox, command, source), daemon=True)
+        self._thread.start()
+
+    def _run(self, sandbox, command, source):
+        try:
+            self.returncode = sandbox._run(command, source, self._on_start, self._sink.write, lambda data: None, self.name)
+        except Exception as e:
+            print(f"Docker API command failed: {e}")
+            self.returncode = -1
+        finally:
+            self._sink.close()
+            if source is not None:
+                source.close()
+
+    def _on_start(self, container_id):
+        self.container_id = container_id
+        if self._killed:
+            _stop(self.name, container_id)
+
+    def poll(self):
+        return None if self._thread.is_alive() else self.returncode
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.poll()
+
+    def kill(self):
+        self._killed = True
+        _stop(self.name, self.container_id)
+
+
+class DockerApiSandbox:
+    """Jak DockerRunSandbox (osobny kontener na polecenie), ale przez Engine API zamiast `docker run`."""
+
+    backend = 'docker-api'
+
+    def __init__(self, image, workspace):
+        self.image = image
+        self.workspace = workspace
+        self.memory_limit = None
+        self.pids_limit = None
+        self.cpuset = None
+        self.running = set()
+        self.running_lock = threading.Lock()
+
+    def put(self, path, name=None):
+        target = os.path.join(self.workspace, name or os.path.basename(path))
+        if os.path.abspath(path) != os.path.abspath(target):
+            shutil.copy(path, target)
+        return target
+
+    def set_limits(self, memory_limit, pids_limit):
+        self.memory_limit = memory_limit
+        self.pids_limit = pids_limit
+
+    def set_cpuset(self, cpus):
+        self.cpuset = cpus
+
+    def _config(self, command, interactive):
+        host_config = {
+            'Binds': [f"{os.path.abspath(self.workspace)}:/app", tools_mount()],
+            'NetworkMode': 'none',
+        }
+        if self.pids_limit:
+            host_config['PidsLimit'] = self.pids_limit
+        if self.memory_limit:
+            host_config['Memory'] = self.memory_limit * 1024 * 1024
+            host_config['MemorySwap'] = self.memory_limit * 1024 * 1024
+        if self.cpuset:
+            host_config['CpusetCpus'] = self.cpuset
+        return {
+            'Image': self.image,
+            'Cmd': command,
+            'WorkingDir': '/app',
+            'AttachStdin': interactive,
+            'AttachStdout': True,
+            'AttachStderr': True,
+            'OpenStdin': interactive,
+            'StdinOnce': interactive,
+            'Tty': False,
+            'NetworkDisabled': True,
+            'Labels': {'sprawdzarka.sandbox': '1'},
+            'HostConfig': host_config,
+        }
+
+    def _run(self, command, stdin, on_start, on_stdout, on_stderr, name=None):
+        """Uruchamia polecenie w nowym kontenerze i zwraca kod wyjścia; wyjście trafia do `on_stdout`/`on_stderr`."""
+        client = get_client()
+        print(f"Executing Docker API command: {' '.join(command)}")
+        container_id = client.create_container(self._config(command, stdin is not None), name=name or _container_name())
+        with self.running_lock:
+            self.running.add(container_id)
+        try:
+            stream = client.attach(container_id, stdin is not None)
+            try:
+                client.start(container_id)
+                on_start(container_id)
+                if stdin is not None:
+                    threading.Thread(target=stream.feed, args=(stdin,), daemon=True).start()
+                for stream_type, data in stream.frames():
+                    if stream_type == STDERR:
+                        on_stderr(data)
+                    elif on_stdout(data) is False:
+                        break
+            finally:
+                stream.close()
+            return client.wait(container_id)
+        finally:
+            with self.running_lock:
+                self.running.discard(container_id)
+            client.remove(container_id)
+
+    def _run_with_timeout(self, command, stdin, timeout, on_stdout, on_stderr):
+        timed_out = threading.Event()
+        name = _container_name()
+        started = []
+
+        def on_start(container_id):
+            started.append(container_id)
+            # Czas minął, zanim kontener wystartował - on_timeout mógł go jeszcze nie zastać
+            if timed_out.is_set():
+                _stop(name, container_id)
+
+        def on_timeout():
+            timed_out.set()
+            _stop(name, started[0] if started else None)
+
+        watchdog = threading.Timer(timeout, on_timeout) if timeout is not None else None
+        if watchdog is not None:
+            watchdog.start()
+        try:
+            returncode = self._run(command, stdin, on_start, on_stdout, on_stderr, name)
+        except DockerApiError:
+            # Kontener usunięty po upływie czasu jeszcze przed startem
+            if not timed_out.is_set():
+                raise
+            returncode = None
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, timeout)
+        return returncode
+
+    def execute(self, command, stdin=None, timeout=None):
+        stdout, stderr = [], []
+        returncode = self._run_with_timeout(command, stdin, timeout, stdout.append, stderr.append)
+        return subprocess.CompletedProcess(
+            command, returncode,
+            b''.join(stdout).decode(errors='replace'),
+            b''.join(stderr).decode(errors='replace')
+        )
+
+    def execute_bounded(self, command, stdin=None, timeout=None, output_limit=None):
+        """Jak capture.run_bounded: stdout do pliku z limitem, przycięty stderr, TimeoutExpired po czasie."""
+        if output_limit is None:
+            output_limit = settings.SPRAWDZARKA_OUTPUT_LIMIT
+        stdout = tempfile.SpooledTemporaryFile(max_size=settings.SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD)
+        stderr_chunks = []
+        state = {'size': 0, 'stderr_size': 0, 'exceeded': False}
+
+        def on_stdout(data):
+            if state['size'] + len(data) > output_limit:
+                stdout.write(data[:output_limit - state['size']])
+                state['exceeded'] = True
+                self.kill_processes()
+                return False
+            stdout.write(data)
+            state['size'] += len(data)
+
+        def on_stderr(data):
+            if state['stderr_size'] < STDERR_LIMIT:
+                stderr_chunks.append(data[:STDERR_LIMIT - state['stderr_size']])
+                state['stderr_size'] += len(data)
+
+        try:
+            returncode = self._run_with_timeout(command, stdin, timeout, on_stdout, on_stderr)
+        except BaseException:
+            stdout.close()
+            raise
+        stdout.seek(0)
+        return CapturedOutput(returncode, stdout, b''.join(stderr_chunks).decode(errors='replace'), state['exceeded'])
+
+    def spawn(self, command, stdin=False):
+        return ApiProcess(self, command, stdin)
+
+    def kill_processes(self):
+        with self.running_lock:
+            running = list(self.running)
+        for container_id in running:
+            try:
+                get_client().kill(container_id)
+            except Exception as e:
+                print(f"Could not kill container {container_id}: {e}")
@@ -0,0 +1,119 @@
+import hashlib
+import os
+from django.db import transaction
+from django.db.models import F, Q
+from .models import Solution, Task, Test, TestGroup
+
+# Odciski testów: skrót treści plików testu (wejście i oczekiwane wyjście) zapisywany
+# w Test.content_hash przy wgrywaniu oraz odcisk wyniku testu, który dodatkowo obejmuje
+# limity zadania - wynik z innym odciskiem trzeba policzyć od nowa. Odcisk zestawu testów
+# zadania obejmuje wszystkie testy, ich grupy, punkty grup i limity; jego zmiana podbija
+# Task.test_set_version, a ocenione rozwiązanie zapamiętuje wersję, na której je oceniono.
+
+
+def _update_from_file(digest, path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    _update_from_file(digest, path)
+    return digest.hexdigest()
+
+
+def compute_content_hash(in_path, out_path):
+    digest = hashlib.sha256()
+    for path in (in_path, out_path):
+        _update_from_file(digest, path)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def test_content_hash(test, test_folder):
+    """Skrót treści testu; dla testów wgranych przed wprowadzeniem skrótów liczony i zapisywany teraz."""
+    if not test.content_hash:
+        test.content_hash = compute_content_hash(
+            os.path.join(test_folder, test.name, test.in_file),
+            os.path.join(test_folder, test.name, test.out_file)
+        )
+        Test.objects.filter(id=test.id).update(content_hash=test.content_hash)
+    return test.content_hash
+
+
+def result_fingerprint(content_hash, task):
+    return hashlib.sha256(f"{content_hash}:{task.time_limit}:{task.memory_limit}".encode()).hexdigest()
+
+
+def test_set_fingerprint(task, groups, tests):
+    """Odcisk zestawu testów zadania: `groups` to pary (id grupy, punkty), `tests` trójki
+    (id testu, id grupy, skrót treści). None, gdy któryś test nie ma jeszcze skrótu treści."""
+    digest = hashlib.sha256(f"{task.time_limit}:{task.memory_limit}".encode())
+    for group_id, points in sorted(groups):
+        digest.update(f"|g{group_id}:{points}".encode())
+    for test_id, group_id, content_hash in sorted(tests, key=lambda test: test[0]):
+        if not content_hash:
+            return None
+        digest.update(f"|t{test_id}:{group_id}:{content_hash}".encode())
+    return digest.hexdigest()
+
+
+def task_test_set_fingerprint(task):
+    """Odcisk bieżącego zestawu testów zadania, odczytanego z bazy."""
+    return test_set_fingerprint(
+        task,
+        TestGroup.objects.filter(task=task).values_list('id', 'points'),
+        Test.objects.filter(task=task).values_list('id', 'group_id', 'content_hash')
+    )
+
+
+def refresh_test_set(task_id):
+    """Przelicza odcisk zestawu testów zadania i podbija jego wersję, jeśli się zmienił.
+
+    Wywoływane w tej samej transakcji co zmiana testów, grup lub limitów; wiersz zadania jest
+    blokowany, więc równoległe zmiany dostają kolejne wersje. Brakujące skróty treści testów
+    są przy okazji liczone, a gdy odcisku nie da się ustalić, wersja jest podbijana zawsze.
+    """
+    with transaction.atomic():
+        task = Task.objects.select_for_update().get(id=task_id)
+        tests = list(Test.objects.filter(task=task))
+        test_folder = os.path.join(task.content_path, 'tests')
+        for test in tests:
+            try:
+                test_content_hash(test, test_folder)
+            except OSError as e:
+                print(f"Could not hash test {test.name}: {e}")
+        current = test_set_fingerprint(
+            task,
+            TestGroup.objects.filter(task=task).values_list('id', 'points'),
+            [(test.id, test.group_id, test.content_hash) for test in tests]
+        )
+        if current is None or current != task.test_set_fingerprint:
+            task.test_set_version += 1
+            task.test_set_fingerprint = current or ''
+            task.save(update_fields=['test_set_version', 'test_set_fingerprint'])
+    return task
+
+
+def test_set_version(task_id, fingerprint):
+    """Wersja zestawu testów o odcisku `fingerprint` albo None, gdy bieżący zestaw zadania jest już inny."""
+    if fingerprint is None:
+        return None
+    task = Task.objects.only('test_set_version', 'test_set_fingerprint').get(id=task_id)
+    if task.test_set_fingerprint != fingerprint:
+        # Zadanie sprzed wersjonowania albo zmiana poza widokami - wersja liczona od nowa
+        task = refresh_test_set(task_id)
+    return task.test_set_version if task.test_set_fingerprint == fingerprint else None
+
+
+def stale_results():
+    """Warunek na rozwiązania ocenione na starszej wersji zestawu testów (lub bez zapisanej wersji)."""
+    return Q(test_set_version__isnull=True) | Q(test_set_version__lt=F('contest_task__task__test_set_version'))
+
+
+def stale_solutions(task):
+    """Ocenione rozwiązania zadania z wynikami sprzed bieżącej wersji zestawu testów."""
+    return Solution.objects.filter(contest_task__task=task, status='done').filter(
+        Q(test_set_version__isnull=True) | Q(test_set_version__lt=task.test_set_version)
+    )
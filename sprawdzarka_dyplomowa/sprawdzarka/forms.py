@@ -270,3 +270,64 @@ class AnswerForm(forms.Form):
         label="Odpowiedź",
         required=True
     )
+
+
+class RejudgeForm(forms.Form):
+    contest = forms.ModelChoiceField(
+        queryset=Contest.objects.none(),
+        label="Kurs",
+        required=False,
+        empty_label="Wszystkie",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    task = forms.ModelChoiceField(
+        queryset=Task.objects.none(),
+        label="Zadanie",
+        required=False,
+        empty_label="Wszystkie",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    lang = forms.ChoiceField(
+        choices=[('', 'Wszystkie')] + Solution.LANG_CHOICES,
+        label="Język",
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    status = forms.ChoiceField(
+        choices=[('', 'Wszystkie'), ('done', 'Done'), ('error', 'Error')],
+        label="Status",
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    since = forms.DateField(
+        label="Wysłane od",
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    stale = forms.BooleanField(
+        label="Tylko wyniki sprzed zmiany testów",
+        required=False,
+        help_text="Rozwiązania ocenione na starszej wersji testów, grup lub limitów zadania."
+    )
+    full = forms.BooleanField(
+        label="Pełna ocena (wszystkie testy)",
+        required=False,
+        help_text="Domyślnie uruchamiane są tylko testy nowe lub zmienione od poprzedniej oceny."
+    )
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        # Tylko kursy i zadania, którymi użytkownik zarządza
+        if user.role == 'admin':
+            self.fields['contest'].queryset = Contest.objects.all()
+            self.fields['task'].queryset = Task.objects.all()
+        else:
+            self.fields['contest'].queryset = Contest.objects.filter(teacher=user)
+            self.fields['task'].queryset = Task.objects.filter(author=user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('contest') and not cleaned_data.get('task'):
+            raise ValidationError("Wybierz kurs lub zadanie do ponownej oceny.")
+        return cleaned_data
@@ -0,0 +1,73 @@
+#!/bin/sh
+# Uruchamia program na wszystkich testach z manifestu w jednej sesji piaskownicy
+# i po każdym teście wypisuje jedną linię:
+#   <id testu> <werdykt> <czas CPU ms> <czas rzeczywisty ms> <szczytowe RSS KB> <kod wyjścia>
+#
+# Użycie: sh judge_harness.sh <limit czasu w ms> <limit wyjścia w bajtach> <manifest> <markery> <program> [argumenty...]
+# Linia manifestu: <id testu> <grupa lub -> <md5 oczekiwanego wyjścia> <rozmiar wejścia w bajtach>
+# Wejścia testów przychodzą jedno po drugim na stdin harnessu, w kolejności manifestu - pliki
+# testów zadania (z oczekiwanymi wyjściami) nie są widoczne w piaskownicy. Wejście bieżącego
+# testu zapisywane jest do input_<id testu> i usuwane po teście.
+# Wyjście porównujemy po tokenach: każdy ciąg białych znaków zamieniamy na jeden '\n'.
+# Plik markerów zawiera po linii teksty stderr oznaczające brak pamięci w środowisku języka
+# (np. java.lang.OutOfMemoryError) - jak w trybie test po teście dają werdykt MLE.
+export LC_ALL=C
+runner="$(dirname "$0")/judge_runner"
+time_limit=$1
+output_limit=$2
+manifest=$3
+markers=$4
+shift 4
+
+# Strumień wejść na deskryptorze 3 - pętla czyta manifest ze standardowego wejścia
+exec 3<&0
+
+read_input() {
+    # Dokładnie $1 bajtów strumienia (GNU dd nie czyta z potoku ponad count_bytes)
+    dd bs=65536 count="$1" iflag=count_bytes,fullblock status=none <&3
+}
+
+failed_groups=" "
+while read -r test_id group expected size; do
+    case "$failed_groups" in
+        *" $group "*)
+            # Grupa już niezaliczona - pozostałych testów nie uruchamiamy
+            read_input "$size" > /dev/null
+            echo "$test_id SKIP 0 0 0 0"
+            continue
+            ;;
+    esac
+
+    read_input "$size" > "input_$test_id"
+    # Z stderr zostaje tylko początek (jak STDERR_LIMIT w capture.py), reszta jest odczytywana i pomijana
+    "$runner" -t "$time_limit" -o "$output_limit" -s "stats_$test_id" -- "$@" < "input_$test_id" 2>&1 > "output_$test_id" 3<&- |
+        { head -c 65536 > "stderr_$test_id"; cat > /dev/null; }
+    rm -f "input_$test_id"
+    if ! read -r cpu wall peak code signal oom timed_out output_exceeded < "stats_$test_id"; then
+        cpu=0 wall=0 peak=0 code=-1 signal=0 oom=0 timed_out=0 output_exceeded=0
+    fi
+    rm -f "stats_$test_id"
+
+    if [ "$timed_out" -eq 1 ]; then
+        verdict=TLE
+    elif [ "$output_exceeded" -eq 1 ]; then
+        verdict=OLE
+    elif [ "$oom" -eq 1 ] || grep -q -F -f "$markers" "stderr_$test_id"; then
+        verdict=MLE
+    elif [ "$code" -ne 0 ]; then
+        verdict=ERR
+    else
+        actual=$( { echo; cat "output_$test_id"; echo; } | tr -s '[:space:]' '\n' | md5sum | cut -d' ' -f1 )
+        if [ "$actual" = "$expected" ]; then
+            verdict=OK
+        else
+            verdict=WA
+        fi
+    fi
+    rm -f "output_$test_id" "stderr_$test_id"
+
+    if [ "$verdict" != OK ] && [ "$group" != - ]; then
+        failed_groups="$failed_groups$group "
+    fi
+    echo "$test_id $verdict $cpu $wall $peak $code"
+done < "$manifest"
@@ -0,0 +1,219 @@
+/*
+ * Piaskownica bez Dockera: uruchamia polecenie w nowych przestrzeniach nazw Linuksa
+ * (użytkownik, montowania, procesy, sieć, IPC, UTS) na systemie plików obrazu sędziego
+ * wyeksportowanym do katalogu, w podanej cgroupie v2 i z limitami setrlimit.
+ * Budowany statycznie (gcc:9) jak judge_runner, uruchamiany na hoście przez workera.
+ *
+ * Użycie: judge_jail -r rootfs -w katalog_roboczy -j narzędzia
+ *                    [-c cgroupa] [-T tmpfs_MB] [-f limit_pliku_B] [-n limit_deskryptorów]
+ *                    -- program [argumenty...]
+ *
+ * W piaskownicy katalog roboczy jest pod /app (zapis), narzędzia pod /judge, a cgroupa pod
+ * /sys/fs/cgroup (tylko do odczytu - judge_runner czyta z niej memory.events). Plików testów
+ * w piaskownicy nie ma - wejście programu podaje worker.
+ * Reszta systemu plików obrazu jest tylko do odczytu, /tmp to osobny tmpfs.
+ * Program działa bez żadnych uprawnień (capabilities) i bez sieci.
+ * Kod wyjścia to kod wyjścia programu (128 + sygnał, gdy został zabity).
+ */
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <linux/capability.h>
+#include <sched.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mount.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/stat.h>
+#include <sys/statvfs.h>
+#include <sys/syscall.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static const char *devices[] = {"null", "zero", "random", "urandom"};
+
+static void die(const char *what)
+{
+    fprintf(stderr, "judge_jail: %s: %s\n", what, strerror(errno));
+    _exit(125);
+}
+
+static void write_file(const char *path, const char *data)
+{
+    int fd = open(path, O_WRONLY);
+    if (fd < 0 || write(fd, data, strlen(data)) != (ssize_t)strlen(data))
+        die(path);
+    close(fd);
+}
+
+/* Ponowne zamontowanie tylko do odczytu z zachowaniem flag, których w przestrzeni
+ * użytkownika nie wolno zdjąć. */
+static void remount_read_only(const char *target)
+{
+    struct statvfs info;
+    unsigned long flags = MS_REMOUNT | MS_BIND | MS_RDONLY;
+
+    if (statvfs(target, &info) < 0)
+        die(target);
+    if (info.f_flag & ST_NOSUID)
+        flags |= MS_NOSUID;
+    if (info.f_flag & ST_NODEV)
+        flags |= MS_NODEV;
+    if (info.f_flag & ST_NOEXEC)
+        flags |= MS_NOEXEC;
+    if (info.f_flag & ST_NOATIME)
+        flags |= MS_NOATIME;
+    if (info.f_flag & ST_NODIRATIME)
+        flags |= MS_NODIRATIME;
+    if (info.f_flag & ST_RELATIME)
+        flags |= MS_RELATIME;
+    if (mount(NULL, target, NULL, flags, NULL) < 0)
+        die(target);
+}
+
+static void bind_mount(const char *source, const char *target, int read_only)
+{
+    if (mount(source, target, NULL, MS_BIND | MS_REC, NULL) < 0)
+        die(target);
+    if (read_only)
+        remount_read_only(target);
+}
+
+static void set_limit(int resource, rlim_t value)
+{
+    struct rlimit limit = {value, value};
+    if (setrlimit(resource, &limit) < 0)
+        die("setrlimit");
+}
+
+static void drop_capabilities(void)
+{
+    struct __user_cap_header_struct header = {_LINUX_CAPABILITY_VERSION_3, 0};
+    struct __user_cap_data_struct data[2];
+    int cap;
+
+    if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) < 0)
+        die("no_new_privs");
+    for (cap = 0; prctl(PR_CAPBSET_READ, cap, 0, 0, 0) >= 0; cap++) {
+        if (prctl(PR_CAPBSET_DROP, cap, 0, 0, 0) < 0)
+            die("capbset");
+    }
+    prctl(PR_CAP_AMBIENT, PR_CAP_AMBIENT_CLEAR_ALL, 0, 0, 0);
+    memset(data, 0, sizeof(data));
+    if (syscall(SYS_capset, &header, data) < 0)
+        die("capset");
+}
+
+int main(int argc, char **argv)
+{
+    const char *rootfs = NULL, *workspace = NULL, *tools = NULL, *cgroup = NULL;
+    long tmpfs_mb = 64, open_files = 256;
+    long long file_size = -1;
+    char path[4096], map[64];
+    uid_t uid = getuid();
+    gid_t gid = getgid();
+    pid_t child;
+    int status, i;
+    size_t d;
+
+    for (i = 1; i < argc; i++) {
+        if (strcmp(argv[i], "-r") == 0 && i + 1 < argc) {
+            rootfs = argv[++i];
+        } else if (strcmp(argv[i], "-w") == 0 && i + 1 < argc) {
+            workspace = argv[++i];
+        } else if (strcmp(argv[i], "-j") == 0 && i + 1 < argc) {
+            tools = argv[++i];
+        } else if (strcmp(argv[i], "-c") == 0 && i + 1 < argc) {
+            cgroup = argv[++i];
+        } else if (strcmp(argv[i], "-T") == 0 && i + 1 < argc) {
+            tmpfs_mb = atol(argv[++i]);
+        } else if (strcmp(argv[i], "-f") == 0 && i + 1 < argc) {
+            file_size = atoll(argv[++i]);
+        } else if (strcmp(argv[i], "-n") == 0 && i + 1 < argc) {
+            open_files = atol(argv[++i]);
+        } else if (strcmp(argv[i], "--") == 0) {
+            i++;
+            break;
+        } else {
+            break;
+        }
+    }
+    if (!rootfs || !workspace || !tools || i >= argc) {
+        fprintf(stderr, "usage: judge_jail -r rootfs -w workspace -j tools [-c cgroup] [-T tmpfs_mb] "
+                        "[-f file_size] [-n open_files] -- program [args...]\n");
+        return 125;
+    }
+
+    /* Do cgroupy przechodzimy jeszcze na hoście - procesy potomne ją dziedziczą */
+    if (cgroup) {
+        snprintf(path, sizeof(path), "%s/cgroup.procs", cgroup);
+        write_file(path, "0");
+    }
+
+    if (unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS) < 0)
+        die("unshare");
+    write_file("/proc/self/setgroups", "deny");
+    snprintf(map, sizeof(map), "0 %d 1", (int)uid);
+    write_file("/proc/self/uid_map", map);
+    snprintf(map, sizeof(map), "0 %d 1", (int)gid);
+    write_file("/proc/self/gid_map", map);
+
+    /* Pierwszy proces potomny jest procesem 1 nowej przestrzeni procesów -
+     * jego śmierć kończy wszystkie procesy programu */
+    child = fork();
+    if (child < 0)
+        die("fork");
+    if (child > 0) {
+        while (waitpid(child, &status, 0) < 0) {
+            if (errno != EINTR)
+                die("waitpid");
+        }
+        return WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status);
+    }
+    prctl(PR_SET_PDEATHSIG, SIGKILL, 0, 0, 0);
+
+    if (mount(NULL, "/", NULL, MS_REC | MS_PRIVATE, NULL) < 0)
+        die("private /");
+    if (mount(rootfs, rootfs, NULL, MS_BIND, NULL) < 0)
+        die(rootfs);
+
+    snprintf(path, sizeof(path), "%s/app", rootfs);
+    bind_mount(workspace, path, 0);
+    snprintf(path, sizeof(path), "%s/judge", rootfs);
+    bind_mount(tools, path, 1);
+    if (cgroup) {
+        snprintf(path, sizeof(path), "%s/sys/fs/cgroup", rootfs);
+        bind_mount(cgroup, path, 1);
+    }
+    for (d = 0; d < sizeof(devices) / sizeof(devices[0]); d++) {
+        char device[64];
+        snprintf(device, sizeof(device), "/dev/%s", devices[d]);
+        snprintf(path, sizeof(path), "%s/dev/%s", rootfs, devices[d]);
+        bind_mount(device, path, 0);
+    }
+    snprintf(path, sizeof(path), "%s/proc", rootfs);
+    if (mount("proc", path, "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC, NULL) < 0)
+        die(path);
+    snprintf(path, sizeof(path), "%s/tmp", rootfs);
+    snprintf(map, sizeof(map), "size=%ldm,mode=1777", tmpfs_mb);
+    if (mount("tmpfs", path, "tmpfs", MS_NOSUID | MS_NODEV, map) < 0)
+        die(path);
+    remount_read_only(rootfs);
+
+    if (chdir(rootfs) < 0 || chroot(".") < 0 || chdir("/app") < 0)
+        die("chroot");
+
+    set_limit(RLIMIT_CORE, 0);
+    set_limit(RLIMIT_NOFILE, open_files);
+    if (file_size >= 0)
+        set_limit(RLIMIT_FSIZE, file_size);
+    drop_capabilities();
+
+    execvp(argv[i], argv + i);
+    fprintf(stderr, "judge_jail: execvp %s: %s\n", argv[i], strerror(errno));
+    _exit(127);
+}
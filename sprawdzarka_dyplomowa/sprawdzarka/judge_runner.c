@@ -0,0 +1,224 @@
+/*
+ * Uruchamia program rozwiązania w piaskownicy i mierzy zużyte zasoby.
+ * Budowany statycznie (gcc:9), więc działa w każdym obrazie sędziego.
+ *
+ * Użycie: judge_runner [-t limit_ms] [-o limit_bajtów] -s plik_statystyk -- program [argumenty...]
+ *
+ * Po zakończeniu programu zapisuje do pliku statystyk jedną linię:
+ *   <czas CPU ms> <czas rzeczywisty ms> <szczytowe RSS KB> <kod wyjścia> <sygnał> <oom> <limit czasu> <limit wyjścia>
+ * gdzie <oom> = 1, gdy w czasie działania programu OOM killer cgroupy kogoś zabił.
+ * Z -o standardowe wyjście programu przechodzi przez runner, który zabija program,
+ * gdy tylko wypisze więcej niż limit_bajtów (nadmiar nie jest przekazywany dalej).
+ */
+#define _GNU_SOURCE
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
+
+static volatile pid_t child = -1;
+static volatile sig_atomic_t timed_out = 0;
+static int output_exceeded = 0;
+
+static void on_alarm(int sig)
+{
+    (void)sig;
+    timed_out = 1;
+    if (child > 0)
+        kill(child, SIGKILL);
+}
+
+/* Licznik zabić przez OOM killera cgroupy kontenera (cgroup v2, potem v1); -1 gdy niedostępny. */
+static long oom_kill_count(void)
+{
+    static const char *paths[] = {
+        "/sys/fs/cgroup/memory.events",
+        "/sys/fs/cgroup/memory/memory.oom_control",
+    };
+    char key[64];
+    long value;
+    size_t i;
+
+    for (i = 0; i < sizeof(paths) / sizeof(paths[0]); i++) {
+        FILE *file = fopen(paths[i], "r");
+        if (!file)
+            continue;
+        while (fscanf(file, "%63s %ld", key, &value) == 2) {
+            if (strcmp(key, "oom_kill") == 0) {
+                fclose(file);
+                return value;
+            }
+        }
+        fclose(file);
+    }
+    return -1;
+}
+
+static void write_all(int fd, const char *data, ssize_t size)
+{
+    while (size > 0) {
+        ssize_t written = write(fd, data, size);
+        if (written < 0) {
+            if (errno == EINTR)
+                continue;
+            return;
+        }
+        data += written;
+        size -= written;
+    }
+}
+
+/* Przekazuje wyjście programu na stdout runnera, licząc bajty; po przekroczeniu limitu zabija program. */
+static void forward_output(int fd, long long limit)
+{
+    char buffer[65536];
+    long long total = 0;
+    ssize_t size;
+
+    for (;;) {
+        size = read(fd, buffer, sizeof(buffer));
+        if (size < 0) {
+            if (errno == EINTR && !timed_out)
+                continue;
+            break;
+        }
+        if (size == 0)
+            break;
+        if (total + size > limit) {
+            write_all(STDOUT_FILENO, buffer, limit - total);
+            output_exceeded = 1;
+            kill(child, SIGKILL);
+            break;
+        }
+        write_all(STDOUT_FILENO, buffer, size);
+        total += size;
+    }
+    close(fd);
+}
+
+static long long now_ms(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1000LL + ts.tv_nsec / 1000000;
+}
+
+static long timeval_ms(struct timeval tv)
+{
+    return tv.tv_sec * 1000L + tv.tv_usec / 1000;
+}
+
+int main(int argc, char **argv)
+{
+    long limit_ms = 0;
+    long long output_limit = -1;
+    int output_pipe[2] = {-1, -1};
+    const char *stats_path = NULL;
+    struct sigaction action;
+    struct rusage usage;
+    long long start, wall_ms;
+    long oom_before, oom_after;
+    int status, exit_code, signal_number, oom_killed;
+    FILE *stats;
+    int i;
+
+    for (i = 1; i < argc; i++) {
+        if (strcmp(argv[i], "-t") == 0 && i + 1 < argc) {
+            limit_ms = atol(argv[++i]);
+        } else if (strcmp(argv[i], "-o") == 0 && i + 1 < argc) {
+            output_limit = atoll(argv[++i]);
+        } else if (strcmp(argv[i], "-s") == 0 && i + 1 < argc) {
+            stats_path = argv[++i];
+        } else if (strcmp(argv[i], "--") == 0) {
+            i++;
+            break;
+        } else {
+            break;
+        }
+    }
+    if (!stats_path || i >= argc) {
+        fprintf(stderr, "usage: judge_runner [-t limit_ms] [-o limit_bytes] -s stats_file -- program [args...]\n");
+        return 2;
+    }
+    if (output_limit >= 0 && pipe(output_pipe) < 0) {
+        perror("judge_runner: pipe");
+        return 2;
+    }
+
+    oom_before = oom_kill_count();
+    start = now_ms();
+
+    child = fork();
+    if (child < 0) {
+        perror("judge_runner: fork");
+        return 2;
+    }
+    if (child == 0) {
+        if (output_pipe[1] >= 0) {
+            dup2(output_pipe[1], STDOUT_FILENO);
+            close(output_pipe[0]);
+            close(output_pipe[1]);
+        }
+        execvp(argv[i], argv + i);
+        perror("judge_runner: execvp");
+        _exit(127);
+    }
+
+    if (limit_ms > 0) {
+        struct itimerval timer;
+
+        memset(&action, 0, sizeof(action));
+        action.sa_handler = on_alarm;
+        sigaction(SIGALRM, &action, NULL);
+
+        memset(&timer, 0, sizeof(timer));
+        timer.it_value.tv_sec = limit_ms / 1000;
+        timer.it_value.tv_usec = (limit_ms % 1000) * 1000;
+        setitimer(ITIMER_REAL, &timer, NULL);
+    }
+
+    if (output_pipe[0] >= 0) {
+        /* Odbiorca wyjścia może zniknąć - wtedy kończymy przekazywanie zamiast ginąć od SIGPIPE */
+        signal(SIGPIPE, SIG_IGN);
+        close(output_pipe[1]);
+        forward_output(output_pipe[0], output_limit);
+    }
+
+    while (wait4(child, &status, 0, &usage) < 0) {
+        if (errno != EINTR) {
+            perror("judge_runner: wait4");
+            return 2;
+        }
+    }
+    wall_ms = now_ms() - start;
+    oom_after = oom_kill_count();
+
+    exit_code = WIFEXITED(status) ? WEXITSTATUS(status) : -1;
+    signal_number = WIFSIGNALED(status) ? WTERMSIG(status) : 0;
+    oom_killed = oom_before >= 0 && oom_after > oom_before;
+
+    stats = fopen(stats_path, "w");
+    if (!stats) {
+        perror("judge_runner: stats file");
+        return 2;
+    }
+    fprintf(stats, "%ld %lld %ld %d %d %d %d %d\n",
+            timeval_ms(usage.ru_utime) + timeval_ms(usage.ru_stime),
+            wall_ms,
+            usage.ru_maxrss,
+            exit_code,
+            signal_number,
+            oom_killed,
+            (int)timed_out,
+            output_exceeded);
+    fclose(stats);
+
+    return exit_code >= 0 ? exit_code : 128 + signal_number;
+}
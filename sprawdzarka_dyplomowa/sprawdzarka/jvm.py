@@ -0,0 +1,158 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+from celery.signals import worker_init
+from django.conf import settings
+from .runner import SOURCE_DIR, TOOLS_MOUNT
+from .sandbox import image_digest
+
+# Szybszy start JVM przy każdym teście Javy. Archiwum CDS (class data sharing) z klasami
+# biblioteki standardowej, po które sięgają rozwiązania, budowane jest raz na host w katalogu
+# narzędzi sędziego (montowanym w piaskownicach pod TOOLS_MOUNT), więc JVM mapuje gotowe
+# klasy zamiast je wczytywać i weryfikować. Dochodzą do tego opcje SPRAWDZARKA_JAVA_OPTIONS.
+# Archiwum budowane jest w tle przy starcie workera i przebudowywane, gdy zmieni się obraz
+# (sprawdzane co RECHECK_INTERVAL); do tego czasu testy uruchamiane są bez niego. Ostrzeżenia JVM idą na stderr, nie do wyjścia
+# programu.
+
+IMAGE = 'openjdk:17'
+ARCHIVE = 'java.jsa'
+WARMUP = 'JudgeCdsWarmup'
+BUILD_TIMEOUT = 300  # s
+RECHECK_INTERVAL = 30  # s między sprawdzeniami, czy archiwum jest aktualne
+
+_lock = threading.Lock()
+_archive_ready = False
+_last_check = float('-inf')
+_rebuild_hash = None  # Skrót, dla którego ostatnio uruchomiono budowanie - nieudane nie jest powtarzane
+
+
+def _base_options(memory_limit):
+    return [
+        "-Xms16m", f"-Xmx{memory_limit}m", f"-XX:MaxDirectMemorySize={memory_limit}m",
+        "-XX:ThreadStackSize=256", "-XX:ActiveProcessorCount=1", "-XX:ParallelGCThreads=1",
+    ]
+
+
+def _archive_hash(refresh=False):
+    """Skrót wszystkiego, od czego zależy archiwum: programu rozgrzewającego, obrazu i opcji JVM."""
+    key = hashlib.sha256()
+    with open(os.path.join(SOURCE_DIR, f'{WARMUP}.java'), 'rb') as source:
+        key.update(source.read())
+    for part in [image_digest(IMAGE, refresh)] + settings.SPRAWDZARKA_JAVA_OPTIONS:
+        key.update(b'\0')
+        key.update(part.encode())
+    return key.hexdigest()
+
+
+def _archive_current(tools_dir, archive_hash):
+    stamp_path = os.path.join(tools_dir, f'{ARCHIVE}.sha256')
+    if not os.path.exists(os.path.join(tools_dir, ARCHIVE)) or not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path) as stamp:
+        return stamp.read().strip() == archive_hash
+
+
+def _build_archive(tools_dir, archive_hash):
+    archive_path = os.path.join(tools_dir, ARCHIVE)
+    stamp_path = os.path.join(tools_dir, f'{ARCHIVE}.sha256')
+
+    print("Building Java CDS archive...")
+    build_name = f"cds-build-{os.getpid()}"
+    build_dir = os.path.join(tools_dir, build_name)
+    os.makedirs(os.path.join(build_dir, 'dump'))
+    try:
+        shutil.copy(os.path.join(SOURCE_DIR, f'{WARMUP}.java'), build_dir)
+        options = " ".join(_base_options(256) + settings.SPRAWDZARKA_JAVA_OPTIONS)
+        # Lista klas z przebiegu programu rozgrzewającego, bez jego własnych klas - archiwum
+        # ma zawierać tylko klasy JDK, żeby pasowało do każdego rozwiązania. Zrzut robiony jest
+        # z pustego katalogu, tak jak testy uruchamiane są z domyślną ścieżką klas "."
+        script = (
+            f"javac {WARMUP}.java"
+            f" && java -Xshare:off -XX:DumpLoadedClassList=all.classlist {options} {WARMUP} < /dev/null"
+            f" && grep -v {WARMUP} all.classlist > jdk.classlist"
+            f" && cd dump && java -Xshare:dump -XX:SharedClassListFile=../jdk.classlist"
+            f" -XX:SharedArchiveFile=../{ARCHIVE} {options}"
+        )
+        result = subprocess.run(
+            [
+                "docker", "run", "--rm",
+                "-v", f"{os.path.abspath(build_dir)}:/build",
+                "-w", "/build",
+                IMAGE,
+                "sh", "-c", script
+            ],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=BUILD_TIMEOUT,
+            text=True
+        )
+        if result.returncode != 0 or not os.path.exists(os.path.join(build_dir, ARCHIVE)):
+            raise RuntimeError(f"Nie udało się zbudować archiwum CDS: {result.stderr}")
+        os.replace(os.path.join(build_dir, ARCHIVE), archive_path)
+        with open(stamp_path, 'w') as stamp:
+            stamp.write(archive_hash)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def prepare_archive():
+    """Buduje archiwum CDS, jeśli nie ma aktualnego (nie pasuje do obrazu, opcji JVM albo programu
+    rozgrzewającego). Zwraca, czy archiwum jest gotowe."""
+    global _archive_ready, _rebuild_hash
+    with _lock:
+        try:
+            tools_dir = settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT
+            os.makedirs(tools_dir, exist_ok=True)
+            archive_hash = _archive_hash()
+            _rebuild_hash = archive_hash
+            if not _archive_current(tools_dir, archive_hash):
+                _build_archive(tools_dir, archive_hash)
+            _archive_ready = True
+        except Exception as e:
+            # Bez archiwum testy też się wykonają, tylko wolniej
+            print(f"Java CDS archive unavailable: {e}")
+            _archive_ready = False
+        return _archive_ready
+
+
+def archive_ready():
+    """Czy archiwum CDS jest gotowe - bez budowania, więc można to sprawdzać przy każdym teście.
+    Co RECHECK_INTERVAL sprawdza, czy archiwum nadal pasuje, i w razie potrzeby uruchamia przebudowę w tle."""
+    global _archive_ready, _last_check, _rebuild_hash
+    if time.monotonic() - _last_check < RECHECK_INTERVAL:
+        return _archive_ready
+    _last_check = time.monotonic()
+    try:
+        # Archiwum mógł zbudować inny proces workera na tym hoście albo mógł zmienić się obraz
+        archive_hash = _archive_hash(refresh=True)
+        _archive_ready = _archive_current(settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT, archive_hash)
+    except OSError:
+        _archive_ready = False
+        return False
+    if not _archive_ready and archive_hash != _rebuild_hash and not _lock.locked():
+        # Jedna próba na skrót - komunikat i budowanie nie powtarzają się przy każdym sprawdzeniu
+        _rebuild_hash = archive_hash
+        print("Java CDS archive is out of date, rebuilding in the background")
+        threading.Thread(target=prepare_archive, daemon=True).start()
+    return _archive_ready
+
+
+@worker_init.connect
+def _prepare_archive_in_background(**kwargs):
+    if settings.SPRAWDZARKA_JAVA_CDS:
+        threading.Thread(target=prepare_archive, daemon=True).start()
+
+
+def command(class_name, memory_limit, tuned=True):
+    """Polecenie uruchamiające klasę `class_name`; `tuned=False` daje polecenie bez przyspieszeń startu."""
+    options = _base_options(memory_limit)
+    if tuned:
+        options += settings.SPRAWDZARKA_JAVA_OPTIONS
+        if settings.SPRAWDZARKA_JAVA_CDS and archive_ready():
+            options += ["-Xshare:auto", f"-XX:SharedArchiveFile={TOOLS_MOUNT}/{ARCHIVE}"]
+        options.append("-Xlog:disable")
+        options.append("-Xlog:all=warning:stderr")
+    return ["java"] + options + [class_name]
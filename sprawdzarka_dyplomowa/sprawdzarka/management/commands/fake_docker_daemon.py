@@ -0,0 +1,220 @@
+import json
+import os
+import re
+import signal
+import socketserver
+import struct
+import subprocess
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+
+# Udawany demon Dockera do lokalnego sprawdzania piaskownicy 'docker-api' bez Dockera.
+# Obsługuje tylko część Engine API używaną przez docker_api.py, a "kontenery" to zwykłe
+# procesy na hoście: katalogiem roboczym jest katalog zamontowany pod /app, a ścieżki
+# innych montowań (/judge) są podmieniane w argumentach polecenia.
+# Nie izoluje ani nie ogranicza programów - nie do użytku produkcyjnego.
+
+VERSION_PREFIX = re.compile(r'^/v[0-9.]+')
+
+
+class FakeContainer:
+    def __init__(self, config):
+        self.config = config
+        self.binds = {}
+        for bind in config.get('HostConfig', {}).get('Binds', []):
+            source, target = bind.split(':')[:2]
+            self.binds[target] = source
+        self.process = None
+        self.attached = None
+        self.attached_stdin = False
+        self.exited = threading.Event()
+        self.lock = threading.Lock()
+
+    def _host_path(self, argument):
+        for target, source in self.binds.items():
+            if target != '/app' and (argument == target or argument.startswith(target + '/')):
+                return source + argument[len(target):]
+        return argument
+
+    def start(self):
+        command = [self._host_path(argument) for argument in self.config['Cmd']]
+        self.process = subprocess.Popen(
+            command,
+            cwd=self.binds.get(self.config.get('WorkingDir', '/app'), os.getcwd()),
+            stdin=subprocess.PIPE if self.attached_stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        readers = [
+            threading.Thread(target=self._forward, args=(self.process.stdout, 1), daemon=True),
+            threading.Thread(target=self._forward, args=(self.process.stderr, 2), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        if self.attached_stdin:
+            threading.Thread(target=self._feed_stdin, daemon=True).start()
+
+        def finish():
+            for reader in readers:
+                reader.join()
+            self.process.wait()
+            if self.attached is not None:
+                try:
+                    self.attached.shutdown(2)
+                except OSError:
+                    pass
+            self.exited.set()
+
+        threading.Thread(target=finish, daemon=True).start()
+
+    def _forward(self, stream, stream_type):
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            if self.attached is None:
+                continue
+            with self.lock:
+                try:
+                    self.attached.sendall(struct.pack('>BxxxI', stream_type, len(chunk)) + chunk)
+                except OSError:
+                    pass
+
+    def _feed_stdin(self):
+        try:
+            for chunk in iter(lambda: self.attached.recv(65536), b''):
+                self.process.stdin.write(chunk)
+        except OSError:
+            pass
+        finally:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def remove(self):
+        self.kill()
+        if self.process is None:
+            # Nieuruchomiony kontener - zamykamy czekające na niego połączenie attach
+            if self.attached is not None:
+                try:
+                    self.attached.shutdown(2)
+                except OSError:
+                    pass
+            self.exited.set()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    containers = {}
+    names = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        path = VERSION_PREFIX.sub('', url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        if method == 'GET' and path == '/_ping':
+            return self._reply(200, 'OK')
+        match = re.match(r'^/images/(.+)/json$', path)
+        if method == 'GET' and match:
+            return self._reply(200, {'Id': f"sha256:fake-{match.group(1)}"})
+        if method == 'POST' and path == '/containers/create':
+            container_id = uuid.uuid4().hex
+            self.containers[container_id] = FakeContainer(body)
+            if query.get('name'):
+                self.names[query['name']] = container_id
+            return self._reply(201, {'Id': container_id, 'Warnings': []})
+
+        match = re.match(r'^/containers/([^/]+)(/[a-z]+)?$', path)
+        container_id = self.names.get(match.group(1), match.group(1)) if match else None
+        container = self.containers.get(container_id)
+        if container is None:
+            return self._reply(404, {'message': 'No such container'})
+        action = match.group(2)
+
+        if method == 'POST' and action == '/attach':
+            container.attached_stdin = query.get('stdin') == '1'
+            container.attached = self.connection
+            self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\nContent-Type: application/vnd.docker.raw-stream\r\n"
+                             b"Connection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+            self.wfile.flush()
+            # Połączenie należy teraz do kontenera - czekamy, aż program się skończy
+            container.exited.wait()
+            self.close_connection = True
+            return
+        if method == 'POST' and action == '/start':
+            container.start()
+            return self._reply(204)
+        if method == 'POST' and action == '/wait':
+            container.exited.wait()
+            return self._reply(200, {'StatusCode': container.process.returncode})
+        if method == 'POST' and action == '/kill':
+            if container.process is None or container.process.poll() is not None:
+                return self._reply(409, {'message': 'Container is not running'})
+            container.kill()
+            return self._reply(204)
+        if method == 'DELETE' and action is None:
+            container.remove()
+            self.containers.pop(container_id, None)
+            for name in [name for name, named_id in self.names.items() if named_id == container_id]:
+                del self.names[name]
+            return self._reply(204)
+        return self._reply(404, {'message': f'Unsupported: {method} {path}'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_DELETE(self):
+        self._route('DELETE')
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler oczekuje adresu klienta w postaci pary
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+
+class Command(BaseCommand):
+    help = "Uruchamia udawany demon Dockera (Engine API na gnieździe uniksowym) do lokalnych testów."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default='/tmp/sprawdzarka-fake-docker.sock')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket']
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        with Server(socket_path, Handler) as server:
+            self.stdout.write(f"Fake Docker daemon listening on {socket_path}")
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(socket_path)
@@ -0,0 +1,153 @@
+import math
+import os
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sprawdzarka import jvm, runner
+from sprawdzarka.sandbox import DockerRunSandbox, get_pool, shutdown_pools
+from sprawdzarka.tasks import AOT_TIMEOUT, LANGUAGES
+
+# Porównanie narzutu piaskownic: `docker run --rm` (bez puli), `docker exec` (pula kontenerów),
+# kontener przez Engine API (docker-api) i judge_jail (native). Mierzony jest czas przygotowania
+# piaskownicy oraz czas uruchomienia pustego polecenia przez judge_runner - czyli to, co sędzia
+# dokłada do każdego testu. Z --startup zamiast pustego polecenia uruchamiany jest pusty program
+# w wybranym języku, w każdym wariancie jego polecenia uruchomienia (np. Java bez przyspieszeń
+# startu JVM i z nimi, C# pod JIT i po kompilacji AOT) - czyli start środowiska języka, który
+# płaci każdy test. Średni czas CPU programu to wartość dla SPRAWDZARKA_TIME_OVERHEAD.
+
+BACKENDS = ['docker-run', 'docker-exec', 'docker-api', 'native']
+STARTUP_TIME_LIMIT = 10  # s
+STARTUP_MEMORY = 256  # MB
+
+# Pusty program w każdym języku: (nazwa pliku, źródło)
+EMPTY_PROGRAMS = {
+    'C/C++': ('Main.cpp', "int main() { return 0; }\n"),
+    'Java': ('Main.java', "public class Main { public static void main(String[] args) { } }\n"),
+    'C#': ('Main.cs', "class Program { static void Main() { } }\n"),
+}
+
+
+def _summary(times):
+    times = sorted(times)
+    return {
+        'mean': sum(times) / len(times),
+        'p50': times[len(times) // 2],
+        'p95': times[max(0, math.ceil(0.95 * len(times)) - 1)],
+        'max': times[-1],
+    }
+
+
+class Command(BaseCommand):
+    help = "Mierzy narzut uruchamiania poleceń w piaskownicach Dockera i natywnej (judge_jail)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', default='C/C++', choices=list(LANGUAGES))
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--backend', action='append', choices=BACKENDS, help="Domyślnie wszystkie.")
+        parser.add_argument('--startup', action='store_true', help="Mierzy start pustego programu w języku --lang.")
+
+    def _open(self, backend, image, workspace):
+        if backend == 'docker-run':
+            return DockerRunSandbox(image, workspace), lambda: None
+        if backend == 'docker-exec':
+            pool = get_pool(image)
+            container = pool.acquire()
+            return container, lambda: pool.release(container)
+        if backend == 'docker-api':
+            from sprawdzarka.docker_api import DockerApiSandbox
+            return DockerApiSandbox(image, workspace), lambda: None
+        from sprawdzarka.native_sandbox import NativeSandbox
+        sandbox = NativeSandbox(image)
+        return sandbox, sandbox.destroy
+
+    def _variants(self, lang, sandbox):
+        """Warianty do zmierzenia: lista (wariant, polecenie, przygotowanie przed pomiarem albo None);
+        kompiluje pusty program."""
+        language = LANGUAGES[lang]
+        file_name, source = EMPTY_PROGRAMS[lang]
+        with open(os.path.join(sandbox.workspace, file_name), 'w') as source_file:
+            source_file.write(source)
+        compiled_file = language['compiled_file'](file_name)
+        result = sandbox.execute(language['compile'](file_name, compiled_file), timeout=60)
+        if result.returncode != 0:
+            raise CommandError(f"Kompilacja pustego programu nie powiodła się: {result.stderr}")
+        if lang == 'Java':
+            class_name = os.path.splitext(compiled_file)[0]
+            if settings.SPRAWDZARKA_JAVA_CDS and not jvm.prepare_archive():
+                self.stderr.write("Archiwum CDS niedostępne - wariant 'tuned' bez niego.")
+            return [
+                ('plain', jvm.command(class_name, STARTUP_MEMORY, tuned=False), None),
+                ('tuned', jvm.command(class_name, STARTUP_MEMORY), None),
+            ]
+        run_command = language['run'](compiled_file, STARTUP_MEMORY)
+        if 'aot' in language:
+            # Najpierw pod JIT, potem ten sam program po kompilacji AOT
+            return [
+                ('jit', run_command, None),
+                ('aot', run_command, lambda: self._compile_aot(sandbox, language, compiled_file)),
+            ]
+        return [('run', run_command, None)]
+
+    def _compile_aot(self, sandbox, language, compiled_file):
+        result = sandbox.execute(language['aot'](compiled_file), timeout=AOT_TIMEOUT)
+        if result.returncode != 0 or not os.path.exists(os.path.join(sandbox.workspace, language['aot_file'](compiled_file))):
+            raise CommandError(f"Kompilacja AOT pustego programu nie powiodła się: {result.stderr}")
+
+    def _measure(self, backend, sandbox, command, runs, time_limit):
+        """Czasy (ms) wykonania polecenia przez judge_runner: zegar ściany po stronie sędziego i CPU programu."""
+        times, cpu_times = [], []
+        for run in range(runs):
+            stats_name = f"benchmark_stats_{run}"
+            start = time.perf_counter()
+            result = sandbox.execute(runner.wrap(command, stats_name, time_limit))
+            times.append((time.perf_counter() - start) * 1000)
+            if result.returncode != 0:
+                raise CommandError(f"{backend}: polecenie zakończone kodem {result.returncode}: {result.stderr}")
+            stats = runner.read_stats(os.path.join(sandbox.workspace, stats_name))
+            if stats is None:
+                raise CommandError(f"{backend}: brak statystyk judge_runner")
+            cpu_times.append(stats['cpu_ms'])
+        return times, cpu_times
+
+    def handle(self, *args, **options):
+        lang = options['lang']
+        language = LANGUAGES[lang]
+        image = language['image']
+        runs = options['runs']
+        if runs < 1:
+            raise CommandError("--runs musi być dodatnie.")
+        runner.ensure_tools()
+
+        for backend in options['backend'] or BACKENDS:
+            with tempfile.TemporaryDirectory() as workspace:
+                # Pierwsze otwarcie może eksportować obraz albo startować kontener - liczone osobno
+                start = time.perf_counter()
+                sandbox, close = self._open(backend, image, workspace)
+                setup_ms = (time.perf_counter() - start) * 1000
+                try:
+                    if options['startup']:
+                        variants = self._variants(lang, sandbox)
+                        sandbox.set_limits(STARTUP_MEMORY + language['memory_overhead'], language['pids_limit'] + runner.RUNNER_PIDS)
+                        time_limit = STARTUP_TIME_LIMIT
+                    else:
+                        sandbox.set_limits(256, 1 + runner.RUNNER_PIDS)
+                        variants = [('true', ["true"], None)]
+                        time_limit = 1
+                    measured = {}
+                    for variant, command, prepare in variants:
+                        if prepare is not None:
+                            prepare()
+                        measured[variant] = self._measure(backend, sandbox, command, runs, time_limit)
+                finally:
+                    close()
+
+            self.stdout.write(f"{backend:12} setup {setup_ms:8.1f} ms ({runs} runs, {image})")
+            for variant, (times, cpu_times) in measured.items():
+                summary = _summary(times)
+                self.stdout.write(
+                    f"  {variant:10} per command: mean {summary['mean']:7.1f} ms, p50 {summary['p50']:7.1f} ms, "
+                    f"p95 {summary['p95']:7.1f} ms, max {summary['max']:7.1f} ms | "
+                    f"program CPU mean {sum(cpu_times) / len(cpu_times):7.1f} ms"
+                )
+        shutdown_pools()
@@ -0,0 +1,64 @@
+import os
+import socket
+from django.core.cache import cache
+
+# Liczniki sędziego trzymane we wspólnym cache (Redis), żeby widzieć sumę ze wszystkich workerów
+METRICS_PREFIX = 'sprawdzarka:metrics:'
+WORKER_VALUE_TIMEOUT = 600  # s; wartość workera, który przestał ją odświeżać, znika ze statystyk
+
+
+def incr(name, amount=1):
+    key = METRICS_PREFIX + name
+    try:
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+    except Exception as e:
+        # Metryki nie mogą przerwać oceniania
+        print(f"Could not update metric {name}: {e}")
+
+
+def set_value(name, value):
+    try:
+        cache.set(METRICS_PREFIX + name, value, timeout=None)
+    except Exception as e:
+        print(f"Could not update metric {name}: {e}")
+
+
+def get(name, default=0):
+    try:
+        return cache.get(METRICS_PREFIX + name, default)
+    except Exception:
+        return default
+
+
+def _workers_key(name):
+    return METRICS_PREFIX + name + ':workers'
+
+
+def set_worker_value(name, value, worker=None):
+    """Zapisuje wartość zgłaszaną osobno przez każdy proces workera (np. zajętą przez niego pamięć).
+
+    `worker` pozwala zgłaszać wartość wspólną dla kilku procesów, np. całego hosta.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        cache.set(f"{METRICS_PREFIX}{name}:{worker}", value, timeout=WORKER_VALUE_TIMEOUT)
+        workers = cache.get(_workers_key(name), [])
+        if worker not in workers:
+            # Przy okazji zapominamy workery, których wartości już wygasły
+            alive = cache.get_many([f"{METRICS_PREFIX}{name}:{w}" for w in workers])
+            workers = [w for w in workers if f"{METRICS_PREFIX}{name}:{w}" in alive] + [worker]
+            cache.set(_workers_key(name), workers, timeout=None)
+    except Exception as e:
+        print(f"Could not update metric {name}: {e}")
+
+
+def get_worker_values(name):
+    """Wartości zgłoszone przez żyjące workery: {worker: wartość}."""
+    try:
+        workers = cache.get(_workers_key(name), [])
+        values = cache.get_many([f"{METRICS_PREFIX}{name}:{worker}" for worker in workers])
+    except Exception:
+        return {}
+    prefix_length = len(f"{METRICS_PREFIX}{name}:")
+    return {key[prefix_length:]: value for key, value in values.items()}
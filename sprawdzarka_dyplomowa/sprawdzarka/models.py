@@ -88,6 +88,9 @@ class Task(models.Model):
     time_limit = models.IntegerField()
     memory_limit = models.IntegerField()
     is_public = models.BooleanField(default=False)
+    # Wersja zestawu testów, zwiększana przy każdej zmianie testów, grup, punktów lub limitów (fingerprint.py)
+    test_set_version = models.PositiveIntegerField(default=0)
+    test_set_fingerprint = models.CharField(max_length=64, blank=True, default='')
 
     class Meta:
         verbose_name_plural = 'Tasks'
@@ -130,6 +133,7 @@ class Test(models.Model):
     group = models.ForeignKey(TestGroup, on_delete=models.SET_NULL, related_name='tests', null=True, blank=True)
     in_file = models.TextField()
     out_file = models.TextField()
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # sha256 plików .in i .out
 
     class Meta:
         verbose_name_plural = 'Tests'
@@ -148,9 +152,16 @@ class Solution(models.Model):
     src_path = models.TextField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     final_points = models.IntegerField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)  # Przekazanie do kolejki Celery
+    judging_started_at = models.DateTimeField(null=True, blank=True)
+    test_set_version = models.PositiveIntegerField(null=True, blank=True)  # Wersja zestawu testów zadania z chwili oceny
 
     class Meta:
         verbose_name_plural = 'Solutions'
+        indexes = [
+            models.Index(fields=['status', 'dispatched_at']),
+            models.Index(fields=['contest_task', 'test_set_version']),
+        ]
 
     def __str__(self):
         send_date_str = self.send_date.strftime('%Y.%m.%d::%H:%M:%S')
@@ -163,14 +174,17 @@ class SolutionTestResult(models.Model):
         ('WA', 'Wrong Answer'),
         ('TLE', 'Time Limit Exceeded'),
         ('MLE', 'Memory Limit Exceeded'),
+        ('OLE', 'Output Limit Exceeded'),
         ('ERR', 'Error')
     ]
     solution = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='test_results')
     test = models.ForeignKey(Test, on_delete=models.CASCADE)
-    time = models.IntegerField(null=True, blank=True)
-    memory = models.IntegerField(null=True, blank=True)
+    time = models.IntegerField(null=True, blank=True)  # Czas CPU w ms
+    wall_time = models.IntegerField(null=True, blank=True)  # Czas rzeczywisty w ms
+    memory = models.IntegerField(null=True, blank=True)  # Szczytowe zużycie pamięci (RSS) w KB
     passed = models.BooleanField(default=False)
     final_status = models.CharField(max_length=5, choices=STATUS_CHOICES, null=True, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')  # Odcisk testu i limitów z chwili oceny
 
     class Meta:
         verbose_name_plural = 'Solution Test Results'
@@ -179,6 +193,40 @@ class SolutionTestResult(models.Model):
         return f"{self.solution} - {self.test}"
 
 
+class RejudgeBatch(models.Model):
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rejudge_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    description = models.CharField(max_length=255)
+    total = models.IntegerField(default=0)
+    full = models.BooleanField(default=False)  # Wszystkie testy od nowa zamiast tylko nowych i zmienionych
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Rejudge Batches'
+
+    def __str__(self):
+        return f"{self.description} ({self.created_at.strftime('%Y.%m.%d::%H:%M:%S')})"
+
+
+class RejudgeItem(models.Model):
+    STATUS_CHOICES = [('pending', 'Pending'), ('queued', 'Queued'), ('done', 'Done'), ('error', 'Error')]
+    batch = models.ForeignKey(RejudgeBatch, on_delete=models.CASCADE, related_name='items')
+    solution = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='rejudge_items')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    queued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)  # Początek oceniania przez workera
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Rejudge Items'
+        indexes = [
+            models.Index(fields=['batch', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.batch} - {self.solution}"
+
+
 class Question(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
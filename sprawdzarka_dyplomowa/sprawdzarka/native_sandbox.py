@@ -0,0 +1,201 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from django.conf import settings
+from .runner import JAIL
+from .sandbox import DOCKER_TIMEOUT, CommandSandbox, image_digest
+
+# Piaskownica bez Dockera: polecenia uruchamiane przez judge_jail (przestrzenie nazw Linuksa,
+# cgroup v2, setrlimit) bezpośrednio na hoście, bez kosztu startu kontenera.
+# Toolchain jest ten sam co w Dockerze - system plików obrazu eksportowany jest raz na host
+# do SPRAWDZARKA_NATIVE_ROOTFS_ROOT, a zmienne środowiskowe obrazu zapisywane obok.
+# Limity pamięci i procesów pilnuje osobna cgroupa każdej piaskownicy w
+# SPRAWDZARKA_NATIVE_CGROUP_ROOT (poddrzewo cgroup v2 oddane workerowi z kontrolerami memory i pids).
+
+MOUNT_POINTS = ['app', 'judge', 'proc', 'tmp', 'sys/fs/cgroup']
+DEVICES = ['null', 'zero', 'random', 'urandom']
+EXPORT_TIMEOUT = 600
+
+_rootfs = {}
+_rootfs_lock = threading.Lock()
+_cgroup_root_ready = False
+
+
+def _rootfs_path(image):
+    return os.path.join(settings.SPRAWDZARKA_NATIVE_ROOTFS_ROOT, image_digest(image).replace(':', '_').replace('/', '_'))
+
+
+def _export_image(image, target):
+    """Eksportuje system plików obrazu do katalogu `target` (przez katalog tymczasowy i podmianę)."""
+    print(f"Exporting {image} for the native sandbox...")
+    os.makedirs(settings.SPRAWDZARKA_NATIVE_ROOTFS_ROOT, exist_ok=True)
+    tmp_target = tempfile.mkdtemp(prefix='export-', dir=settings.SPRAWDZARKA_NATIVE_ROOTFS_ROOT)
+    container = None
+    try:
+        result = subprocess.run(
+            ["docker", "create", image, "true"],
+            stdin=subprocess.DEVNULL, capture_output=True, timeout=DOCKER_TIMEOUT, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Nie udało się utworzyć kontenera {image}: {result.stderr}")
+        container = result.stdout.strip()
+
+        rootfs = os.path.join(tmp_target, 'rootfs')
+        os.makedirs(rootfs)
+        export = subprocess.Popen(["docker", "export", container], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        untar = subprocess.run(
+            ["tar", "-x", "--no-same-owner", "--exclude=dev/*", "-C", rootfs],
+            stdin=export.stdout, capture_output=True, timeout=EXPORT_TIMEOUT, text=True
+        )
+        export.stdout.close()
+        if export.wait(timeout=EXPORT_TIMEOUT) != 0 or untar.returncode != 0:
+            raise RuntimeError(f"Nie udało się wyeksportować obrazu {image}: {untar.stderr}")
+
+        for mount_point in MOUNT_POINTS:
+            os.makedirs(os.path.join(rootfs, mount_point), exist_ok=True)
+        os.makedirs(os.path.join(rootfs, 'dev'), exist_ok=True)
+        for device in DEVICES:
+            open(os.path.join(rootfs, 'dev', device), 'a').close()
+
+        result = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{json .Config.Env}}", image],
+            stdin=subprocess.DEVNULL, capture_output=True, timeout=DOCKER_TIMEOUT, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Nie udało się odczytać środowiska obrazu {image}: {result.stderr}")
+        with open(os.path.join(tmp_target, 'env.json'), 'w') as env_file:
+            env_file.write(result.stdout)
+
+        try:
+            os.rename(tmp_target, target)
+        except OSError:
+            # Inny worker zdążył wyeksportować ten sam obraz
+            if not os.path.isdir(target):
+                raise
+    finally:
+        if container:
+            subprocess.run(["docker", "rm", "-f", container], stdin=subprocess.DEVNULL, capture_output=True, timeout=DOCKER_TIMEOUT)
+        shutil.rmtree(tmp_target, ignore_errors=True)
+
+
+def prepare_rootfs(image):
+    """Zwraca (katalog systemu plików obrazu, środowisko) - przy pierwszym użyciu na hoście eksportuje obraz."""
+    with _rootfs_lock:
+        if image not in _rootfs:
+            target = _rootfs_path(image)
+            if not os.path.isdir(target):
+                _export_image(image, target)
+            with open(os.path.join(target, 'env.json')) as env_file:
+                env = dict(variable.split('=', 1) for variable in (json.load(env_file) or []))
+            env.setdefault('PATH', '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin')
+            env.setdefault('HOME', '/tmp')
+            _rootfs[image] = (os.path.join(target, 'rootfs'), env)
+        return _rootfs[image]
+
+
+def _write(path, value):
+    with open(path, 'w') as control_file:
+        control_file.write(str(value))
+
+
+def cgroup_root():
+    """Katalog cgroup piaskownic; przy pierwszym użyciu włącza w nim kontrolery memory i pids
+    (i cpuset, gdy testy są przypinane do rdzeni)."""
+    global _cgroup_root_ready
+    root = settings.SPRAWDZARKA_NATIVE_CGROUP_ROOT
+    if not _cgroup_root_ready:
+        os.makedirs(root, exist_ok=True)
+        controllers = '+memory +pids +cpuset' if settings.SPRAWDZARKA_CPU_PINNING else '+memory +pids'
+        _write(os.path.join(root, 'cgroup.subtree_control'), controllers)
+        _cgroup_root_ready = True
+    return root
+
+
+class NativeSandbox(CommandSandbox):
+    """Piaskownica judge_jail z własnym katalogiem roboczym i cgroupą, usuwanymi w destroy()."""
+
+    backend = 'native'
+
+    def __init__(self, image):
+        self.image = image
+        self.rootfs, self.env = prepare_rootfs(image)
+        self.name = f"native-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.workspace = os.path.join(settings.SPRAWDZARKA_SANDBOX_ROOT, self.name)
+        self.cgroup = os.path.join(cgroup_root(), self.name)
+        self.memory_limit = None
+        self.pids_limit = None
+        os.makedirs(self.workspace)
+        os.makedirs(self.cgroup)
+        self.set_limits(None, None)
+
+    def put(self, path, name=None):
+        target = os.path.join(self.workspace, name or os.path.basename(path))
+        shutil.copy(path, target)
+        return target
+
+    def set_limits(self, memory_limit, pids_limit):
+        # Bez limitów (kompilacja) obowiązuje limit pamięci piaskownicy
+        memory = (memory_limit or settings.SPRAWDZARKA_SANDBOX_MEMORY) * 1024 * 1024
+        _write(os.path.join(self.cgroup, 'memory.max'), memory)
+        _write(os.path.join(self.cgroup, 'memory.swap.max'), 0)
+        # Sam judge_jail (proces 1 przestrzeni procesów) też liczy się do limitu procesów
+        _write(os.path.join(self.cgroup, 'pids.max'), pids_limit + 2 if pids_limit else 'max')
+        self.memory_limit = memory_limit
+        self.pids_limit = pids_limit
+
+    def set_cpuset(self, cpus):
+        # Pusty cpuset.cpus - rdzenie cgroupy nadrzędnej
+        _write(os.path.join(self.cgroup, 'cpuset.cpus'), cpus or '')
+
+    def _command(self, command, interactive):
+        jail_command = [
+            os.path.join(os.path.abspath(settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT), JAIL),
+            "-r", self.rootfs,
+            "-w", os.path.abspath(self.workspace),
+            "-j", os.path.abspath(settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT),
+            "-c", self.cgroup,
+            "-T", str(settings.SPRAWDZARKA_NATIVE_TMPFS_SIZE),
+            "-f", str(settings.SPRAWDZARKA_NATIVE_FILE_SIZE * 1024 * 1024),
+            "-n", str(settings.SPRAWDZARKA_NATIVE_OPEN_FILES),
+            "--",
+        ] + command
+        print(f"Executing native sandbox command: {' '.join(command)}")
+        return jail_command
+
+    def kill_processes(self):
+        try:
+            _write(os.path.join(self.cgroup, 'cgroup.kill'), 1)
+            return
+        except OSError:
+            pass
+        # Jądra sprzed 5.14 nie mają cgroup.kill
+        try:
+            with open(os.path.join(self.cgroup, 'cgroup.procs')) as procs:
+                for pid in procs.read().split():
+                    try:
+                        os.kill(int(pid), signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+        except OSError as e:
+            print(f"Could not kill processes of {self.name}: {e}")
+
+    def destroy(self):
+        self.kill_processes()
+        # Cgroupę można usunąć dopiero, gdy zabite procesy znikną
+        for _ in range(50):
+            try:
+                os.rmdir(self.cgroup)
+                break
+            except FileNotFoundError:
+                break
+            except OSError:
+                time.sleep(0.01)
+        else:
+            print(f"Could not remove cgroup {self.cgroup}")
+        shutil.rmtree(self.workspace, ignore_errors=True)
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from django.conf import settings
+from .admission import host_memory
+from .capture import CHUNK_SIZE, STDERR_LIMIT, CapturedOutput
+
+# Tryb 'async': kompilacje i testy wszystkich rozwiązań ocenianych przez jeden proces workera
+# działają na wspólnej pętli asyncio (osobny wątek), jako procesy z asyncio.create_subprocess_exec.
+# Wątek zadania Celery tylko czeka na wynik, a liczbę jednocześnie uruchomionych poleceń ogranicza
+# budżet rdzeni i pamięci procesu (SPRAWDZARKA_ASYNC_CPUS, SPRAWDZARKA_ASYNC_MEMORY).
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_budget = None
+
+
+class ResourceBudget:
+    """Rdzenie i pamięć (MB) do rozdzielenia między polecenia na pętli asyncio."""
+
+    def __init__(self, cpus, memory):
+        self.cpus = cpus
+        self.memory = memory
+        self.used_cpus = 0
+        self.used_memory = 0
+        self.condition = asyncio.Condition()
+
+    def _fits(self, cpus, memory):
+        # Polecenie większe niż cały budżet dostaje go w całości, gdy nic innego nie działa
+        if self.used_cpus == 0 and self.used_memory == 0:
+            return True
+        return self.used_cpus + cpus <= self.cpus and self.used_memory + memory <= self.memory
+
+    @asynccontextmanager
+    async def reserve(self, cpus, memory):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self._fits(cpus, memory))
+            self.used_cpus += cpus
+            self.used_memory += memory
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.used_cpus -= cpus
+                self.used_memory -= memory
+                self.condition.notify_all()
+
+    def snapshot(self):
+        return {
+            'cpus': self.cpus,
+            'used_cpus': self.used_cpus,
+            'memory': self.memory,
+            'used_memory': self.used_memory,
+        }
+
+
+def budget():
+    """Budżet procesu; tworzony w wątku pętli przy pierwszym użyciu."""
+    global _budget
+    if _budget is None:
+        _budget = ResourceBudget(
+            settings.SPRAWDZARKA_ASYNC_CPUS or os.cpu_count() or 1,
+            settings.SPRAWDZARKA_ASYNC_MEMORY or host_memory() * 3 // 4
+        )
+    return _budget
+
+
+def get_loop():
+    """Pętla asyncio procesu workera, działająca w osobnym wątku (po forku uruchamiana od nowa)."""
+    global _loop, _loop_pid, _budget
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _budget = None
+            threading.Thread(target=_loop.run_forever, name='judge-orchestrator', daemon=True).start()
+        return _loop
+
+
+def run(coroutine):
+    """Wykonuje korutynę na pętli procesu i czeka na jej wynik w bieżącym wątku."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+
+async def _feed_stdin(writer, source):
+    try:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            writer.write(chunk)
+            await writer.drain()
+    except (BrokenPipeError, ConnectionResetError, ValueError):
+        pass  # Program skończył się, zanim przeczytał całe wejście
+    finally:
+        writer.close()
+
+
+async def _read_stderr(reader, chunks):
+    size = 0
+    while True:
+        chunk = await reader.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        if size < STDERR_LIMIT:
+            chunks.append(chunk[:STDERR_LIMIT - size])
+            size += len(chunk)
+
+
+async def run_bounded(args, stdin=None, timeout=None, output_limit=None, on_limit=None, env=None):
+    """Odpowiednik capture.run_bounded na asyncio; `on_limit` wywoływane w wątku pomocniczym."""
+    if output_limit is None:
+        output_limit = settings.SPRAWDZARKA_OUTPUT_LIMIT
+    stdin_source = None
+    if stdin is not None and not hasattr(stdin, 'fileno'):
+        stdin_source, stdin = stdin, subprocess.PIPE
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=stdin if stdin is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env
+    )
+    stdout = tempfile.SpooledTemporaryFile(max_size=settings.SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD)
+    stderr_chunks = []
+    helpers = [asyncio.ensure_future(_read_stderr(process.stderr, stderr_chunks))]
+    if stdin_source is not None:
+        helpers.append(asyncio.ensure_future(_feed_stdin(process.stdin, stdin_source)))
+    state = {'output_exceeded': False}
+
+    async def capture():
+        size = 0
+        while True:
+            chunk = await process.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if size + len(chunk) > output_limit:
+                stdout.write(chunk[:output_limit - size])
+                state['output_exceeded'] = True
+                process.kill()
+                if on_limit is not None:
+                    await asyncio.to_thread(on_limit)
+                break
+            stdout.write(chunk)
+            size += len(chunk)
+        await process.wait()
+        await asyncio.gather(*helpers, return_exceptions=True)
+
+    try:
+        await asyncio.wait_for(capture(), timeout)
+    except asyncio.TimeoutError:
+        stdout.close()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except BaseException:
+        stdout.close()
+        raise
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        for helper in helpers:
+            helper.cancel()
+
+    stdout.seek(0)
+    return CapturedOutput(process.returncode, stdout, b''.join(stderr_chunks).decode(errors='replace'), state['output_exceeded'])
+
+
+async def execute_bounded(sandbox, command, stdin=None, timeout=None, output_limit=None):
+    """sandbox.execute_bounded na pętli asyncio. Piaskownice bez polecenia na hoście (Engine API)
+    wykonywane są w wątku pomocniczym."""
+    if not hasattr(sandbox, '_command'):
+        return await asyncio.to_thread(sandbox.execute_bounded, command, stdin, timeout, output_limit)
+    return await run_bounded(
+        sandbox._command(command, stdin is not None),
+        stdin=stdin,
+        timeout=timeout,
+        output_limit=output_limit,
+        on_limit=sandbox.kill_processes,
+        env=sandbox.env
+    )
+
+
+def execute(sandbox, command, timeout=None):
+    """Jak sandbox.execute (np. kompilacja), ale na pętli procesu i w ramach budżetu."""
+    async def reserved():
+        async with budget().reserve(1, settings.SPRAWDZARKA_ASYNC_COMPILE_MEMORY):
+            result = await execute_bounded(sandbox, command, timeout=timeout)
+        with result:
+            return subprocess.CompletedProcess(
+                command, result.returncode,
+                result.stdout.read().decode(errors='replace'),
+                result.stderr
+            )
+
+    return run(reserved())
+
+
+async def run_tests(sandboxes, grouped_tests, ungrouped_tests, run_test, memory, results=None):
+    """Jak tasks.run_tests, ale na pętli asyncio: każdy uruchomiony test rezerwuje rdzeń i `memory` MB budżetu.
+
+    Po pierwszym niezaliczonym teście grupy jej pozostałe testy nie są już uruchamiane, a testy
+    tej grupy działające na innych piaskownicach są przerywane i traktowane jak pominięte.
+    """
+    free_sandboxes = asyncio.Queue()
+    for sandbox in sandboxes:
+        free_sandboxes.put_nowait(sandbox)
+    group_failed = {group_name: False for group_name in grouped_tests}
+    running = {}  # piaskownica -> (test, grupa) działającego na niej testu
+    cancelled = set()  # id testów przerwanych po niezaliczeniu ich grupy
+    killing = {}  # piaskownica -> zdarzenie końca przerywania działającego na niej testu
+
+    async def fail_group(group_name):
+        group_failed[group_name] = True
+        to_cancel = [
+            (sandbox, test) for sandbox, (test, test_group) in running.items()
+            if test_group == group_name and test.id not in cancelled
+        ]
+        for sandbox, test in to_cancel:
+            cancelled.add(test.id)
+            killing[sandbox] = asyncio.Event()
+            if results is not None:
+                results.cancel(test)
+        for sandbox, test in to_cancel:
+            print(f"Cancelling test {test.name}: group {group_name} already failed")
+            try:
+                await asyncio.to_thread(sandbox.kill_processes)
+            except Exception as e:
+                print(f"Could not cancel test {test.name}: {e}")
+            finally:
+                killing.pop(sandbox).set()
+
+    async def worker(test, group_name):
+        if group_name is not None and group_failed[group_name]:
+            print(f"Skipping test {test.name}: group {group_name} already failed")
+            return None
+        # Budżet rezerwowany dopiero po dostaniu piaskownicy - testy czekające na piaskownicę
+        # nie zajmują rdzeni i pamięci potrzebnych testom i kompilacjom innych rozwiązań
+        sandbox = await free_sandboxes.get()
+        try:
+            async with budget().reserve(1, memory):
+                # Grupa mogła nie przejść, gdy test czekał na wolną piaskownicę lub budżet
+                if group_name is not None and group_failed[group_name]:
+                    print(f"Skipping test {test.name}: group {group_name} already failed")
+                    return None
+                running[sandbox] = (test, group_name)
+                print(f"Running test: {test.name}")
+                result = await run_test(sandbox, test)
+        finally:
+            running.pop(sandbox, None)
+            # Piaskownica przerywanego testu wraca do puli dopiero po kill_processes
+            if sandbox in killing:
+                await killing[sandbox].wait()
+            free_sandboxes.put_nowait(sandbox)
+        if test.id in cancelled:
+            print(f"Test {test.name} cancelled, treated as skipped")
+            return None
+        print(f"Result for {test.name}: {result}")
+        if result != "OK" and group_name is not None and not group_failed[group_name]:
+            print(f"Group {group_name} failed due to: {result}")
+            await fail_group(group_name)
+        return result
+
+    await asyncio.gather(
+        *(worker(test, group_name) for group_name, tests in grouped_tests.items() for test in tests),
+        *(worker(test, None) for test in ungrouped_tests)
+    )
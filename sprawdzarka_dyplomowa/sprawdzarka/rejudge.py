@@ -0,0 +1,143 @@
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from .dispatch import PRIORITY_REJUDGE, send_to_judge
+from .fingerprint import stale_results
+from .models import RejudgeBatch, RejudgeItem, Solution
+
+# Ponowne ocenianie wielu rozwiązań naraz (np. po poprawieniu testów zadania).
+# Rozwiązania trafiają do oceny partiami (feed_rejudge co SPRAWDZARKA_REJUDGE_INTERVAL s)
+# z najniższym priorytetem, żeby nie zagłodzić bieżących zgłoszeń. Stare wyniki testów
+# zostają widoczne do końca oceniania i są podmieniane w jednej transakcji (ResultBuffer.save).
+# Jeśli partia nie jest pełna, uruchamiane są tylko testy nowe lub zmienione (odciski w fingerprint.py).
+# Pozycje zgubione po drodze (SPRAWDZARKA_REJUDGE_ITEM_TIMEOUT) feed przekazuje ponownie albo kończy
+# błędem, więc nie blokują limitu SPRAWDZARKA_REJUDGE_MAX_IN_FLIGHT ani zakończenia partii.
+
+
+def start_rejudge(solutions, user, description, full=False):
+    """Tworzy partię ponownego oceniania i uruchamia jej podawanie do sędziego.
+    Przy `full` wszystkie testy są uruchamiane od nowa."""
+    # Rozwiązania, które dopiero czekają na ocenę, i tak zostaną ocenione od nowa
+    solution_ids = list(solutions.exclude(status__in=['waiting', 'testing']).values_list('id', flat=True))
+    with transaction.atomic():
+        batch = RejudgeBatch.objects.create(created_by=user, description=description, total=len(solution_ids), full=full)
+        RejudgeItem.objects.bulk_create(
+            [RejudgeItem(batch=batch, solution_id=solution_id) for solution_id in solution_ids],
+            batch_size=500
+        )
+    if solution_ids:
+        transaction.on_commit(lambda: current_app.send_task('sprawdzarka.tasks.feed_rejudge', args=(batch.id,)))
+    else:
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=['finished_at'])
+    return batch
+
+
+def _recover_lost_items(batch_id):
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.SPRAWDZARKA_REJUDGE_ITEM_TIMEOUT)
+    # Ocenianie zaczęte i nieskończone (np. awaria workera) - pozycja kończy się błędem;
+    # późniejsze finish_item i tak zapisze jej wynik, gdyby worker jednak skończył
+    failed = RejudgeItem.objects.filter(batch_id=batch_id, status='queued', started_at__lt=cutoff).update(
+        status='error', finished_at=now
+    )
+    if failed:
+        print(f"Rejudge batch {batch_id}: {failed} item(s) timed out while judging")
+    # Zadanie, którego żaden worker nie zaczął oceniać (zgubione w kolejce) - przekazujemy je ponownie
+    lost = RejudgeItem.objects.filter(
+        batch_id=batch_id, status='queued', started_at__isnull=True, queued_at__lt=cutoff
+    ).select_related('solution')
+    for item in lost:
+        if RejudgeItem.objects.filter(id=item.id, status='queued', started_at__isnull=True, queued_at=item.queued_at).update(queued_at=now):
+            print(f"Rejudge item {item.id} was not started in time, sending it again")
+            send_to_judge(item.solution, PRIORITY_REJUDGE, rejudge_item_id=item.id)
+
+
+def _close_if_finished(batch_id, finished_at):
+    if not RejudgeItem.objects.filter(batch_id=batch_id, status__in=['pending', 'queued']).exists():
+        RejudgeBatch.objects.filter(id=batch_id, finished_at__isnull=True).update(finished_at=finished_at)
+        return True
+    return False
+
+
+def feed(batch_id):
+    """Przekazuje sędziemu kolejną porcję partii. Zwraca True, dopóki partia ma pozycje do przekazania
+    lub oceniane - do końca partii trzeba pilnować zgubionych pozycji."""
+    _recover_lost_items(batch_id)
+    in_flight = RejudgeItem.objects.filter(batch_id=batch_id, status='queued').count()
+    room = min(settings.SPRAWDZARKA_REJUDGE_RATE, settings.SPRAWDZARKA_REJUDGE_MAX_IN_FLIGHT - in_flight)
+    if room > 0:
+        items = RejudgeItem.objects.filter(batch_id=batch_id, status='pending').select_related('solution').order_by('id')[:room]
+        for item in items:
+            # Warunkowa aktualizacja - ta sama pozycja nie trafi do sędziego dwa razy
+            if RejudgeItem.objects.filter(id=item.id, status='pending').update(status='queued', queued_at=timezone.now()):
+                send_to_judge(item.solution, PRIORITY_REJUDGE, rejudge_item_id=item.id)
+    return not _close_if_finished(batch_id, timezone.now())
+
+
+def start_item(item_id):
+    """Zapisuje początek oceniania pozycji partii przez workera."""
+    RejudgeItem.objects.filter(id=item_id, status='queued').update(started_at=timezone.now())
+
+
+def is_incremental(item_id):
+    return not RejudgeBatch.objects.filter(items__id=item_id, full=True).exists()
+
+
+def finish_item(item_id):
+    """Zapisuje koniec oceniania pozycji partii; zamyka partię po ostatniej pozycji."""
+    item = RejudgeItem.objects.select_related('solution').get(id=item_id)
+    item.status = 'done' if item.solution.status == 'done' else 'error'
+    item.finished_at = timezone.now()
+    item.save(update_fields=['status', 'finished_at'])
+    _close_if_finished(item.batch_id, item.finished_at)
+
+
+def progress(batch):
+    """Postęp partii z szacowanym czasem do końca (w sekundach), liczonym z dotychczasowego tempa."""
+    counts = dict(batch.items.values_list('status').annotate(count=Count('id')))
+    finished = counts.get('done', 0) + counts.get('error', 0)
+    remaining = batch.total - finished
+    times = batch.items.aggregate(first_queued=Min('queued_at'), last_finished=Max('finished_at'))
+
+    eta = None
+    if remaining and finished and times['first_queued'] and times['last_finished']:
+        elapsed = (times['last_finished'] - times['first_queued']).total_seconds()
+        eta = round(elapsed / finished * remaining)
+
+    return {
+        'id': batch.id,
+        'description': batch.description,
+        'created_at': batch.created_at,
+        'finished_at': batch.finished_at,
+        'total': batch.total,
+        'pending': counts.get('pending', 0),
+        'queued': counts.get('queued', 0),
+        'done': counts.get('done', 0),
+        'error': counts.get('error', 0),
+        'eta_seconds': eta,
+    }
+
+
+def solutions_for(user, contest=None, task=None, lang=None, status=None, since=None, stale=False):
+    """Rozwiązania do ponownej oceny, ograniczone do kursów i zadań, którymi `user` zarządza.
+    Ze `stale` tylko ocenione na starszej wersji zestawu testów zadania."""
+    solutions = Solution.objects.all()
+    if user.role != 'admin':
+        solutions = solutions.filter(contest_task__contest__teacher=user) | solutions.filter(contest_task__task__author=user)
+    if contest:
+        solutions = solutions.filter(contest_task__contest=contest)
+    if task:
+        solutions = solutions.filter(contest_task__task=task)
+    if lang:
+        solutions = solutions.filter(lang=lang)
+    if status:
+        solutions = solutions.filter(status=status)
+    if since:
+        solutions = solutions.filter(send_date__date__gte=since)
+    if stale:
+        solutions = solutions.filter(stale_results())
+    return solutions.distinct()
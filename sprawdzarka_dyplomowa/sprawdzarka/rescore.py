@@ -0,0 +1,93 @@
+from collections import Counter, defaultdict
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from .fingerprint import result_fingerprint
+from .models import Solution, SolutionTestResult, Task, Test, TestGroup
+from .scoring import points_from_counts
+
+# Przeliczanie punktów po zmianie punktacji zadania (grupy, ich punkty, przynależność testów)
+# wyłącznie z zapisanych wyników testów, bez ponownego uruchamiania rozwiązań.
+# Rozwiązania są przetwarzane partiami po SPRAWDZARKA_RESCORE_BATCH: jedno zapytanie pobiera
+# ich wyniki testów, a punkty i wersje zapisywane są zbiorczo - po jednym UPDATE na parę wartości.
+# Testy pominięte przy ocenie (po niezaliczeniu grupy) nie mają wyników i liczą się jako
+# niezaliczone; przyrostowa ponowna ocena uruchomi je, bo nie mają zachowanego wyniku.
+# Rozwiązanie, którego wyniki odpowiadają bieżącym testom zadania, dostaje przy tym bieżącą
+# wersję zestawu testów (Task.test_set_version) - zmiana samej punktacji nie czyni go nieaktualnym.
+
+
+def _judged_on_current_tests(results, current_fingerprints, test_groups):
+    """Czy wyniki rozwiązania ((id testu, zaliczony, odcisk)) obejmują bieżące wersje wszystkich
+    testów. Brak wyniku testu grupy jest w porządku, gdy grupa ma aktualny niezaliczony test."""
+    current = {
+        test_id: passed for test_id, passed, result_fingerprint in results
+        if result_fingerprint and result_fingerprint == current_fingerprints.get(test_id)
+    }
+    failed_groups = {test_groups[test_id] for test_id, passed in current.items() if not passed} - {None}
+    return all(
+        test_id in current or test_groups[test_id] in failed_groups
+        for test_id in current_fingerprints
+    )
+
+
+def schedule(task_id):
+    """Zleca przeliczenie punktów zadania po zatwierdzeniu bieżącej transakcji."""
+    transaction.on_commit(lambda: current_app.send_task('sprawdzarka.tasks.rescore_solutions', args=(task_id,)))
+
+
+def rescore(task_id):
+    """Przelicza final_points (i wersję zestawu testów) ocenionych rozwiązań zadania.
+
+    Zwraca liczbę rozwiązań, którym zmieniły się punkty.
+    """
+    task = Task.objects.only('time_limit', 'memory_limit', 'test_set_version').get(id=task_id)
+    group_points = dict(TestGroup.objects.filter(task_id=task_id).values_list('id', 'points'))
+    tests = list(Test.objects.filter(task_id=task_id).values_list('id', 'group_id', 'content_hash'))
+    test_counts = Counter(group_id for _, group_id, _ in tests)
+    test_groups = {test_id: group_id for test_id, group_id, _ in tests}
+    current_fingerprints = {
+        test_id: result_fingerprint(content_hash, task) if content_hash else None
+        for test_id, _, content_hash in tests
+    }
+
+    solutions = Solution.objects.filter(contest_task__task_id=task_id, status='done').order_by('id')
+    changed = 0
+    last_id = 0
+    while True:
+        batch = list(solutions.filter(id__gt=last_id).values_list('id', 'final_points', 'test_set_version')[:settings.SPRAWDZARKA_RESCORE_BATCH])
+        if not batch:
+            break
+        current_points = {solution_id: final_points for solution_id, final_points, _ in batch}
+        last_id = max(current_points)
+
+        solution_results = defaultdict(list)
+        for solution_id, test_id, passed, fingerprint in (
+            SolutionTestResult.objects
+            .filter(solution_id__in=list(current_points), test__task_id=task_id)
+            .values_list('solution_id', 'test_id', 'passed', 'fingerprint')
+        ):
+            solution_results[solution_id].append((test_id, passed, fingerprint))
+
+        # Rozwiązania pogrupowane według nowej liczby punktów i wersji - jeden UPDATE na parę
+        updates = defaultdict(list)
+        for solution_id, final_points, version in batch:
+            passed_counts = Counter(
+                test_groups[test_id] for test_id in {test_id for test_id, passed, _ in solution_results[solution_id] if passed}
+            )
+            points = points_from_counts(group_points, test_counts, passed_counts)
+            new_version = version
+            if _judged_on_current_tests(solution_results[solution_id], current_fingerprints, test_groups):
+                new_version = task.test_set_version
+            if points != final_points or new_version != version:
+                updates[(points, new_version)].append(solution_id)
+            if points != final_points:
+                changed += 1
+
+        with transaction.atomic():
+            for (points, version), solution_ids in updates.items():
+                Solution.objects.filter(id__in=solution_ids, status='done').update(
+                    final_points=points, test_set_version=version
+                )
+
+    print(f"Rescored task {task_id}: {changed} solution(s) changed")
+    return changed
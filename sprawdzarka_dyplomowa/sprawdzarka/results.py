@@ -0,0 +1,119 @@
+import threading
+from django.core.cache import cache
+from django.db import transaction
+from .models import SolutionTestResult
+
+# Wyniki testów zbierane w pamięci w trakcie oceniania i zapisywane do bazy jednym bulk_create,
+# w tej samej transakcji co końcowy status rozwiązania. Postęp oceniania widać w tym czasie
+# przez wspólny cache (Redis), bez zapisów do bazy.
+PROGRESS_PREFIX = 'sprawdzarka:progress:'
+PROGRESS_TIMEOUT = 3600  # s; postęp porzuconego oceniania sam wygasa
+
+
+def get_progress(solution_id):
+    """Postęp oceniania rozwiązania: {'done', 'failed', 'total'} albo None, gdy nic nie wiadomo."""
+    try:
+        return cache.get(PROGRESS_PREFIX + str(solution_id))
+    except Exception:
+        return None
+
+
+class ResultBuffer:
+    """Bufor wyników testów jednego rozwiązania, bezpieczny dla wątków uruchamiających testy.
+
+    `fingerprints` to odciski testów ({id testu: odcisk}) zapisywane z wynikami, a
+    `test_set_version` - wersja zestawu testów zadania, na której rozwiązanie oceniono. Wyniki
+    zachowane z poprzedniej oceny (keep_matching) nie są ponownie zapisywane ani usuwane.
+    `clean` spada na False, gdy któryś wynik zależy od awarii po stronie sędziego (ERR, limit
+    czasu pilnowany przez hosta zamiast judge_runnera) - takiej oceny nie wolno zapamiętać.
+    """
+
+    def __init__(self, solution, total_tests, fingerprints=None, test_set_version=None):
+        self.solution = solution
+        self.test_set_version = test_set_version
+        self.rows = []
+        self.kept = {}
+        self.cancelled = set()
+        self.clean = True
+        self.failed = 0
+        self.total_tests = total_tests
+        self.fingerprints = fingerprints or {}
+        self.lock = threading.Lock()
+        self._publish_progress()
+
+    def keep_matching(self):
+        """Zachowuje zapisane wyniki testów, których odcisk się nie zmienił."""
+        with self.lock:
+            for row in SolutionTestResult.objects.filter(solution=self.solution):
+                if row.fingerprint and row.fingerprint == self.fingerprints.get(row.test_id):
+                    self.kept[row.test_id] = row
+                    # Limit czasu bez pomiaru judge_runnera pochodzi z timeoutu po stronie hosta
+                    if row.final_status == 'ERR' or (row.final_status == 'TLE' and row.time is None):
+                        self.clean = False
+                    if not row.passed:
+                        self.failed += 1
+            self._publish_progress()
+        return self.kept
+
+    def passed_test_ids(self):
+        with self.lock:
+            return {row.test_id for row in list(self.kept.values()) + self.rows if row.passed}
+
+    def cancel(self, test):
+        """Test przerwany, bo jego grupa już nie przeszła: jak pominięty, jego wynik nie jest zapisywany."""
+        with self.lock:
+            self.cancelled.add(test.id)
+
+    def mark_unclean(self):
+        """Ocena niepełna albo zależna od awarii po stronie sędziego - nie trafi do pamięci werdyktów."""
+        with self.lock:
+            self.clean = False
+
+    def add(self, test, passed, status, time=None, wall_time=None, memory=None, host_timeout=False):
+        """Dodaje wynik testu; `host_timeout` oznacza limit czasu wykryty przez hosta, nie judge_runnera."""
+        with self.lock:
+            if test.id in self.cancelled:
+                return
+            if status == 'ERR' or host_timeout:
+                self.clean = False
+            self.rows.append(SolutionTestResult(
+                solution=self.solution,
+                test=test,
+                passed=passed,
+                final_status=status,
+                time=time,
+                wall_time=wall_time,
+                memory=memory,
+                fingerprint=self.fingerprints.get(test.id, '')
+            ))
+            if not passed:
+                self.failed += 1
+            self._publish_progress()
+
+    def _publish_progress(self):
+        try:
+            cache.set(
+                PROGRESS_PREFIX + str(self.solution.id),
+                {'done': len(self.kept) + len(self.rows), 'failed': self.failed, 'total': self.total_tests},
+                timeout=PROGRESS_TIMEOUT
+            )
+        except Exception as e:
+            # Postęp jest tylko podglądem - jego brak nie może przerwać oceniania
+            print(f"Could not publish progress of solution {self.solution.id}: {e}")
+
+    def save(self, status, final_points=None):
+        """Zapisuje zebrane wyniki i stan rozwiązania w jednej transakcji, zastępując poprzednie wyniki."""
+        with self.lock:
+            rows = list(self.rows)
+            kept_ids = [row.id for row in self.kept.values()]
+        with transaction.atomic():
+            SolutionTestResult.objects.filter(solution=self.solution).exclude(id__in=kept_ids).delete()
+            SolutionTestResult.objects.bulk_create(rows)
+            self.solution.status = status
+            self.solution.final_points = final_points
+            self.solution.test_set_version = self.test_set_version
+            self.solution.save(update_fields=['status', 'final_points', 'test_set_version'])
+        try:
+            cache.delete(PROGRESS_PREFIX + str(self.solution.id))
+        except Exception:
+            pass
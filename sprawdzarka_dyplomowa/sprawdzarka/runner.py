@@ -0,0 +1,132 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from django.conf import settings
+
+# Narzędzia sędziego montowane w każdej piaskownicy tylko do odczytu pod TOOLS_MOUNT,
+# żeby program rozwiązania nie mógł ich podmienić.
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_MOUNT = '/judge'
+RUNNER = TOOLS_MOUNT + '/judge_runner'
+HARNESS = TOOLS_MOUNT + '/judge_harness.sh'
+RUNNER_PIDS = 1  # Proces judge_runner działający obok programu
+RUNNER_TIMEOUT_SLACK = 2  # s, zapas na start polecenia w piaskownicy ponad limit pilnowany przez runner
+RUNNER_BUILD_IMAGE = 'gcc:9'
+JAIL = 'judge_jail'  # Piaskownica bez Dockera (native_sandbox), uruchamiana na hoście z katalogu narzędzi
+
+_tools_lock = threading.Lock()
+_tools_ready = False
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _install(source, target):
+    if os.path.exists(target) and _file_hash(source) == _file_hash(target):
+        return
+    tmp_target = f"{target}.tmp-{os.getpid()}"
+    shutil.copy(source, tmp_target)
+    os.replace(tmp_target, target)
+
+
+def _build_tool(tools_dir, name):
+    """Buduje statycznie narzędzie `name` z pliku `name`.c, jeśli źródło się zmieniło."""
+    source = os.path.join(SOURCE_DIR, f'{name}.c')
+    stamp_path = os.path.join(tools_dir, f'{name}.sha256')
+    source_hash = _file_hash(source)
+    if os.path.exists(os.path.join(tools_dir, name)) and os.path.exists(stamp_path):
+        with open(stamp_path) as stamp:
+            if stamp.read().strip() == source_hash:
+                return
+
+    print(f"Building {name}...")
+    _install(source, os.path.join(tools_dir, f'{name}.c'))
+    tmp_name = f"{name}.tmp-{os.getpid()}"
+    result = subprocess.run(
+        [
+            "docker", "run", "--rm",
+            "-v", f"{os.path.abspath(tools_dir)}:/build",
+            "-w", "/build",
+            RUNNER_BUILD_IMAGE,
+            "gcc", "-O2", "-static", "-o", tmp_name, f"{name}.c"
+        ],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        timeout=120,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Nie udało się zbudować {name}: {result.stderr}")
+    os.replace(os.path.join(tools_dir, tmp_name), os.path.join(tools_dir, name))
+    with open(stamp_path, 'w') as stamp:
+        stamp.write(source_hash)
+
+
+def ensure_tools():
+    """Przygotowuje katalog narzędzi (raz na proces; judge_runner i judge_jail budowane raz na host)."""
+    global _tools_ready
+    with _tools_lock:
+        if not _tools_ready:
+            tools_dir = settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT
+            os.makedirs(tools_dir, exist_ok=True)
+            _install(os.path.join(SOURCE_DIR, 'judge_harness.sh'), os.path.join(tools_dir, 'judge_harness.sh'))
+            _build_tool(tools_dir, 'judge_runner')
+            _build_tool(tools_dir, 'judge_jail')
+            _tools_ready = True
+
+
+def wrap(command, stats_name, time_limit, output_limit=None, time_overhead=0):
+    """Polecenie uruchamiające `command` przez judge_runner z limitem czasu w sekundach (plus narzut
+    startu środowiska języka w ms) i wyjścia w bajtach."""
+    limits = ["-t", str(time_limit * 1000 + time_overhead)]
+    if output_limit is not None:
+        limits += ["-o", str(output_limit)]
+    return [RUNNER] + limits + ["-s", stats_name, "--"] + command
+
+
+def read_stats(path):
+    """Odczytuje i usuwa plik statystyk zapisany przez judge_runner; None, gdy go nie ma."""
+    try:
+        with open(path) as stats_file:
+            values = stats_file.read().split()
+        os.remove(path)
+    except FileNotFoundError:
+        return None
+    if len(values) != 8:
+        return None
+
+    cpu_ms, wall_ms, peak_kb, exit_code, signal_number, oom_killed, timed_out, output_exceeded = (int(value) for value in values)
+    return {
+        'cpu_ms': cpu_ms,
+        'wall_ms': wall_ms,
+        'peak_kb': peak_kb,
+        'exit_code': exit_code,
+        'signal': signal_number,
+        'oom_killed': bool(oom_killed),
+        'timed_out': bool(timed_out),
+        'output_exceeded': bool(output_exceeded),
+    }
+
+
+def without_overhead(ms, time_overhead):
+    """Zmierzony czas programu bez narzutu startu środowiska języka."""
+    return max(0, ms - time_overhead)
+
+
+def failure_status(stats, stderr, language):
+    """Werdykt dla programu, który nie zakończył się poprawnie; None, gdy zakończył się z kodem 0."""
+    if stats is None:
+        return 'ERR'
+    if stats['timed_out']:
+        return 'TLE'
+    if stats['output_exceeded']:
+        return 'OLE'
+    if stats['oom_killed'] or any(marker in (stderr or '') for marker in language.get('memory_error_markers', [])):
+        return 'MLE'
+    if stats['exit_code'] != 0:
+        return 'ERR'
+    return None
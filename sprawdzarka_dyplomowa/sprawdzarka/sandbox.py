@@ -0,0 +1,449 @@
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from .capture import run_bounded
+from .runner import TOOLS_MOUNT
+
+DOCKER_TIMEOUT = 30  # Limit czasu na pojedyncze polecenie zarządzające kontenerem
+
+
+def tools_mount():
+    """Argument `-v` montujący narzędzia sędziego (judge_runner, harness) tylko do odczytu."""
+    tools_dir = settings.SPRAWDZARKA_JUDGE_TOOLS_ROOT
+    os.makedirs(tools_dir, exist_ok=True)
+    return f"{os.path.abspath(tools_dir)}:{TOOLS_MOUNT}:ro"
+
+
+_image_digests = {}
+
+
+def image_digest(image, refresh=False):
+    """Identyfikator obrazu Dockera (zapamiętywany na czas życia procesu workera;
+    `refresh` odczytuje go ponownie, np. po podmianie obrazu na hoście)."""
+    if refresh or image not in _image_digests:
+        try:
+            result = subprocess.run(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", image],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                timeout=DOCKER_TIMEOUT,
+                text=True
+            )
+            digest = result.stdout.strip() if result.returncode == 0 else ""
+        except Exception as e:
+            print(f"Could not inspect image {image}: {e}")
+            digest = ""
+        if not digest:
+            return image
+        _image_digests[image] = digest
+    return _image_digests[image]
+
+
+class CommandSandbox:
+    """Wspólna część piaskownic, których polecenia są procesami na hoście (`docker`, judge_jail)."""
+
+    backend = None
+    env = None  # Środowisko procesu na hoście (None - środowisko workera)
+
+    def _command(self, command, interactive):
+        raise NotImplementedError
+
+    def execute(self, command, stdin=None, timeout=None):
+        return subprocess.run(
+            self._command(command, stdin is not None),
+            stdin=stdin if stdin is not None else subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+            text=True,
+            env=self.env
+        )
+
+    def execute_bounded(self, command, stdin=None, timeout=None, output_limit=None):
+        """Jak execute, ale wyjście programu z testu przechwytywane z limitem (capture.run_bounded)."""
+        return run_bounded(
+            self._command(command, stdin is not None),
+            stdin=stdin,
+            timeout=timeout,
+            output_limit=output_limit,
+            on_limit=self.kill_processes,
+            env=self.env
+        )
+
+    def spawn(self, command, stdin=False):
+        """Uruchamia polecenie bez czekania; wyjście czytane na bieżąco z `stdout`.
+        Przy `stdin` wejście polecenia zapisuje się (bajtowo) do `stdin.buffer`."""
+        return subprocess.Popen(
+            self._command(command, stdin),
+            stdin=subprocess.PIPE if stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=self.env
+        )
+
+
+class DockerCliSandbox(CommandSandbox):
+    """Wspólna część piaskownic sterowanych przez polecenie `docker`."""
+
+    backend = 'docker'
+
+
+class DockerRunSandbox(DockerCliSandbox):
+    """Tryb bez puli: każde polecenie uruchamiane w nowym kontenerze `docker run --rm`."""
+
+    def __init__(self, image, workspace):
+        self.image = image
+        self.workspace = workspace
+        self.memory_limit = None
+        self.pids_limit = None
+        self.cpuset = None
+        self.container = None  # Nazwa kontenera ostatniego polecenia
+
+    def put(self, path, name=None):
+        target = os.path.join(self.workspace, name or os.path.basename(path))
+        if os.path.abspath(path) != os.path.abspath(target):
+            shutil.copy(path, target)
+        return target
+
+    def set_limits(self, memory_limit, pids_limit):
+        self.memory_limit = memory_limit
+        self.pids_limit = pids_limit
+
+    def set_cpuset(self, cpus):
+        self.cpuset = cpus
+
+    def _command(self, command, interactive):
+        self.container = f"sprawdzarka-run-{uuid.uuid4().hex[:12]}"
+        docker_command = ["docker", "run", "--rm", "--name", self.container]
+        if interactive:
+            docker_command.append("-i")
+        docker_command += [
+            "-v", f"{os.path.abspath(self.workspace)}:/app",
+            "-v", tools_mount(),
+            "-w", "/app"
+        ]
+        if self.pids_limit:
+            docker_command.append(f"--pids-limit={self.pids_limit}")
+        if self.memory_limit:
+            docker_command += [f"--memory={self.memory_limit}m", f"--memory-swap={self.memory_limit}m"]
+        if self.cpuset:
+            docker_command.append(f"--cpuset-cpus={self.cpuset}")
+        docker_command += [self.image] + command
+        print(f"Executing Docker command: {' '.join(docker_command)}")
+        return docker_command
+
+    def kill_processes(self):
+        # Zabicie samego klienta `docker run` nie zatrzymuje kontenera
+        if self.container:
+            subprocess.run(
+                ["docker", "kill", self.container],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                timeout=DOCKER_TIMEOUT
+            )
+
+
+class PooledContainer(DockerCliSandbox):
+    """Uruchomiony zawczasu kontener, do którego polecenia trafiają przez `docker exec`."""
+
+    def __init__(self, image):
+        self.image = image
+        self.name = f"sprawdzarka-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.workspace = os.path.join(settings.SPRAWDZARKA_SANDBOX_ROOT, self.name)
+        self.memory_limit = None
+        self.pids_limit = None
+        self.cpuset = None
+        self.uses = 0
+
+    def _docker(self, *args, timeout=DOCKER_TIMEOUT):
+        return subprocess.run(
+            ["docker", *args],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+            text=True
+        )
+
+    def start(self):
+        os.makedirs(self.workspace, exist_ok=True)
+        result = self._docker(
+            "run", "-d", "--rm",
+            "--name", self.name,
+            "--label", "sprawdzarka.sandbox=1",
+            "--network", "none",
+            f"--memory={settings.SPRAWDZARKA_SANDBOX_MEMORY}m",
+            f"--memory-swap={settings.SPRAWDZARKA_SANDBOX_MEMORY}m",
+            "-v", f"{os.path.abspath(self.workspace)}:/app",
+            "-v", tools_mount(),
+            "-w", "/app",
+            self.image,
+            "sleep", "infinity"
+        )
+        if result.returncode != 0:
+            shutil.rmtree(self.workspace, ignore_errors=True)
+            raise RuntimeError(f"Nie udało się uruchomić kontenera {self.image}: {result.stderr}")
+        print(f"Sandbox container started: {self.name} ({self.image})")
+
+    def is_healthy(self):
+        try:
+            return self._docker("exec", self.name, "true", timeout=5).returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def put(self, path, name=None):
+        target = os.path.join(self.workspace, name or os.path.basename(path))
+        shutil.copy(path, target)
+        return target
+
+    def _update_limits(self, memory_limit, pids_limit):
+        # Bez limitów wracamy do ustawień puli (kompilacja, sprzątanie)
+        memory_limit = memory_limit or settings.SPRAWDZARKA_SANDBOX_MEMORY
+        # Proces `sleep infinity` utrzymujący kontener też liczy się do limitu procesów
+        pids_limit = pids_limit + 1 if pids_limit else -1
+        result = self._docker(
+            "update",
+            f"--memory={memory_limit}m", f"--memory-swap={memory_limit}m",
+            f"--pids-limit={pids_limit}",
+            self.name
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Nie udało się ustawić limitów kontenera {self.name}: {result.stderr}")
+
+    def set_limits(self, memory_limit, pids_limit):
+        self._update_limits(memory_limit, pids_limit)
+        self.memory_limit = memory_limit
+        self.pids_limit = pids_limit
+
+    def set_cpuset(self, cpus):
+        # None - z powrotem wszystkie rdzenie hosta
+        from .cpuset import online_cpus
+        result = self._docker("update", f"--cpuset-cpus={cpus or online_cpus()}", self.name)
+        if result.returncode != 0:
+            raise RuntimeError(f"Nie udało się przypiąć kontenera {self.name} do rdzeni {cpus}: {result.stderr}")
+        self.cpuset = cpus
+
+    def _command(self, command, interactive):
+        docker_command = ["docker", "exec"]
+        if interactive:
+            docker_command.append("-i")
+        docker_command += ["-w", "/app", self.name] + command
+        print(f"Executing Docker command: {' '.join(docker_command)}")
+        return docker_command
+
+    def kill_processes(self):
+        # Po przekroczeniu czasu proces w kontenerze nadal działa - zabijamy wszystko poza procesem 1.
+        # Limit procesów podnosimy na chwilę, żeby samo `docker exec` mogło wystartować.
+        self._update_limits(None, None)
+        self._docker("exec", self.name, "sh", "-c", "kill -9 -1")
+        self._update_limits(self.memory_limit, self.pids_limit)
+
+    def reset(self):
+        self.set_limits(None, None)
+        if self.cpuset:
+            self.set_cpuset(None)
+        result = self._docker(
+            "exec", self.name, "sh", "-c",
+            "kill -9 -1; rm -rf /app/* /app/.[!.]* /app/..?* /tmp/*"
+        )
+        return result.returncode == 0
+
+    def destroy(self):
+        try:
+            self._docker("rm", "-f", self.name)
+        except Exception as e:
+            print(f"Error while removing container {self.name}: {e}")
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+
+class ContainerPool:
+    """Pula kontenerów jednego obrazu w obrębie procesu workera."""
+
+    def __init__(self, image, size, max_reuse):
+        self.image = image
+        self.size = size
+        self.max_reuse = max_reuse
+        self.idle = []
+        self.total = 0
+        self.condition = threading.Condition()
+
+    def _create(self):
+        container = PooledContainer(self.image)
+        try:
+            container.start()
+        except Exception:
+            with self.condition:
+                self.total -= 1
+                self.condition.notify()
+            raise
+        return container
+
+    def _discard(self, container):
+        container.destroy()
+        with self.condition:
+            self.total -= 1
+            self.condition.notify()
+
+    def warm_up(self, count):
+        while True:
+            with self.condition:
+                if self.total >= min(count, self.size):
+                    return
+                self.total += 1
+            container = self._create()
+            with self.condition:
+                self.idle.append(container)
+                self.condition.notify()
+
+    def acquire(self, block=True):
+        while True:
+            with self.condition:
+                while not self.idle and self.total >= self.size:
+                    if not block:
+                        return None
+                    self.condition.wait()
+                if self.idle:
+                    container = self.idle.pop()
+                else:
+                    self.total += 1
+                    container = None
+
+            if container is None:
+                return self._create()
+            if container.is_healthy():
+                return container
+            print(f"Sandbox container {container.name} failed health check, replacing it.")
+            self._discard(container)
+
+    def release(self, container, broken=False):
+        container.uses += 1
+        try:
+            reusable = not broken and container.uses < self.max_reuse and container.reset()
+        except Exception as e:
+            print(f"Error while resetting container {container.name}: {e}")
+            reusable = False
+        if not reusable:
+            self._discard(container)
+            return
+        with self.condition:
+            self.idle.append(container)
+            self.condition.notify()
+
+    def shutdown(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.total -= len(idle)
+        for container in idle:
+            container.destroy()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(image):
+    with _pools_lock:
+        if image not in _pools:
+            _pools[image] = ContainerPool(
+                image,
+                settings.SPRAWDZARKA_SANDBOX_POOL_SIZE,
+                settings.SPRAWDZARKA_SANDBOX_MAX_REUSE
+            )
+        return _pools[image]
+
+
+def backend_for(lang):
+    """Rodzaj piaskownicy dla języka: 'docker', 'docker-api' (Engine API, docker_api.py)
+    albo 'native' (judge_jail, native_sandbox.py)."""
+    return settings.SPRAWDZARKA_SANDBOX_BACKENDS.get(lang, 'docker')
+
+
+@contextmanager
+def sandbox_session(image, workspace, block=True, backend='docker'):
+    """Zwraca piaskownicę na czas oceniania jednego rozwiązania.
+
+    Z `block=False` zwraca None zamiast czekać, gdy pula jest wyczerpana.
+    """
+    if backend == 'native':
+        from .native_sandbox import NativeSandbox
+        sandbox = NativeSandbox(image)
+        try:
+            yield sandbox
+        finally:
+            sandbox.destroy()
+        return
+    if backend == 'docker-api':
+        from .docker_api import DockerApiSandbox
+        yield DockerApiSandbox(image, workspace)
+        return
+
+    if not settings.SPRAWDZARKA_SANDBOX_POOL:
+        yield DockerRunSandbox(image, workspace)
+        return
+
+    pool = get_pool(image)
+    container = pool.acquire(block)
+    if container is None:
+        yield None
+        return
+    broken = False
+    try:
+        yield container
+    except Exception:
+        broken = True
+        raise
+    finally:
+        pool.release(container, broken)
+
+
+def clone_sandboxes(stack, sandbox, count):
+    """Dokłada do `count` piaskownic z plikami i limitami `sandbox`, zamykanych razem z `stack`.
+
+    Zwraca tyle, ile udało się uzyskać bez czekania na pulę.
+    """
+    clones = []
+    for _ in range(count):
+        clone = stack.enter_context(sandbox_session(sandbox.image, sandbox.workspace, block=False, backend=sandbox.backend))
+        if clone is None:
+            break
+        for name in os.listdir(sandbox.workspace):
+            path = os.path.join(sandbox.workspace, name)
+            if os.path.isfile(path):
+                clone.put(path)
+        clone.set_limits(sandbox.memory_limit, sandbox.pids_limit)
+        clones.append(clone)
+    return clones
+
+
+def shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+@worker_process_init.connect
+def _warm_up_pools(**kwargs):
+    if not settings.SPRAWDZARKA_SANDBOX_POOL:
+        return
+
+    # Start kontenerów trwa dłużej niż limit inicjalizacji procesu workera, więc robimy to w tle
+    def warm_up():
+        for image in settings.SPRAWDZARKA_SANDBOX_POOL_IMAGES:
+            try:
+                get_pool(image).warm_up(settings.SPRAWDZARKA_SANDBOX_POOL_WARM)
+            except Exception as e:
+                print(f"Could not warm up sandbox pool for {image}: {e}")
+
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
+@worker_process_shutdown.connect
+def _shutdown_pools(**kwargs):
+    shutdown_pools()
@@ -0,0 +1,35 @@
+# Punktacja rozwiązania na podstawie wyników poszczególnych testów:
+# grupa daje swoje punkty, gdy przeszły wszystkie jej testy, a pozostałe punkty
+# (do 100) dzielone są proporcjonalnie między testy bez grupy.
+
+
+def points_from_counts(group_points, test_counts, passed_counts):
+    """Punkty z liczby testów i zaliczonych testów w każdej grupie.
+
+    `group_points` to punkty grup, a `test_counts` i `passed_counts` - liczby testów
+    i zaliczonych testów w grupach; testy bez grupy są pod kluczem None.
+    """
+    group_total_points = sum(group_points.values())
+    points = sum(
+        group_points_value for group, group_points_value in group_points.items()
+        if passed_counts.get(group, 0) >= test_counts.get(group, 0)
+    )
+
+    ungrouped_num = test_counts.get(None, 0)
+    if ungrouped_num > 0:
+        points += passed_counts.get(None, 0) * (100 - group_total_points) // ungrouped_num
+    else:
+        points += 100 - group_total_points
+    return points
+
+
+def compute_points(test_groups, grouped_tests, ungrouped_tests, passed_test_ids):
+    group_points = {group.name: group.points for group in test_groups}
+    test_counts = {group.name: len(grouped_tests.get(group.name, [])) for group in test_groups}
+    passed_counts = {
+        group.name: sum(1 for test in grouped_tests.get(group.name, []) if test.id in passed_test_ids)
+        for group in test_groups
+    }
+    test_counts[None] = len(ungrouped_tests)
+    passed_counts[None] = sum(1 for test in ungrouped_tests if test.id in passed_test_ids)
+    return points_from_counts(group_points, test_counts, passed_counts)
@@ -1,10 +1,20 @@
+import asyncio
 import os
+import queue
 import shutil
 import platform
 import subprocess
-from celery import shared_task
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from celery import current_app, shared_task
+from django.conf import settings
 from django.db import transaction
-from .models import Solution, Test, TestGroup, SolutionTestResult
+from .models import Solution, Test, TestGroup
+from . import admission, artifacts, batch, checker, compile_cache, cpuset, fingerprint, jvm, metrics, orchestrator, rejudge, rescore, runner, scoring, test_cache, verdict_cache
+from .dispatch import dispatch_pending
+from .results import ResultBuffer
+from .sandbox import backend_for, sandbox_session, clone_sandboxes
 from django.utils.timezone import now  # Używane do łapania aktualnego czasu, jeśli kiedyś chcemy mierzyć czas testów.
 
 # def windows_to_linux_path(path):
@@ -13,533 +23,597 @@ from django.utils.timezone import now  # Używane do łapania aktualnego czasu,
 #         return path.replace("\\", "/").replace("C:", "/mnt/c")
 #     return path
 
-@shared_task
-def execute_cpp(solution_id):
-    print(f"Executing C++ for solution ID: {solution_id}...")
-    
-    # 1. Getting solution info...
-    print("Getting solution info...")
-    try:
-        with transaction.atomic():
-            solution = Solution.objects.select_related('contest_task__task', 'author').get(id=solution_id)
-            print(f"Solution retrieved: {solution}")
-            task = solution.contest_task.task
-            src_path = os.path.join("media", "solutions", solution.src_path)
-            folder_path, file_name = os.path.split(src_path)
-            compiled_file_name = os.path.splitext(file_name)[0]
-            compiled_file_path = os.path.join(folder_path, compiled_file_name)
-            task_folder = task.pdf_file.split("\\")[1]  # Pobranie folderu zadania z pdf_file
-            test_folder = os.path.join("media", "tasks", task_folder, "tests")
+# Konfiguracja języków: obraz Dockera, polecenia kompilacji i uruchomienia oraz limity środowiska
+LANGUAGES = {
+    'C/C++': {
+        'name': 'C++',
+        'image': 'gcc:9',
+        'compiled_file': lambda file_name: os.path.splitext(file_name)[0],
+        'compile': lambda file_name, compiled_file: ["g++", file_name, "-o", compiled_file],
+        'run': lambda compiled_file, memory_limit: [f"./{compiled_file}"],
+        'memory_overhead': 0,
+        'time_overhead': lambda: settings.SPRAWDZARKA_TIME_OVERHEAD.get('C/C++', 0),
+        'pids_limit': 1,
+    },
+    'Java': {
+        'name': 'Java',
+        'image': jvm.IMAGE,
+        'compiled_file': lambda file_name: os.path.splitext(file_name)[0] + ".class",
+        'compile': lambda file_name, compiled_file: ["javac", file_name],
+        'run': lambda compiled_file, memory_limit: jvm.command(os.path.splitext(compiled_file)[0], memory_limit),
+        'memory_overhead': 40,  # Zapas pamięci dla JVM
+        'time_overhead': lambda: settings.SPRAWDZARKA_TIME_OVERHEAD.get('Java', 0),
+        'pids_limit': 15,  # Więcej wątków dla JVM
+        'memory_error_markers': ["java.lang.OutOfMemoryError"],
+    },
+    'C#': {
+        'name': 'C#',
+        'image': 'mono',
+        'compiled_file': lambda file_name: os.path.splitext(file_name)[0] + ".exe",
+        'compile': lambda file_name, compiled_file: ["csc", f"-out:{compiled_file}", file_name],
+        'run': lambda compiled_file, memory_limit: ["mono", "--gc-params=max-threads=1", compiled_file],
+        # Kompilacja AOT (SPRAWDZARKA_AOT_LANGUAGES): Mono sam wczytuje Main.exe.so obok Main.exe
+        'aot': lambda compiled_file: ["mono", "--aot", "-O=all", compiled_file],
+        'aot_file': lambda compiled_file: compiled_file + ".so",
+        'memory_overhead': 32,  # 32 MB na środowisko Mono
+        'time_overhead': lambda: settings.SPRAWDZARKA_TIME_OVERHEAD.get(
+            'C# AOT' if 'C#' in settings.SPRAWDZARKA_AOT_LANGUAGES else 'C#', 0
+        ),
+        'pids_limit': 10,
+        'memory_error_markers': ["System.OutOfMemoryException"],
+    },
+}
+
+
+AOT_TIMEOUT = 60  # s, kompilacja AOT trwa dłużej niż zwykła
+
+# Etap uruchamiania testów w trybie potokowym (SPRAWDZARKA_PIPELINE)
+RUN_TASKS = {
+    'C/C++': 'sprawdzarka.tasks.run_cpp',
+    'Java': 'sprawdzarka.tasks.run_java',
+    'C#': 'sprawdzarka.tasks.run_cs',
+}
+
+
+@shared_task(bind=True, max_retries=None)
+def execute_cpp(self, solution_id, rejudge_item_id=None):
+    start_judging(self, solution_id, 'C/C++', rejudge_item_id)
+
+
+@shared_task(bind=True, max_retries=None)
+def execute_java(self, solution_id, rejudge_item_id=None):
+    start_judging(self, solution_id, 'Java', rejudge_item_id)
+
+
+@shared_task(bind=True, max_retries=None)
+def execute_cs(self, solution_id, rejudge_item_id=None):
+    start_judging(self, solution_id, 'C#', rejudge_item_id)
+
+
+@shared_task(bind=True, max_retries=None)
+def run_cpp(self, solution_id, artifact, rejudge_item_id=None):
+    judge_admitted(self, solution_id, 'C/C++', rejudge_item_id, artifact)
+
+
+@shared_task(bind=True, max_retries=None)
+def run_java(self, solution_id, artifact, rejudge_item_id=None):
+    judge_admitted(self, solution_id, 'Java', rejudge_item_id, artifact)
+
+
+@shared_task(bind=True, max_retries=None)
+def run_cs(self, solution_id, artifact, rejudge_item_id=None):
+    judge_admitted(self, solution_id, 'C#', rejudge_item_id, artifact)
 
-            solution.status = 'testing'
-            solution.save()
-    except Solution.DoesNotExist:
-        print(f"Solution with ID {solution_id} does not exist.")
-        return
-    except Exception as e:
-        print(f"An error occurred while retrieving the solution: {e}")
-        return
-    
-    # 2. Getting grouped tests...
-    print("Getting grouped tests...")
-    try:
-        with transaction.atomic():
-            test_groups = TestGroup.objects.filter(task=task)
-            grouped_tests = {
-                group.name: list(group.tests.all())
-                for group in test_groups
-            }
-            ungrouped_tests = list(Test.objects.filter(task=task, group__isnull=True))
-    except Exception as e:
-        solution.status = 'error'
-        solution.save()
-        print(f"An error occurred while retrieving tests: {e}")
-        return
-    
-    # 3. Compile program...
-    print("Compile program...")
-    try:
-        docker_command = [
-            "docker", "run", "--rm",
-            "-v", f"{os.path.abspath(folder_path)}:/app",  # Montujemy katalog folder_path do /app
-            "-w", "/app",  # Pracujemy w katalogu /app w kontenerze
-            "gcc:9",  # Używamy obrazu gcc w wersji 9
-            "g++", file_name, "-o", compiled_file_name  # Kompilujemy file_name do compiled_file_name
-        ]
 
-        result = subprocess.run(
-            docker_command,
-            timeout=10,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            text=True
-        )
+@shared_task
+def feed_rejudge(batch_id):
+    # Kolejna porcja partii ponownego oceniania, dopóki zostały rozwiązania do przekazania
+    if rejudge.feed(batch_id):
+        feed_rejudge.apply_async((batch_id,), countdown=settings.SPRAWDZARKA_REJUDGE_INTERVAL)
 
-        # Logowanie wyjścia kompilacji
-        print(f"Compilation stdout:\n{result.stdout}")
-        print(f"Compilation stderr:\n{result.stderr}")
 
-        if result.returncode != 0:
-            print("Compilation failed:")
-            print(result.stderr)
-            solution.status = 'error'
-            solution.save()
-            # Sprzątanie w przypadku błędu kompilacji
-            try:
-                compiled_file_path = os.path.join(folder_path, compiled_file_name)
-                if os.path.exists(compiled_file_path):
-                    os.remove(compiled_file_path)
-            except Exception as cleanup_error:
-                print(f"Error during cleanup: {cleanup_error}")
-            return
-        else:
-            print("Compilation succeeded.")
-            compiled_file_path = os.path.join(folder_path, compiled_file_name)
-            print(f"Compiled file path: {compiled_file_path}")
-    except subprocess.TimeoutExpired:
-        print("Compilation timed out.")
-        solution.status = 'error'
-        solution.save()
-        # Sprzątanie w przypadku timeoutu
-        try:
-            compiled_file_path = os.path.join(folder_path, compiled_file_name)
-            if os.path.exists(compiled_file_path):
-                os.remove(compiled_file_path)
-        except Exception as cleanup_error:
-            print(f"Error during cleanup: {cleanup_error}")
-        return
-    except Exception as e:
-        solution.status = 'error'
-        solution.save()
-        print(f"An unexpected error occurred during compilation: {e}")
-        return
+@shared_task
+def dispatch_solutions():
+    # Okresowe przekazanie czekających rozwiązań (celery beat, co SPRAWDZARKA_DISPATCH_INTERVAL s)
+    dispatch_pending()
 
 
-    # 4. Testing program...
-    print("Testing program...")
-    total_points = 0
-    group_total_points = sum(group.points for group in test_groups)
-    group_points = 0
-    ungrouped_points = 0
-    ungrouped_tests_passed = 0
-    ungrouped_num = len(ungrouped_tests)
+@shared_task
+def rescore_solutions(task_id):
+    # Przeliczenie punktów zadania z zapisanych wyników po zmianie punktacji
+    rescore.rescore(task_id)
 
 
-    def execute_test(input_file, expected_output_file, test, solution, time_limit, memory_limit):
-        try:
-            # Kopiowanie plików do katalogu rozwiązania
-            copied_input = os.path.join(folder_path, os.path.basename(input_file))
-            copied_expected = os.path.join(folder_path, os.path.basename(expected_output_file))
-            shutil.copy(input_file, copied_input)
-            shutil.copy(expected_output_file, copied_expected)
-
-            # Uruchomienie programu
-            with open(copied_input, 'r') as input_file_handle:
-                docker_command = (
-                    f"docker run --rm -i "
-                    f"-v {os.path.abspath(folder_path)}:/app "
-                    f"-w /app "
-                    f"--pids-limit=1 "
-                    f"--memory={memory_limit}m --memory-swap={memory_limit}m "
-                    f"gcc:9 "
-                    f"bash -c ./{compiled_file_name}"
-                )
-                print(f"Executing Docker command: {docker_command}")
-                
-                result = subprocess.run(
-                    docker_command,
-                    shell=True,
-                    stdin=input_file_handle,
-                    capture_output=True,
-                    timeout=time_limit,
-                    text=True
-                )
+def job_demand(lang, task):
+    """Rdzenie i pamięć (MB) potrzebne do oceny rozwiązania zadania `task` w bieżącym trybie."""
+    language = LANGUAGES[lang]
+    test_memory = task.memory_limit + language['memory_overhead']
+    if settings.SPRAWDZARKA_JUDGE_MODE == 'batch':
+        return 1, test_memory + batch.HARNESS_MEMORY
+    cpus = judge_parallelism()
+    return cpus, cpus * test_memory
 
-            # Weryfikacja kodu wyjścia
-            if result.returncode != 0:
-                status = 'ERR'
-                passed = False
-            else:
-                program_output = result.stdout.strip().split()
-                with open(copied_expected, 'r') as expected_out:
-                    expected_output = expected_out.read().strip().split()
-                if program_output == expected_output:
-                    status = 'OK'
-                    passed = True
-                else:
-                    status = 'WA'
-                    passed = False
-
-            # Tworzenie rekordu w bazie danych
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=passed,
-                final_status=status,
-                time=None,  # W przyszłości zmierzymy czas wykonania
-                memory=None  # W przyszłości zmierzymy zużycie pamięci
-            )
 
-            return "OK" if passed else status
-        except subprocess.TimeoutExpired:
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='TLE',
-                time=None,
-                memory=None
-            )
-            return "Przekroczenie limitu czasu"
-        except MemoryError:
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='MLE',
-                time=None,
-                memory=None
-            )
-            return "Przekroczenie limitu pamięci"
+def start_judging(celery_task, solution_id, lang, rejudge_item_id=None):
+    """Początek oceniania: całość w tym zadaniu albo, w trybie potokowym, tylko kompilacja."""
+    if rejudge_item_id is not None:
+        try:
+            rejudge.start_item(rejudge_item_id)
         except Exception as e:
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='ERR',
-                time=None,
-                memory=None
-            )
-            return f"Błąd: {e}"
-        finally:
-            # Usuwanie plików testowych
-            try:
-                if os.path.exists(copied_input):
-                    os.remove(copied_input)
-                if os.path.exists(copied_expected):
-                    os.remove(copied_expected)
-            except Exception as cleanup_error:
-                print(f"Error during cleanup: {cleanup_error}")
-
-
-    # Testowanie grup
-    for group_name, tests in grouped_tests.items():
-        print(f"Testing group: {group_name}")
-        group_success = True
-        for test in tests:
-            test_input = os.path.join(test_folder, test.name, test.in_file)
-            test_expected = os.path.join(test_folder, test.name, test.out_file)
-            print(f"Running test: {test.name}")
-            result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
-            print(f"Result for {test.name}: {result}")
-            if result != "OK":
-                print(f"Group {group_name} failed due to: {result}")
-                group_success = False
-                break
-        if group_success:
-            group_points += next(group.points for group in test_groups if group.name == group_name)
-
-    # Testowanie niepogrupowanych testów
-    print("Testing ungrouped tests:")
-    for test in ungrouped_tests:
-        test_input = os.path.join(test_folder, test.name, test.in_file)
-        test_expected = os.path.join(test_folder, test.name, test.out_file)
-        print(f"Running test: {test.name}")
-        result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
-        print(f"Result for {test.name}: {result}")
-        if result == "OK":
-            ungrouped_tests_passed += 1
-
-
-    if ungrouped_num > 0:
-        ungrouped_points = ungrouped_tests_passed * (100 - group_total_points) // ungrouped_num
+            print(f"Could not record start of rejudge item {rejudge_item_id}: {e}")
+    if settings.SPRAWDZARKA_PIPELINE:
+        compile_and_forward(celery_task, solution_id, lang, rejudge_item_id)
     else:
-        ungrouped_points = 100 - group_total_points
+        judge_admitted(celery_task, solution_id, lang, rejudge_item_id)
 
-    # Obliczanie wyników
-    total_points = group_points + ungrouped_points
-    print(f"Total points: {total_points} / 100")
 
-    # 5. Grading…
-    print("Grading…")
-    solution.final_points = total_points
-    solution.status = "done"
-    solution.save()
-    
-    # 6. DONE!
-    print("DONE!")
+def compile_and_forward(celery_task, solution_id, lang, rejudge_item_id=None):
+    """Etap kompilacji potoku: uchwyt skompilowanego programu trafia do kolejki etapu uruchamiania
+    (z tym samym priorytetem), a błąd kompilacji kończy ocenianie od razu."""
+    try:
+        artifact = compile_stage(solution_id, lang, rejudge=rejudge_item_id is not None)
+    except BaseException:
+        finish_judging(rejudge_item_id)
+        raise
+    if artifact is None:
+        finish_judging(rejudge_item_id)
+        return
+    kwargs = {'rejudge_item_id': rejudge_item_id} if rejudge_item_id is not None else {}
+    current_app.send_task(
+        RUN_TASKS[lang], args=(solution_id, artifact), kwargs=kwargs,
+        priority=(celery_task.request.delivery_info or {}).get('priority')
+    )
+
+
+def judge_admitted(celery_task, solution_id, lang, rejudge_item_id=None, artifact=None):
+    """Ocenia rozwiązanie, jeśli jego limity mieszczą się w wolnym budżecie hosta; w przeciwnym
+    razie zadanie wraca do kolejki (z tym samym priorytetem) i spróbuje ponownie później."""
+    if not settings.SPRAWDZARKA_ADMISSION:
+        return judge_and_dispatch(solution_id, lang, rejudge_item_id, artifact)
+    try:
+        task = Solution.objects.select_related('contest_task__task').get(id=solution_id).contest_task.task
+    except Solution.DoesNotExist:
+        return judge_and_dispatch(solution_id, lang, rejudge_item_id, artifact)
 
+    cpus, memory = job_demand(lang, task)
+    reservation = admission.try_reserve(cpus, memory, f"solution {solution_id}")
+    if reservation is None:
+        metrics.incr('admission_deferred')
+        raise celery_task.retry(countdown=settings.SPRAWDZARKA_ADMISSION_RETRY_DELAY)
+    with reservation:
+        judge_and_dispatch(solution_id, lang, rejudge_item_id, artifact)
 
 
-@shared_task
-def execute_java(solution_id):
-    print(f"Executing Java for solution ID: {solution_id}...")
-    
-    # 1. Getting solution info...
-    print("Getting solution info...")
+def judge_and_dispatch(solution_id, lang, rejudge_item_id=None, artifact=None):
     try:
-        with transaction.atomic():
-            solution = Solution.objects.select_related('contest_task__task', 'author').get(id=solution_id)
-            task = solution.contest_task.task
-            src_path = os.path.join("media", "solutions", solution.src_path)
-            folder_path, file_name = os.path.split(src_path)
-            compiled_file_name = os.path.splitext(file_name)[0]
-            task_folder = task.pdf_file.split("\\")[1]
-            test_folder = os.path.join("media", "tasks", task_folder, "tests")
+        if rejudge_item_id is not None:
+            judge_solution(solution_id, lang, rejudge=True, incremental=rejudge.is_incremental(rejudge_item_id), artifact=artifact)
+        else:
+            judge_solution(solution_id, lang, artifact=artifact)
+    finally:
+        if artifact is not None:
+            artifacts.remove(artifact)
+        finish_judging(rejudge_item_id)
 
-            solution.status = 'testing'
-            solution.save()
-    except Solution.DoesNotExist:
-        print(f"Solution with ID {solution_id} does not exist.")
-        return
-    except Exception as e:
-        print(f"An error occurred while retrieving the solution: {e}")
-        return
 
-    # 2. Getting grouped tests...
-    print("Getting grouped tests...")
+def finish_judging(rejudge_item_id=None):
+    if rejudge_item_id is not None:
+        try:
+            rejudge.finish_item(rejudge_item_id)
+        except Exception as e:
+            print(f"Could not finish rejudge item {rejudge_item_id}: {e}")
+    # Autor zwolnił miejsce - przekazujemy do oceny kolejne czekające rozwiązania
     try:
-        with transaction.atomic():
-            test_groups = TestGroup.objects.filter(task=task)
-            grouped_tests = {
-                group.name: list(group.tests.all())
-                for group in test_groups
-            }
-            ungrouped_tests = list(Test.objects.filter(task=task, group__isnull=True))
+        dispatch_pending()
     except Exception as e:
-        solution.status = 'error'
-        solution.save()
-        print(f"An error occurred while retrieving tests: {e}")
-        return
+        print(f"Could not dispatch pending solutions: {e}")
 
-    # 3. Compile program...
-    print("Compile program...")
-    try:
-        docker_command = [
-            "docker", "run", "--rm",
-            "-v", f"{os.path.abspath(folder_path)}:/app",
-            "-w", "/app",
-            "openjdk:17",
-            "javac", file_name
-        ]
 
-        result = subprocess.run(
-            docker_command,
-            timeout=10,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            text=True
-        )
+def _test_command(language, compiled_file, test, time_limit, memory_limit):
+    """Polecenie uruchomienia testu przez judge_runner, który pilnuje limitu czasu i wyjścia oraz mierzy zasoby."""
+    stats_name = f"judge_stats_{test.id}"
+    command = runner.wrap(
+        language['run'](compiled_file, memory_limit), stats_name, time_limit,
+        settings.SPRAWDZARKA_OUTPUT_LIMIT, language['time_overhead']()
+    )
+    return command, stats_name
 
-        print(f"Compilation stdout:\n{result.stdout}")
-        print(f"Compilation stderr:\n{result.stderr}")
 
-        if result.returncode != 0:
-            print("Compilation failed:")
-            print(result.stderr)
-            solution.status = 'error'
-            solution.save()
-            return
+def _evaluate_test(sandbox, language, result, stats_name, expected_output_file, test, results):
+    """Ustala werdykt testu na podstawie wyniku programu i zapisuje go do bufora wyników."""
+    time_overhead = language['time_overhead']()
+    with result:
+        stats = runner.read_stats(os.path.join(sandbox.workspace, stats_name))
+
+        print(f"Test {test.name} return code: {result.returncode}, stats: {stats}")
+
+        # Weryfikacja kodu wyjścia
+        if result.output_exceeded:
+            status = 'OLE'
+        else:
+            status = runner.failure_status(stats, result.stderr, language)
+        if status is not None:
+            print(f"Test {test.name} result stderr:\n{result.stderr}")
+            passed = False
         else:
-            print("Compilation succeeded.")
+            with test_cache.open_test_file(test, expected_output_file) as expected_out:
+                difference = checker.first_difference(result.stdout, expected_out)
+            if difference is None:
+                status = 'OK'
+                passed = True
+            else:
+                print(f"Test {test.name}: {checker.describe_difference(difference)}")
+                status = 'WA'
+                passed = False
+
+    # Wynik trafia do bufora, zapisywanego do bazy po ocenieniu wszystkich testów
+    results.add(
+        test, passed, status,
+        time=runner.without_overhead(stats['cpu_ms'], time_overhead) if stats else None,
+        wall_time=runner.without_overhead(stats['wall_ms'], time_overhead) if stats else None,
+        memory=stats['peak_kb'] if stats else None
+    )
+
+    return "OK" if passed else status
+
+
+def execute_test(sandbox, language, compiled_file, input_file, expected_output_file, test, results, time_limit, memory_limit):
+    command, stats_name = _test_command(language, compiled_file, test, time_limit, memory_limit)
+    try:
+        # Wejście podawane prosto z pliku testu (lub pamięci podręcznej), bez kopiowania go do piaskownicy
+        with test_cache.open_test_file(test, input_file) as input_file_handle:
+            result = sandbox.execute_bounded(
+                command,
+                stdin=input_file_handle,
+                timeout=time_limit + runner.RUNNER_TIMEOUT_SLACK,
+                output_limit=settings.SPRAWDZARKA_OUTPUT_LIMIT
+            )
+        return _evaluate_test(sandbox, language, result, stats_name, expected_output_file, test, results)
     except subprocess.TimeoutExpired:
-        print("Compilation timed out.")
-        solution.status = 'error'
-        solution.save()
-        return
+        print(f"Test {test.name} failed: Timeout expired.")
+        sandbox.kill_processes()
+        results.add(test, False, 'TLE', host_timeout=True)
+        return "Przekroczenie limitu czasu"
     except Exception as e:
-        solution.status = 'error'
-        solution.save()
-        print(f"An unexpected error occurred during compilation: {e}")
-        return
+        print(f"Test {test.name} failed with an unexpected error: {e}")
+        results.add(test, False, 'ERR')
+        return f"Błąd: {e}"
 
-    # 4. Testing program...
-    print("Testing program...")
-    total_points = 0
-    group_total_points = sum(group.points for group in test_groups)
-    group_points = 0
-    ungrouped_points = 0
-    ungrouped_tests_passed = 0
-    ungrouped_num = len(ungrouped_tests)
 
-    def execute_test(input_file, expected_output_file, test, solution, time_limit, memory_limit):
-        try:
-            copied_input = os.path.join(folder_path, os.path.basename(input_file))
-            copied_expected = os.path.join(folder_path, os.path.basename(expected_output_file))
-            shutil.copy(input_file, copied_input)
-            shutil.copy(expected_output_file, copied_expected)
-
-            print(f"Input file: {copied_input}")
-            with open(copied_input, 'r') as input_file_handle:
-                print(f"Input content:\n{input_file_handle.read()}")
-
-
-            with open(copied_input, 'r') as input_file_handle:
-                required_memory = 40  # Zwiększenie zapasu pamięci JVM
-                total_memory = required_memory + memory_limit
-
-                docker_command = [
-                    "docker", "run", "--rm", "-i",
-                    "-v", f"{os.path.abspath(folder_path)}:/app",
-                    "-w", "/app",
-                    "--pids-limit=15",  # Więcej wątków dla JVM
-                    f"--memory={total_memory}m", f"--memory-swap={total_memory}m",
-                    "openjdk:17",
-                    "bash", "-c",
-                    f"java -Xms16m -Xmx{memory_limit}m -XX:MaxDirectMemorySize={memory_limit}m "
-                    f"-XX:ThreadStackSize=256 -XX:ActiveProcessorCount=1 -XX:ParallelGCThreads=1 {compiled_file_name}"
-                ]
-
-                print(f"Executing Docker command: {' '.join(docker_command)}")
-                
-                result = subprocess.run(
-                    docker_command,
-                    stdin=input_file_handle,
-                    capture_output=True,
-                    timeout=time_limit,
-                    text=True
-                )
+async def execute_test_async(sandbox, language, compiled_file, input_file, expected_output_file, test, results, time_limit, memory_limit):
+    """execute_test na pętli orkiestratora: limit czasu pilnowany przez asyncio, a porównanie
+    wyjścia (praca na CPU) wykonywane w wątku pomocniczym, żeby nie blokować innych testów."""
+    command, stats_name = _test_command(language, compiled_file, test, time_limit, memory_limit)
+    try:
+        with test_cache.open_test_file(test, input_file) as input_file_handle:
+            result = await orchestrator.execute_bounded(
+                sandbox, command,
+                stdin=input_file_handle,
+                timeout=time_limit + runner.RUNNER_TIMEOUT_SLACK,
+                output_limit=settings.SPRAWDZARKA_OUTPUT_LIMIT
+            )
+        return await asyncio.to_thread(_evaluate_test, sandbox, language, result, stats_name, expected_output_file, test, results)
+    except subprocess.TimeoutExpired:
+        print(f"Test {test.name} failed: Timeout expired.")
+        await asyncio.to_thread(sandbox.kill_processes)
+        results.add(test, False, 'TLE', host_timeout=True)
+        return "Przekroczenie limitu czasu"
+    except Exception as e:
+        print(f"Test {test.name} failed with an unexpected error: {e}")
+        results.add(test, False, 'ERR')
+        return f"Błąd: {e}"
 
 
-            # Debugowanie błędów
-            print(f"Test {test.name} result stdout:\n{result.stdout}")
-            print(f"Test {test.name} result stderr:\n{result.stderr}")
-            print(f"Test {test.name} return code: {result.returncode}")
+def _execute_compile_step(sandbox, command, timeout):
+    if settings.SPRAWDZARKA_JUDGE_MODE == 'async':
+        return orchestrator.execute(sandbox, command, timeout=timeout)
+    return sandbox.execute(command, timeout=timeout)
 
-            if result.returncode != 0:
-                status = 'ERR'
-                passed = False
-            else:
-                program_output = result.stdout.strip().split()
-                with open(copied_expected, 'r') as expected_out:
-                    expected_output = expected_out.read().strip().split()
-                if program_output == expected_output:
-                    status = 'OK'
-                    passed = True
-                else:
-                    status = 'WA'
-                    passed = False
-
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=passed,
-                final_status=status,
-                time=None,
-                memory=None
-            )
 
-            return "OK" if passed else status
-        except subprocess.TimeoutExpired:
-            print(f"Test {test.name} failed: Timeout expired.")
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='TLE',
-                time=None,
-                memory=None
-            )
-            return "Przekroczenie limitu czasu"
-        except MemoryError:
-            print(f"Test {test.name} failed: Memory limit exceeded.")
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='MLE',
-                time=None,
-                memory=None
-            )
-            return "Przekroczenie limitu pamięci"
-        except Exception as e:
-            print(f"Test {test.name} failed with an unexpected error: {e}")
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='ERR',
-                time=None,
-                memory=None
-            )
-            return f"Błąd: {e}"
-        finally:
+def compile_ahead_of_time(sandbox, language, compiled_file_name):
+    """Kompilacja AOT skompilowanego programu. Gdy się nie uda, program uruchamiany jest bez niej."""
+    print("Compile program ahead of time...")
+    aot_file_path = os.path.join(sandbox.workspace, language['aot_file'](compiled_file_name))
+    try:
+        result = _execute_compile_step(sandbox, language['aot'](compiled_file_name), AOT_TIMEOUT)
+        if result.returncode == 0 and os.path.exists(aot_file_path):
+            print("AOT compilation succeeded.")
+            return
+        print(f"AOT compilation failed, running without it:\n{result.stderr}")
+    except subprocess.TimeoutExpired:
+        print("AOT compilation timed out, running without it.")
+        sandbox.kill_processes()
+    if os.path.exists(aot_file_path):
+        os.remove(aot_file_path)
+
+
+def compile_solution(sandbox, lang, src_path, compiled_file_name):
+    """Kompiluje rozwiązanie w piaskownicy (z kompilacją AOT, jeśli włączona dla języka)
+    albo odtwarza wynik z pamięci kompilacji."""
+    language = LANGUAGES[lang]
+    file_name = os.path.basename(src_path)
+    compile_command = language['compile'](file_name, compiled_file_name)
+    aot = 'aot' in language and lang in settings.SPRAWDZARKA_AOT_LANGUAGES
+    cache_command = compile_command + language['aot'](compiled_file_name) if aot else compile_command
+    cache_key = compile_cache.make_key(src_path, lang, language['image'], cache_command)
+
+    sandbox.put(src_path)
+    if compile_cache.restore(cache_key, sandbox):
+        print("Compilation cache hit, skipping compilation.")
+        return True
+
+    result = _execute_compile_step(sandbox, compile_command, 10)
+
+    # Logowanie wyjścia kompilacji
+    print(f"Compilation stdout:\n{result.stdout}")
+    print(f"Compilation stderr:\n{result.stderr}")
+
+    compiled_file_path = os.path.join(sandbox.workspace, compiled_file_name)
+    if result.returncode != 0 or not os.path.exists(compiled_file_path):
+        print("Compilation failed:")
+        print(result.stderr)
+        # Sprzątanie w przypadku błędu kompilacji
+        try:
+            if os.path.exists(compiled_file_path):
+                os.remove(compiled_file_path)
+        except Exception as cleanup_error:
+            print(f"Error during cleanup: {cleanup_error}")
+        return False
+
+    print("Compilation succeeded.")
+    print(f"Compiled file path: {compiled_file_path}")
+    if aot:
+        compile_ahead_of_time(sandbox, language, compiled_file_name)
+    compile_cache.store(cache_key, sandbox.workspace, exclude=[file_name])
+    return True
+
+
+def judge_parallelism():
+    """Liczba testów jednego rozwiązania uruchamianych naraz, ograniczona liczbą rdzeni."""
+    cores = os.cpu_count() or 1
+    parallelism = settings.SPRAWDZARKA_JUDGE_PARALLELISM or cores
+    return max(1, min(parallelism, cores))
+
+
+def run_tests(sandboxes, grouped_tests, ungrouped_tests, run_test, results=None):
+    """Uruchamia testy na dostępnych piaskownicach, każdą zajmując jednym testem naraz.
+
+    Zwraca nazwy zaliczonych grup i liczbę zaliczonych testów niepogrupowanych.
+    Po pierwszym niezaliczonym teście grupy jej pozostałe testy nie są już uruchamiane, a testy
+    tej grupy działające na innych piaskownicach są przerywane i traktowane jak pominięte
+    (ich wyniki nie trafiają do `results`).
+    """
+    free_sandboxes = queue.Queue()
+    for sandbox in sandboxes:
+        free_sandboxes.put(sandbox)
+    group_failed = {group_name: threading.Event() for group_name in grouped_tests}
+    lock = threading.Lock()
+    running = {}  # piaskownica -> (test, grupa) działającego na niej testu
+    cancelled = set()  # id testów przerwanych po niezaliczeniu ich grupy
+    killing = {}  # piaskownica -> zdarzenie końca przerywania działającego na niej testu
+
+    def fail_group(group_name):
+        with lock:
+            if group_failed[group_name].is_set():
+                return
+            group_failed[group_name].set()
+            to_cancel = [
+                (sandbox, test) for sandbox, (test, test_group) in running.items()
+                if test_group == group_name and test.id not in cancelled
+            ]
+            for sandbox, test in to_cancel:
+                cancelled.add(test.id)
+                killing[sandbox] = threading.Event()
+                if results is not None:
+                    results.cancel(test)
+        for sandbox, test in to_cancel:
+            print(f"Cancelling test {test.name}: group {group_name} already failed")
             try:
-                if os.path.exists(copied_input):
-                    os.remove(copied_input)
-                if os.path.exists(copied_expected):
-                    os.remove(copied_expected)
-            except Exception as cleanup_error:
-                print(f"Error during cleanup: {cleanup_error}")
-
-
-    # Testowanie grup
-    for group_name, tests in grouped_tests.items():
-        print(f"Testing group: {group_name}")
-        group_success = True
-        for test in tests:
-            test_input = os.path.join(test_folder, test.name, test.in_file)
-            test_expected = os.path.join(test_folder, test.name, test.out_file)
+                sandbox.kill_processes()
+            except Exception as e:
+                print(f"Could not cancel test {test.name}: {e}")
+            finally:
+                with lock:
+                    killing.pop(sandbox).set()
+
+    def worker(test, group_name):
+        if group_name is not None and group_failed[group_name].is_set():
+            print(f"Skipping test {test.name}: group {group_name} already failed")
+            return None
+        sandbox = free_sandboxes.get()
+        try:
+            with lock:
+                # Grupa mogła nie przejść, gdy test czekał na wolną piaskownicę
+                if group_name is not None and group_failed[group_name].is_set():
+                    print(f"Skipping test {test.name}: group {group_name} already failed")
+                    return None
+                running[sandbox] = (test, group_name)
             print(f"Running test: {test.name}")
-            result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
-            print(f"Result for {test.name}: {result}")
-            if result != "OK":
-                print(f"Group {group_name} failed due to: {result}")
-                group_success = False
-                break
-        if group_success:
-            group_points += next(group.points for group in test_groups if group.name == group_name)
-
-    # Testowanie niepogrupowanych testów
-    print("Testing ungrouped tests:")
-    for test in ungrouped_tests:
-        test_input = os.path.join(test_folder, test.name, test.in_file)
-        test_expected = os.path.join(test_folder, test.name, test.out_file)
-        print(f"Running test: {test.name}")
-        result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
+            result = run_test(sandbox, test)
+        finally:
+            with lock:
+                running.pop(sandbox, None)
+                kill_done = killing.get(sandbox)
+            # Piaskownica przerywanego testu wraca do puli dopiero po kill_processes - inaczej
+            # przerwany zostałby test innej grupy, który by ją zdążył dostać
+            if kill_done is not None:
+                kill_done.wait()
+            free_sandboxes.put(sandbox)
+        if test.id in cancelled:
+            print(f"Test {test.name} cancelled, treated as skipped")
+            return None
         print(f"Result for {test.name}: {result}")
-        if result == "OK":
-            ungrouped_tests_passed += 1
+        if result != "OK" and group_name is not None and not group_failed[group_name].is_set():
+            print(f"Group {group_name} failed due to: {result}")
+            fail_group(group_name)
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(sandboxes)) as executor:
+        group_futures = {
+            group_name: [executor.submit(worker, test, group_name) for test in tests]
+            for group_name, tests in grouped_tests.items()
+        }
+        ungrouped_futures = [executor.submit(worker, test, None) for test in ungrouped_tests]
+
+        passed_groups = [
+            group_name for group_name, futures in group_futures.items()
+            if all(future.result() == "OK" for future in futures)
+        ]
+        ungrouped_tests_passed = sum(1 for future in ungrouped_futures if future.result() == "OK")
 
-    if ungrouped_num > 0:
-        ungrouped_points = ungrouped_tests_passed * (100 - group_total_points) // ungrouped_num
-    else:
-        ungrouped_points = 100 - group_total_points
+    return passed_groups, ungrouped_tests_passed
 
-    # Obliczanie wyników
-    total_points = group_points + ungrouped_points
-    print(f"Total points: {total_points} / 100")
 
-    # 5. Grading…
-    print("Grading…")
-    solution.final_points = total_points
-    solution.status = "done"
-    solution.save()
-    
-    # 6. DONE!
-    print("DONE!")
+class CompilationError(Exception):
+    pass
 
 
+def tests_to_run(grouped_tests, ungrouped_tests, kept):
+    """Testy bez zachowanych wyników. Grupy z zachowanym niezaliczonym testem są pomijane w całości."""
+    grouped_to_run = {
+        group_name: [test for test in tests if test.id not in kept]
+        for group_name, tests in grouped_tests.items()
+        if not any(test.id in kept and not kept[test.id].passed for test in tests)
+    }
+    grouped_to_run = {group_name: tests for group_name, tests in grouped_to_run.items() if tests}
+    ungrouped_to_run = [test for test in ungrouped_tests if test.id not in kept]
+    return grouped_to_run, ungrouped_to_run
 
 
-@shared_task
-def execute_cs(solution_id):
-    print(f"Executing C# for solution ID: {solution_id}...")
-    
+def compile_in_sandbox(sandbox, lang, src_path, compiled_file_name):
+    """Kompiluje rozwiązanie w piaskownicy; każdy błąd kompilacji zgłasza jako CompilationError."""
+    print("Compile program...")
+    try:
+        if not compile_solution(sandbox, lang, src_path, compiled_file_name):
+            raise CompilationError()
+    except subprocess.TimeoutExpired:
+        print("Compilation timed out.")
+        sandbox.kill_processes()
+        raise CompilationError()
+    except CompilationError:
+        raise
+    except Exception as e:
+        print(f"An unexpected error occurred during compilation: {e}")
+        raise CompilationError()
+
+
+def compile_stage(solution_id, lang, rejudge=False):
+    """Etap kompilacji potoku. Zwraca uchwyt artefaktu z programem albo None, gdy rozwiązania
+    nie ma lub kompilacja się nie udała (wtedy wynik 'error' jest zapisywany od razu)."""
+    language = LANGUAGES[lang]
+    print(f"Compiling {language['name']} solution ID: {solution_id}...")
+    try:
+        with transaction.atomic():
+            solution = Solution.objects.get(id=solution_id)
+            if not rejudge:
+                solution.status = 'testing'
+                solution.judging_started_at = now()
+                solution.save()
+    except Solution.DoesNotExist:
+        print(f"Solution with ID {solution_id} does not exist.")
+        return None
+
+    src_path = os.path.join("media", "solutions", solution.src_path)
+    folder_path, file_name = os.path.split(src_path)
+    runner.ensure_tools()
+    try:
+        with sandbox_session(language['image'], folder_path, backend=backend_for(lang)) as sandbox:
+            compile_in_sandbox(sandbox, lang, src_path, language['compiled_file'](file_name))
+            return artifacts.save(sandbox.workspace, exclude=[file_name])
+    except CompilationError:
+        pass
+    except Exception as e:
+        print(f"An error occurred in the sandbox: {e}")
+    ResultBuffer(solution, 0).save('error')
+    return None
+
+
+def run_solution(solution, lang, task, src_path, folder_path, compiled_file_name, test_folder, grouped_tests, ungrouped_tests, results, artifact=None):
+    """Kompiluje rozwiązanie (albo bierze program z artefaktu etapu kompilacji) i uruchamia
+    podane testy, zbierając wyniki w `results`."""
+    language = LANGUAGES[lang]
+    runner.ensure_tools()
+    with sandbox_session(language['image'], folder_path, backend=backend_for(lang)) as sandbox:
+        # 3. Compile program...
+        if artifact is not None:
+            print(f"Using compiled program from artifact {artifact}")
+            artifacts.restore(artifact, sandbox)
+        else:
+            compile_in_sandbox(sandbox, lang, src_path, compiled_file_name)
+
+        # 4. Testing program...
+        print("Testing program...")
+        if settings.SPRAWDZARKA_JUDGE_MODE == 'batch':
+            # Wszystkie testy w jednej sesji piaskownicy, limity obejmują też harness
+            sandbox.set_limits(
+                task.memory_limit + language['memory_overhead'] + batch.HARNESS_MEMORY,
+                language['pids_limit'] + runner.RUNNER_PIDS + batch.HARNESS_PIDS
+            )
+            with ExitStack() as stack:
+                cores = cpuset.allocate(stack, 1)
+                if cores:
+                    sandbox.set_cpuset(cores[0])
+                batch.run_tests_batch(
+                    sandbox, language['run'](compiled_file_name, task.memory_limit),
+                    grouped_tests, ungrouped_tests, test_folder, results, task.time_limit,
+                    language['time_overhead'](), language.get('memory_error_markers', [])
+                )
+        else:
+            sandbox.set_limits(task.memory_limit + language['memory_overhead'], language['pids_limit'] + runner.RUNNER_PIDS)
+
+            def run_test(test_sandbox, test):
+                test_input = os.path.join(test_folder, test.name, test.in_file)
+                test_expected = os.path.join(test_folder, test.name, test.out_file)
+                return execute_test(test_sandbox, language, compiled_file_name, test_input, test_expected, test, results, task.time_limit, task.memory_limit)
+
+            async def run_test_async(test_sandbox, test):
+                test_input = os.path.join(test_folder, test.name, test.in_file)
+                test_expected = os.path.join(test_folder, test.name, test.out_file)
+                return await execute_test_async(test_sandbox, language, compiled_file_name, test_input, test_expected, test, results, task.time_limit, task.memory_limit)
+
+            with ExitStack() as stack:
+                # Przy przypinaniu każda piaskownica dostaje własny rdzeń, więc jest ich tyle, ile wolnych rdzeni
+                cores = cpuset.allocate(stack, judge_parallelism())
+                # Dodatkowe piaskownice dla równoległego uruchamiania testów
+                sandboxes = [sandbox] + clone_sandboxes(stack, sandbox, (len(cores) if cores else judge_parallelism()) - 1)
+                if cores:
+                    for test_sandbox, core in zip(sandboxes, cores):
+                        test_sandbox.set_cpuset(core)
+                print(f"Running tests on {len(sandboxes)} sandbox(es)")
+                if settings.SPRAWDZARKA_JUDGE_MODE == 'async':
+                    orchestrator.run(orchestrator.run_tests(
+                        sandboxes, grouped_tests, ungrouped_tests, run_test_async,
+                        task.memory_limit + language['memory_overhead'], results
+                    ))
+                else:
+                    run_tests(sandboxes, grouped_tests, ungrouped_tests, run_test, results)
+
+
+def judge_solution(solution_id, lang, rejudge=False, incremental=False, artifact=None):
+    """Ocenia rozwiązanie. Przy ponownym ocenianiu (`rejudge`) poprzedni wynik zostaje
+    widoczny do końca i jest podmieniany razem z nowymi wynikami testów, a przy
+    ocenianiu przyrostowym (`incremental`) uruchamiane są tylko testy nowe lub zmienione.
+    Z `artifact` (tryb potokowy) program jest już skompilowany."""
+    language = LANGUAGES[lang]
+    print(f"Executing {language['name']} for solution ID: {solution_id}...")
+
     # 1. Getting solution info...
     print("Getting solution info...")
     try:
         with transaction.atomic():
             solution = Solution.objects.select_related('contest_task__task', 'author').get(id=solution_id)
+            print(f"Solution retrieved: {solution}")
             task = solution.contest_task.task
             src_path = os.path.join("media", "solutions", solution.src_path)
             folder_path, file_name = os.path.split(src_path)
-            compiled_file_name = os.path.splitext(file_name)[0] + ".exe"
-            task_folder = task.pdf_file.split("\\")[1]
+            compiled_file_name = language['compiled_file'](file_name)
+            task_folder = task.pdf_file.split("\\")[1]  # Pobranie folderu zadania z pdf_file
             test_folder = os.path.join("media", "tasks", task_folder, "tests")
 
-            solution.status = 'testing'
-            solution.save()
+            if not rejudge and artifact is None:
+                solution.status = 'testing'
+                solution.judging_started_at = now()
+                solution.save()
     except Solution.DoesNotExist:
         print(f"Solution with ID {solution_id} does not exist.")
         return
@@ -563,211 +637,57 @@ def execute_cs(solution_id):
         print(f"An error occurred while retrieving tests: {e}")
         return
 
-    # 3. Compile program...
-    print("Compile program...")
+    # Odciski testów - przy ocenianiu przyrostowym uruchamiamy tylko testy nowe lub zmienione
     try:
-        docker_command = [
-            "docker", "run", "--rm",
-            "-v", f"{os.path.abspath(folder_path)}:/app",
-            "-w", "/app",
-            "mono",
-            "bash", "-c", f"csc -out:{compiled_file_name} {file_name}"
-        ]
-
-        print(f"Executing Compile command: {docker_command}")
-
-        result = subprocess.run(
-            docker_command,
-            timeout=10,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            text=True
+        fingerprints = {
+            test.id: fingerprint.result_fingerprint(fingerprint.test_content_hash(test, test_folder), task)
+            for tests in list(grouped_tests.values()) + [ungrouped_tests]
+            for test in tests
+        }
+    except Exception as e:
+        print(f"Could not compute test fingerprints: {e}")
+        fingerprints = {}
+    # Odcisk ocenianego zestawu testów: wersja zapisywana z wynikiem i klucz pamięci werdyktów
+    try:
+        test_set = fingerprint.test_set_fingerprint(
+            task,
+            [(group.id, group.points) for group in test_groups],
+            [(test.id, test.group_id, test.content_hash) for tests in list(grouped_tests.values()) + [ungrouped_tests] for test in tests]
         )
+        test_set_version = fingerprint.test_set_version(task.id, test_set)
+        verdict_key = verdict_cache.make_key(src_path, lang, test_set)
+    except Exception as e:
+        print(f"Could not compute the test set fingerprint: {e}")
+        test_set_version = verdict_key = None
+    results = ResultBuffer(solution, len(fingerprints), fingerprints, test_set_version)
+    if incremental:
+        kept = results.keep_matching()
+        print(f"Keeping {len(kept)} unchanged test result(s)")
+    grouped_to_run, ungrouped_to_run = tests_to_run(grouped_tests, ungrouped_tests, results.kept)
 
-        print(f"Compilation stdout:\n{result.stdout}")
-        print(f"Compilation stderr:\n{result.stderr}")
-
-        if result.returncode != 0:
-            print("Compilation failed:")
-            print(result.stderr)
-            solution.status = 'error'
-            solution.save()
-            return
+    try:
+        if grouped_to_run or ungrouped_to_run:
+            run_solution(solution, lang, task, src_path, folder_path, compiled_file_name, test_folder, grouped_to_run, ungrouped_to_run, results, artifact)
         else:
-            print("Compilation succeeded.")
-    except subprocess.TimeoutExpired:
-        print("Compilation timed out.")
-        solution.status = 'error'
-        solution.save()
+            print("No new or changed tests, skipping compilation and testing.")
+    except CompilationError:
+        results.save('error')
         return
     except Exception as e:
-        solution.status = 'error'
-        solution.save()
-        print(f"An unexpected error occurred during compilation: {e}")
+        print(f"An error occurred in the sandbox: {e}")
+        results.save('error')
         return
-
-    # 4. Testing program...
-    print("Testing program...")
-    total_points = 0
-    group_total_points = sum(group.points for group in test_groups)
-    group_points = 0
-    ungrouped_points = 0
-    ungrouped_tests_passed = 0
-    ungrouped_num = len(ungrouped_tests)
-
-    def execute_test(input_file, expected_output_file, test, solution, time_limit, memory_limit):
-        try:
-            # Kopiowanie plików wejściowych i wyjściowych
-            copied_input = os.path.join(folder_path, os.path.basename(input_file))
-            copied_expected = os.path.join(folder_path, os.path.basename(expected_output_file))
-            shutil.copy(input_file, copied_input)
-            shutil.copy(expected_output_file, copied_expected)
-
-            # Sprawdzenie, czy plik wykonywalny istnieje
-            compiled_file_path = os.path.join(folder_path, compiled_file_name)
-            if not os.path.exists(compiled_file_path):
-                print(f"Compiled file {compiled_file_name} not found.")
-                SolutionTestResult.objects.create(
-                    solution=solution,
-                    test=test,
-                    passed=False,
-                    final_status='ERR',
-                    time=None,
-                    memory=None
-                )
-                return f"Error: Compiled file {compiled_file_name} not found."
-
-            # Uruchomienie programu w kontenerze Dockera
-            with open(copied_input, 'r') as input_file_handle:
-                total_memory_limit = memory_limit + 32  # 32 MB na środowisko Mono
-                docker_command = (
-                    f"docker run --rm -i "
-                    f"-v {os.path.abspath(folder_path)}:/app "
-                    f"-w /app "
-                    f"--pids-limit=10 "
-                    f"--memory={total_memory_limit}m --memory-swap={total_memory_limit}m "
-                    f"mono bash -c \"mono --gc-params=max-threads=1 {compiled_file_name}\""
-                )
-
-                print(f"Executing Docker command: {docker_command}")
-                
-                result = subprocess.run(
-                    docker_command,
-                    shell=True,
-                    stdin=input_file_handle,
-                    capture_output=True,
-                    timeout=time_limit,
-                    text=True
-                )
-
-            # Logowanie wyników procesu Dockera
-            print(f"Test {test.name} stdout:\n{result.stdout}")
-            print(f"Test {test.name} stderr:\n{result.stderr}")
-            print(f"Test {test.name} return code: {result.returncode}")
-
-            # Weryfikacja wyników programu
-            if result.returncode != 0:
-                status = 'ERR'
-                passed = False
-            else:
-                program_output = result.stdout.strip().split()
-                with open(copied_expected, 'r') as expected_out:
-                    expected_output = expected_out.read().strip().split()
-                if program_output == expected_output:
-                    status = 'OK'
-                    passed = True
-                else:
-                    status = 'WA'
-                    passed = False
-
-            # Zapis wyniku testu w bazie danych
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=passed,
-                final_status=status,
-                time=None,
-                memory=None
-            )
-
-            return "OK" if passed else status
-
-        except subprocess.TimeoutExpired:
-            print(f"Test {test.name} failed: Timeout expired.")
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='TLE',
-                time=None,
-                memory=None
-            )
-            return "Przekroczenie limitu czasu"
-        except Exception as e:
-            print(f"Test {test.name} failed with an unexpected error: {e}")
-            SolutionTestResult.objects.create(
-                solution=solution,
-                test=test,
-                passed=False,
-                final_status='ERR',
-                time=None,
-                memory=None
-            )
-            return f"Błąd: {e}"
-        finally:
-            # Czyszczenie plików testowych
-            try:
-                if os.path.exists(copied_input):
-                    os.remove(copied_input)
-                if os.path.exists(copied_expected):
-                    os.remove(copied_expected)
-            except Exception as cleanup_error:
-                print(f"Error during cleanup: {cleanup_error}")
-
-
-    # Testowanie grup
-    for group_name, tests in grouped_tests.items():
-        print(f"Testing group: {group_name}")
-        group_success = True
-        for test in tests:
-            test_input = os.path.join(test_folder, test.name, test.in_file)
-            test_expected = os.path.join(test_folder, test.name, test.out_file)
-            print(f"Running test: {test.name}")
-            result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
-            print(f"Result for {test.name}: {result}")
-            if result != "OK":
-                print(f"Group {group_name} failed due to: {result}")
-                group_success = False
-                break
-        if group_success:
-            group_points += next(group.points for group in test_groups if group.name == group_name)
-
-    # Testowanie niepogrupowanych testów
-    print("Testing ungrouped tests:")
-    for test in ungrouped_tests:
-        test_input = os.path.join(test_folder, test.name, test.in_file)
-        test_expected = os.path.join(test_folder, test.name, test.out_file)
-        print(f"Running test: {test.name}")
-        result = execute_test(test_input, test_expected, test, solution, task.time_limit, task.memory_limit)
-        print(f"Result for {test.name}: {result}")
-        if result == "OK":
-            ungrouped_tests_passed += 1
-
-    if ungrouped_num > 0:
-        ungrouped_points = ungrouped_tests_passed * (100 - group_total_points) // ungrouped_num
-    else:
-        ungrouped_points = 100 - group_total_points
+    finally:
+        test_cache.publish()
 
     # Obliczanie wyników
-    total_points = group_points + ungrouped_points
+    total_points = scoring.compute_points(test_groups, grouped_tests, ungrouped_tests, results.passed_test_ids())
     print(f"Total points: {total_points} / 100")
 
     # 5. Grading…
     print("Grading…")
-    solution.final_points = total_points
-    solution.status = "done"
-    solution.save()
-    
+    results.save('done', total_points)
+    verdict_cache.store(verdict_key, results)
+
     # 6. DONE!
     print("DONE!")
-
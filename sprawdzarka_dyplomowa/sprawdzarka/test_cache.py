@@ -0,0 +1,114 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from . import metrics
+
+# Pamięć podręczna plików testów (wejść i oczekiwanych wyjść) w obrębie procesu workera.
+# Pliki są mapowane do pamięci, a wpisy usuwane według LRU po przekroczeniu
+# SPRAWDZARKA_TEST_CACHE_SIZE. Klucz to id testu i ścieżka, a odcisk pliku (i-węzeł, rozmiar,
+# czas modyfikacji) unieważnia wpis, gdy test zostanie wgrany ponownie.
+
+
+class MappedFile:
+    """Plik testu z pamięci podręcznej; każdy odczyt ma własną pozycję, a mapowanie jest współdzielone."""
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, size=-1):
+        end = len(self._data) if size is None or size < 0 else min(self._position + size, len(self._data))
+        chunk = self._data[self._position:end]
+        self._position = end
+        return chunk
+
+    def close(self):
+        # Samego mapowania nie zamykamy - mogą z niego czytać inne testy, zwolni je GC po usunięciu wpisu
+        self._data = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (id testu, ścieżka) -> (odcisk pliku, mapowanie)
+_resident_bytes = 0
+_hits = 0
+_misses = 0
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _map(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_test_file(test, path):
+    """Otwiera plik testu do odczytu binarnego, z pamięci podręcznej, jeśli to możliwe."""
+    global _resident_bytes, _hits, _misses
+    if not settings.SPRAWDZARKA_TEST_CACHE:
+        return open(path, 'rb')
+
+    key = (test.id, os.path.abspath(path))
+    fingerprint = _fingerprint(path)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            _entries.move_to_end(key)
+            _hits += 1
+            return MappedFile(entry[1])
+        _misses += 1
+
+    limit = settings.SPRAWDZARKA_TEST_CACHE_SIZE * 1024 * 1024
+    size = fingerprint[1]
+    if size > limit:
+        return open(path, 'rb')
+
+    data = _map(path)
+    with _lock:
+        old_entry = _entries.pop(key, None)
+        if old_entry is not None:
+            _resident_bytes -= len(old_entry[1])
+        while _entries and _resident_bytes + size > limit:
+            _, (_, evicted) = _entries.popitem(last=False)
+            _resident_bytes -= len(evicted)
+        _entries[key] = (fingerprint, data)
+        _resident_bytes += size
+    return MappedFile(data)
+
+
+def publish():
+    """Przekazuje statystyki tego workera do wspólnych metryk (raz na ocenione rozwiązanie)."""
+    global _hits, _misses
+    with _lock:
+        hits, misses, resident_bytes = _hits, _misses, _resident_bytes
+        _hits = _misses = 0
+    if hits:
+        metrics.incr('test_cache_hits', hits)
+    if misses:
+        metrics.incr('test_cache_misses', misses)
+    metrics.set_worker_value('test_cache_resident_bytes', resident_bytes)
+
+
+def stats():
+    hits = metrics.get('test_cache_hits')
+    misses = metrics.get('test_cache_misses')
+    resident_bytes = metrics.get_worker_values('test_cache_resident_bytes')
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        'resident_bytes': sum(resident_bytes.values()),
+        'resident_bytes_per_worker': resident_bytes,
+    }
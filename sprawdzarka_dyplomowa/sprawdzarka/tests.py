@@ -1,3 +1,690 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from . import (
+    admission, batch, capture, checker, cpuset, dispatch, docker_api, fingerprint, jvm, rejudge, rescore, runner,
+    scoring, verdict_cache
+)
+from .management.commands.fake_docker_daemon import Handler, Server
+from .models import (
+    Contest, ContestTask, RejudgeBatch, RejudgeItem, Solution, SolutionTestResult, Task, Test, TestGroup, User
+)
+from .results import ResultBuffer, get_progress
 
-# Create your tests here.
+# Testy uruchamiane bez Dockera; piaskownica 'docker-api' sprawdzana jest na udawanym demonie
+# (fake_docker_daemon), którego "kontenery" są zwykłymi procesami na hoście.
+# Przed uruchomieniem (python manage.py test sprawdzarka) trzeba wygenerować migracje
+# (python manage.py makemigrations).
+
+
+class ReadOnlyStream:
+    """Obiekt z samym read(), bez deskryptora - jak plik testu z pamięci podręcznej."""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class CheckerTests(SimpleTestCase):
+    def test_tokens_split_across_chunks(self):
+        stream = io.BytesIO(b"12 345\n\n  6789\t0 ")
+        self.assertEqual(list(checker.iter_tokens(stream, chunk_size=3)), [b"12", b"345", b"6789", b"0"])
+
+    def test_whitespace_differences_are_ignored(self):
+        self.assertIsNone(checker.first_difference(io.BytesIO(b"1 2\n3\n"), io.BytesIO(b"1\n2 3")))
+
+    def test_first_different_token(self):
+        difference = checker.first_difference(io.BytesIO(b"1 2 4 5"), io.BytesIO(b"1 2 3 5"))
+        self.assertEqual(difference, {'position': 3, 'output': b"4", 'expected': b"3"})
+
+    def test_output_shorter_than_expected(self):
+        difference = checker.first_difference(io.BytesIO(b"1"), io.BytesIO(b"1 2"))
+        self.assertEqual(difference, {'position': 2, 'output': None, 'expected': b"2"})
+        self.assertIn("<koniec wyjścia>", checker.describe_difference(difference))
+
+
+class ScoringTests(SimpleTestCase):
+    def test_group_points_only_when_all_tests_pass(self):
+        points = scoring.points_from_counts(
+            {'g1': 30, 'g2': 20},
+            {'g1': 2, 'g2': 3, None: 0},
+            {'g1': 2, 'g2': 2, None: 0}
+        )
+        # Bez testów niepogrupowanych pozostałe punkty przyznawane są zawsze
+        self.assertEqual(points, 30 + 50)
+
+    def test_ungrouped_points_are_proportional(self):
+        points = scoring.points_from_counts({'g1': 40}, {'g1': 1, None: 3}, {'g1': 0, None: 2})
+        self.assertEqual(points, 2 * 60 // 3)
+
+
+class CaptureTests(SimpleTestCase):
+    def run_python(self, code, **kwargs):
+        return capture.run_bounded([sys.executable, "-c", code], **kwargs)
+
+    def test_stdout_stderr_and_exit_code(self):
+        with self.run_python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)") as result:
+            self.assertEqual(result.stdout.read(), b"out\n")
+            self.assertEqual(result.stderr, "err\n")
+            self.assertEqual(result.returncode, 3)
+            self.assertFalse(result.output_exceeded)
+
+    def test_stdin_without_file_descriptor(self):
+        data = b"x" * (3 * capture.CHUNK_SIZE)
+        code = "import sys; sys.stdout.write(str(len(sys.stdin.buffer.read())))"
+        with self.run_python(code, stdin=ReadOnlyStream(data)) as result:
+            self.assertEqual(result.stdout.read(), str(len(data)).encode())
+
+    def test_output_limit_kills_process(self):
+        on_limit = mock.Mock()
+        with self.run_python("while True: print('y' * 1000)", output_limit=5000, on_limit=on_limit, timeout=10) as result:
+            self.assertTrue(result.output_exceeded)
+            self.assertEqual(len(result.stdout.read()), 5000)
+        on_limit.assert_called_once()
+
+    def test_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.run_python("import time; time.sleep(10)", timeout=0.5)
+
+
+@override_settings(
+    SPRAWDZARKA_ADMISSION_CPUS=2, SPRAWDZARKA_ADMISSION_MEMORY=1000, SPRAWDZARKA_CPU_PINNING=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.ledger_path = os.path.join(root, 'admission.json')
+        ledger_settings = override_settings(SPRAWDZARKA_ADMISSION_LEDGER=self.ledger_path)
+        ledger_settings.enable()
+        self.addCleanup(ledger_settings.disable)
+
+    def test_reservations_fit_host_budget(self):
+        first = admission.try_reserve(1, 600, 'first')
+        self.assertIsNotNone(first)
+        self.assertIsNone(admission.try_reserve(1, 600, 'too much memory'))
+        second = admission.try_reserve(1, 300, 'second')
+        self.assertIsNotNone(second)
+        self.assertIsNone(admission.try_reserve(1, 100, 'no free CPU'))
+
+        first.release()
+        with admission.try_reserve(1, 100, 'after release'):
+            with admission.HostLedger(self.ledger_path) as ledger:
+                self.assertEqual(ledger.usage(), (2, 400))
+        second.release()
+
+    def test_oversized_request_is_clipped_to_budget(self):
+        with admission.try_reserve(8, 5000, 'large') as reservation:
+            self.assertIsNotNone(reservation)
+            with admission.HostLedger(self.ledger_path) as ledger:
+                self.assertEqual(ledger.usage(), (2, 1000))
+
+    def test_reservations_of_dead_processes_are_ignored(self):
+        finished = subprocess.Popen(["true"])
+        finished.wait()
+        with admission.HostLedger(self.ledger_path) as ledger:
+            ledger.reservations['dead'] = {'pid': finished.pid, 'cpus': 2, 'memory': 1000, 'label': 'dead'}
+            ledger.save()
+        reservation = admission.try_reserve(2, 1000, 'full host')
+        self.assertIsNotNone(reservation)
+        reservation.release()
+
+
+class CpusetTests(SimpleTestCase):
+    def test_parse_cpu_list(self):
+        self.assertEqual(cpuset.parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(cpuset.parse_cpu_list(""), [])
+
+    def test_siblings_are_reserved_together(self):
+        ledger_path = os.path.join(tempfile.mkdtemp(), 'cpuset.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(ledger_path))
+        with override_settings(
+            SPRAWDZARKA_CPU_PINNING=True, SPRAWDZARKA_CPU_PINNING_CPUS='0-3',
+            SPRAWDZARKA_CPU_PINNING_SIBLINGS=True, SPRAWDZARKA_CPU_PINNING_LEDGER=ledger_path
+        ), mock.patch.object(cpuset, 'siblings', lambda cpu: {cpu - cpu % 2, cpu - cpu % 2 + 1}):
+            self.assertEqual(cpuset.pool_capacity(), 2)
+            with ExitStack() as stack:
+                # Tylko dwa rdzenie fizyczne - rozwiązanie dostaje mniej rdzeni, niż prosiło
+                self.assertEqual(cpuset.allocate(stack, 4), ['0', '2'])
+                with admission.HostLedger(ledger_path) as ledger:
+                    self.assertEqual([reservation['cpus'] for reservation in ledger.reservations.values()], [[0, 1, 2, 3]])
+            with admission.HostLedger(ledger_path) as ledger:
+                self.assertEqual(ledger.reservations, {})
+
+
+class JudgeFixtureMixin:
+    """Zadanie z grupą g1 (2 testy, 40 pkt) i dwoma testami bez grupy w jednym kursie."""
+
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', role='teacher')
+        self.task = Task.objects.create(
+            name='T', special_id='T1', author=self.teacher, content_path='tasks/T1',
+            pdf_file='tasks/T1/T1.pdf', time_limit=1, memory_limit=64
+        )
+        self.group = TestGroup.objects.create(task=self.task, name='g1', points=40)
+        self.tests = [
+            Test.objects.create(name=name, task=self.task, group=group, in_file=f'{name}.in', out_file=f'{name}.out')
+            for name, group in [('a', self.group), ('b', self.group), ('c', None), ('d', None)]
+        ]
+        self.contest = Contest.objects.create(name='C', teacher=self.teacher)
+        self.contest_task = ContestTask.objects.create(contest=self.contest, task=self.task)
+
+    def submit(self, author, status='waiting', minutes_ago=0, **kwargs):
+        return Solution.objects.create(
+            contest_task=self.contest_task, author=author, lang='C/C++', src_path='s.cpp', status=status,
+            send_date=timezone.now() - timedelta(minutes=minutes_ago), **kwargs
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResultBufferTests(JudgeFixtureMixin, TestCase):
+    def test_results_saved_together_with_status(self):
+        solution = self.submit(self.teacher, status='done', final_points=100)
+        SolutionTestResult.objects.create(solution=solution, test=self.tests[0], passed=True, final_status='OK')
+
+        results = ResultBuffer(solution, len(self.tests))
+        results.add(self.tests[0], False, 'WA', time=5)
+        results.add(self.tests[2], True, 'OK', time=7)
+        # Do końca oceniania widać stare wyniki i postęp z cache
+        self.assertEqual(SolutionTestResult.objects.get(solution=solution).final_status, 'OK')
+        self.assertEqual(get_progress(solution.id), {'done': 2, 'failed': 1, 'total': 4})
+
+        results.save('done', 30)
+        solution.refresh_from_db()
+        self.assertEqual((solution.status, solution.final_points), ('done', 30))
+        self.assertEqual(
+            sorted(SolutionTestResult.objects.filter(solution=solution).values_list('test__name', 'final_status')),
+            [('a', 'WA'), ('c', 'OK')]
+        )
+        self.assertIsNone(get_progress(solution.id))
+
+    def test_cancelled_test_is_not_saved(self):
+        solution = self.submit(self.teacher, status='testing')
+        results = ResultBuffer(solution, len(self.tests))
+        results.cancel(self.tests[1])
+        results.add(self.tests[1], False, 'TLE')
+        results.add(self.tests[0], False, 'WA')
+        results.save('done', 0)
+        self.assertEqual(list(SolutionTestResult.objects.filter(solution=solution).values_list('test__name', flat=True)), ['a'])
+
+    def test_unchanged_results_are_kept(self):
+        fingerprints = {test.id: f'print-{test.name}' for test in self.tests}
+        solution = self.submit(self.teacher, status='done', final_points=100)
+        kept = SolutionTestResult.objects.create(
+            solution=solution, test=self.tests[0], passed=False, final_status='WA', fingerprint='print-a'
+        )
+        SolutionTestResult.objects.create(solution=solution, test=self.tests[1], passed=True, final_status='OK', fingerprint='old')
+
+        results = ResultBuffer(solution, len(self.tests), fingerprints)
+        self.assertEqual(list(results.keep_matching()), [self.tests[0].id])
+        results.add(self.tests[1], True, 'OK')
+        self.assertEqual(results.passed_test_ids(), {self.tests[1].id})
+        results.save('done', 0)
+
+        rows = SolutionTestResult.objects.filter(solution=solution).order_by('test__name')
+        self.assertEqual([(row.test.name, row.fingerprint) for row in rows], [('a', 'print-a'), ('b', 'print-b')])
+        self.assertEqual(rows[0].id, kept.id)
+
+    def test_result_fingerprint_covers_limits(self):
+        before = fingerprint.result_fingerprint('hash', self.task)
+        self.task.memory_limit = 128
+        self.assertNotEqual(fingerprint.result_fingerprint('hash', self.task), before)
+
+
+class TestSetVersionTests(JudgeFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for test in self.tests:
+            test.content_hash = f'hash-{test.name}'
+            test.save()
+        self.task = fingerprint.refresh_test_set(self.task.id)
+
+    def test_version_changes_only_with_test_set(self):
+        version = self.task.test_set_version
+        self.assertEqual(fingerprint.refresh_test_set(self.task.id).test_set_version, version)
+
+        self.group.points = 50
+        self.group.save()
+        self.assertEqual(fingerprint.refresh_test_set(self.task.id).test_set_version, version + 1)
+        Test.objects.filter(id=self.tests[2].id).update(content_hash='changed')
+        self.assertEqual(fingerprint.refresh_test_set(self.task.id).test_set_version, version + 2)
+
+    def test_version_of_judged_test_set(self):
+        version = self.task.test_set_version
+        judged_on = fingerprint.task_test_set_fingerprint(self.task)
+        self.assertEqual(fingerprint.test_set_version(self.task.id, judged_on), version)
+
+        # Zestaw zmieniony poza widokami - wersja podbijana przy pierwszym sprawdzeniu
+        Task.objects.filter(id=self.task.id).update(time_limit=2)
+        changed = fingerprint.task_test_set_fingerprint(Task.objects.get(id=self.task.id))
+        self.assertEqual(fingerprint.test_set_version(self.task.id, changed), version + 1)
+        # Rozwiązanie ocenione na poprzednim zestawie nie dostaje bieżącej wersji
+        self.assertIsNone(fingerprint.test_set_version(self.task.id, judged_on))
+
+    def test_stale_solutions(self):
+        version = self.task.test_set_version
+        current = self.submit(self.teacher, status='done', test_set_version=version)
+        outdated = self.submit(self.teacher, status='done', test_set_version=version - 1)
+        unversioned = self.submit(self.teacher, status='done')
+        self.submit(self.teacher, status='waiting')
+        self.assertEqual(set(fingerprint.stale_solutions(self.task)), {outdated, unversioned})
+        self.assertEqual(set(Solution.objects.filter(status='done').filter(fingerprint.stale_results())), {outdated, unversioned})
+        self.assertNotIn(current, Solution.objects.filter(fingerprint.stale_results()))
+
+
+class RescoreTests(JudgeFixtureMixin, TestCase):
+    def judged(self, passed_names, final_points, test_set_version=None):
+        solution = self.submit(self.teacher, status='done', final_points=final_points, test_set_version=test_set_version)
+        for test in self.tests:
+            # Test 'b' pominięty po niezaliczeniu grupy - bez wyniku
+            if test.name == 'b' and 'a' not in passed_names:
+                continue
+            SolutionTestResult.objects.create(
+                solution=solution, test=test, passed=test.name in passed_names,
+                final_status='OK' if test.name in passed_names else 'WA',
+                fingerprint=fingerprint.result_fingerprint(test.content_hash, self.task) if test.content_hash else ''
+            )
+        return solution
+
+    def test_rescore_after_group_points_change(self):
+        full = self.judged({'a', 'b', 'c', 'd'}, 100)
+        ungrouped_only = self.judged({'c'}, 30)
+        self.group.points = 70
+        self.group.save()
+
+        self.assertEqual(rescore.rescore(self.task.id), 1)
+        full.refresh_from_db()
+        ungrouped_only.refresh_from_db()
+        self.assertEqual(full.final_points, 100)
+        self.assertEqual(ungrouped_only.final_points, 15)
+
+    def test_skipped_test_counts_as_failed(self):
+        solution = self.judged({'c', 'd'}, 0)
+        rescore.rescore(self.task.id)
+        solution.refresh_from_db()
+        self.assertEqual(solution.final_points, 60)
+
+    def test_rescore_keeps_only_solutions_judged_on_current_tests_current(self):
+        for test in self.tests:
+            test.content_hash = f'hash-{test.name}'
+            test.save()
+        # Test 'a' niezaliczony, a pominięty 'b' bez wyniku - wyniki nadal odpowiadają testom
+        current = self.judged({'c'}, 30, test_set_version=1)
+        outdated = self.judged({'c'}, 30, test_set_version=1)
+        SolutionTestResult.objects.filter(solution=outdated, test=self.tests[3]).update(fingerprint='old')
+        Task.objects.filter(id=self.task.id).update(test_set_version=2)
+
+        rescore.rescore(self.task.id)
+        current.refresh_from_db()
+        outdated.refresh_from_db()
+        self.assertEqual(current.test_set_version, 2)
+        self.assertEqual(outdated.test_set_version, 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class VerdictCacheTests(JudgeFixtureMixin, TestCase):
+    def judge(self, *first_test_result):
+        results = ResultBuffer(self.submit(self.teacher, status='testing'), len(self.tests))
+        for test in self.tests[1:]:
+            results.add(test, True, 'OK', time=10)
+        results.add(self.tests[0], *first_test_result)
+        results.save('done', 60)
+        verdict_cache.store('key', results)
+        return verdict_cache.cache.get('key')
+
+    def tearDown(self):
+        verdict_cache.cache.clear()
+
+    def test_clean_verdict_is_stored(self):
+        self.assertEqual(self.judge(False, 'TLE', 1000)['final_points'], 60)
+
+    def test_judge_side_failures_are_not_stored(self):
+        self.assertIsNone(self.judge(False, 'ERR'))
+        self.assertIsNone(self.judge(False, 'TLE', None, None, None, True))
+
+    def source(self, content):
+        fd, path = tempfile.mkstemp(suffix='.cpp')
+        with os.fdopen(fd, 'wb') as source:
+            source.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_key_covers_source_language_and_test_set(self):
+        key = verdict_cache.make_key(self.source(b"int main() {}"), 'C/C++', 'tests-1')
+        self.assertEqual(verdict_cache.make_key(self.source(b"int main() {}"), 'C/C++', 'tests-1'), key)
+        self.assertNotEqual(verdict_cache.make_key(self.source(b"int main() { }"), 'C/C++', 'tests-1'), key)
+        self.assertNotEqual(verdict_cache.make_key(self.source(b"int main() {}"), 'Java', 'tests-1'), key)
+        self.assertNotEqual(verdict_cache.make_key(self.source(b"int main() {}"), 'C/C++', 'tests-2'), key)
+        # Bez odcisku zestawu testów werdykt nie jest zapamiętywany
+        self.assertIsNone(verdict_cache.make_key(self.source(b"int main() {}"), 'C/C++', None))
+        with self.settings(SPRAWDZARKA_VERDICT_CACHE=False):
+            self.assertIsNone(verdict_cache.make_key(self.source(b"int main() {}"), 'C/C++', 'tests-1'))
+
+    def test_identical_submission_reuses_verdict(self):
+        for test in self.tests:
+            test.content_hash = f'hash-{test.name}'
+            test.save()
+        self.task = fingerprint.refresh_test_set(self.task.id)
+        source = self.source(b"int main() {}")
+        results = ResultBuffer(self.submit(self.teacher, status='testing'), len(self.tests), test_set_version=self.task.test_set_version)
+        for test in self.tests:
+            results.add(test, test.name != 'a', 'OK' if test.name != 'a' else 'WA', time=10)
+        results.save('done', 60)
+        verdict_cache.store(verdict_cache.make_key(source, 'C/C++', fingerprint.task_test_set_fingerprint(self.task)), results)
+
+        # Rozwiązania wczytane z bazy, jak w widoku wysyłania
+        identical = Solution.objects.get(id=self.submit(self.teacher).id)
+        self.assertTrue(verdict_cache.reuse(identical, source))
+        identical.refresh_from_db()
+        self.assertEqual((identical.status, identical.final_points, identical.test_set_version), ('done', 60, self.task.test_set_version))
+        self.assertEqual(SolutionTestResult.objects.filter(solution=identical).count(), 4)
+
+        # Po zmianie limitów zadania zapamiętany werdykt już nie pasuje
+        Task.objects.filter(id=self.task.id).update(memory_limit=128)
+        self.assertFalse(verdict_cache.reuse(Solution.objects.get(id=self.submit(self.teacher).id), source))
+
+
+@override_settings(SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT=1, SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT_TIMEOUT=600)
+class DispatchTests(JudgeFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def dispatch(self):
+        with mock.patch.object(dispatch, 'send_to_judge') as send_to_judge:
+            dispatch.dispatch_pending()
+        return [call.args[0] for call in send_to_judge.call_args_list]
+
+    def test_one_in_flight_solution_per_author(self):
+        alice_first = self.submit(self.alice, minutes_ago=3)
+        alice_second = self.submit(self.alice, minutes_ago=2)
+        bob_first = self.submit(self.bob, minutes_ago=1)
+
+        self.assertEqual(self.dispatch(), [alice_first, bob_first])
+        self.assertEqual(self.dispatch(), [])
+
+        Solution.objects.filter(id=alice_first.id).update(status='done')
+        self.assertEqual(self.dispatch(), [alice_second])
+
+    @override_settings(SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT=2)
+    def test_authors_take_turns(self):
+        alice_solutions = [self.submit(self.alice, minutes_ago=10 - i) for i in range(3)]
+        bob_solutions = [self.submit(self.bob, minutes_ago=5 - i) for i in range(2)]
+        self.assertEqual(
+            self.dispatch(),
+            [alice_solutions[0], bob_solutions[0], alice_solutions[1], bob_solutions[1]]
+        )
+
+    def test_stale_in_flight_solution_stops_counting(self):
+        self.submit(self.alice, status='testing', minutes_ago=60, dispatched_at=timezone.now() - timedelta(minutes=30))
+        waiting = self.submit(self.alice)
+        self.assertEqual(self.dispatch(), [waiting])
+
+    def test_send_limit_ignores_stuck_solutions(self):
+        self.submit(self.alice)
+        self.submit(self.alice, status='testing', dispatched_at=timezone.now())
+        self.submit(self.alice, status='testing', minutes_ago=60, dispatched_at=timezone.now() - timedelta(minutes=30))
+        self.submit(self.alice, status='done', dispatched_at=timezone.now())
+        self.assertEqual(dispatch.pending_count(self.alice, self.contest), 2)
+
+
+@override_settings(SPRAWDZARKA_REJUDGE_RATE=2, SPRAWDZARKA_REJUDGE_MAX_IN_FLIGHT=3, SPRAWDZARKA_REJUDGE_ITEM_TIMEOUT=600)
+class RejudgeTests(JudgeFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.batch = RejudgeBatch.objects.create(created_by=self.teacher, description='test', total=4)
+        self.items = [
+            RejudgeItem.objects.create(batch=self.batch, solution=self.submit(self.teacher, status='done'))
+            for _ in range(4)
+        ]
+
+    def feed(self):
+        with mock.patch.object(rejudge, 'send_to_judge') as send_to_judge:
+            more = rejudge.feed(self.batch.id)
+        return more, [call.kwargs['rejudge_item_id'] for call in send_to_judge.call_args_list]
+
+    def test_feed_respects_rate_and_in_flight_limit(self):
+        self.assertEqual(self.feed(), (True, [self.items[0].id, self.items[1].id]))
+        self.assertEqual(self.feed(), (True, [self.items[2].id]))
+        self.assertEqual(self.feed(), (True, []))
+
+        rejudge.finish_item(self.items[0].id)
+        self.assertEqual(self.feed(), (True, [self.items[3].id]))
+
+    def test_batch_finishes_after_last_item(self):
+        RejudgeItem.objects.filter(id__in=[item.id for item in self.items[1:]]).update(status='done')
+        RejudgeItem.objects.filter(id=self.items[0].id).update(status='queued', queued_at=timezone.now())
+        rejudge.finish_item(self.items[0].id)
+        self.batch.refresh_from_db()
+        self.assertIsNotNone(self.batch.finished_at)
+        self.assertEqual(self.feed(), (False, []))
+
+    def test_lost_items_are_recovered(self):
+        long_ago = timezone.now() - timedelta(minutes=20)
+        RejudgeItem.objects.filter(id__in=[item.id for item in self.items[2:]]).update(status='done')
+        # Zadanie zgubione w kolejce i ocenianie przerwane awarią workera
+        RejudgeItem.objects.filter(id=self.items[0].id).update(status='queued', queued_at=long_ago)
+        RejudgeItem.objects.filter(id=self.items[1].id).update(status='queued', queued_at=long_ago, started_at=long_ago)
+
+        self.assertEqual(self.feed(), (True, [self.items[0].id]))
+        self.assertEqual(RejudgeItem.objects.get(id=self.items[1].id).status, 'error')
+        # Ponownie przekazane zadanie dostaje nowy termin
+        self.assertEqual(self.feed(), (True, []))
+
+        rejudge.start_item(self.items[0].id)
+        rejudge.finish_item(self.items[0].id)
+        self.batch.refresh_from_db()
+        self.assertIsNotNone(self.batch.finished_at)
+
+
+class JavaArchiveTests(SimpleTestCase):
+    def setUp(self):
+        state = mock.patch.multiple(jvm, _archive_ready=False, _last_check=float('-inf'), _rebuild_hash=None)
+        state.start()
+        self.addCleanup(state.stop)
+        self.archive_hash = 'v1'
+        self.current_hash = 'v1'
+        for name, replacement in [
+            ('_archive_hash', lambda refresh=False: self.archive_hash),
+            ('_archive_current', lambda tools_dir, archive_hash: archive_hash == self.current_hash),
+        ]:
+            patcher = mock.patch.object(jvm, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def check(self):
+        jvm._last_check = float('-inf')  # Bez czekania RECHECK_INTERVAL
+        with mock.patch.object(jvm, 'prepare_archive') as prepare_archive:
+            ready = jvm.archive_ready()
+            time.sleep(0.1)
+        return ready, prepare_archive.call_count
+
+    def test_image_change_starts_one_rebuild(self):
+        self.assertEqual(self.check(), (True, 0))
+        self.archive_hash = 'v2'
+        self.assertEqual(self.check(), (False, 1))
+        self.assertEqual(self.check(), (False, 0))
+        # Archiwum przebudowane (np. przez inny proces workera)
+        self.current_hash = 'v2'
+        self.assertEqual(self.check(), (True, 0))
+
+
+@skipUnless(shutil.which('gcc'), "do zbudowania judge_runnera potrzebny jest gcc")
+@override_settings(SPRAWDZARKA_TEST_CACHE=False)
+class BatchHarnessTests(SimpleTestCase):
+    """judge_harness.sh z judge_runnerem zbudowanym na hoście, bez piaskownicy."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tools = tempfile.mkdtemp()
+        shutil.copy(os.path.join(runner.SOURCE_DIR, 'judge_harness.sh'), cls.tools)
+        subprocess.run(
+            ["gcc", "-O2", "-o", os.path.join(cls.tools, 'judge_runner'), os.path.join(runner.SOURCE_DIR, 'judge_runner.c')],
+            check=True
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tools, ignore_errors=True)
+        super().tearDownClass()
+
+    def run_harness(self, program, tests, memory_error_markers=()):
+        """Uruchamia harness na testach (id, grupa, wejście, oczekiwane wyjście); zwraca {id: werdykt}."""
+        workspace = tempfile.mkdtemp(dir=self.tools)
+        manifest_lines = []
+        inputs = []
+        for test_id, group, input_data, expected in tests:
+            test = SimpleNamespace(id=test_id)
+            input_path = os.path.join(workspace, f'{test_id}.in')
+            expected_path = os.path.join(workspace, f'{test_id}.out')
+            with open(input_path, 'wb') as input_file:
+                input_file.write(input_data)
+            with open(expected_path, 'wb') as expected_file:
+                expected_file.write(expected)
+            manifest_lines.append(f"{test_id} {group} {batch.expected_output_digest(test, expected_path)} {len(input_data)}\n")
+            inputs.append((test, input_path, len(input_data)))
+        with open(os.path.join(workspace, batch.MANIFEST_NAME), 'w') as manifest:
+            manifest.writelines(manifest_lines)
+        with open(os.path.join(workspace, batch.MARKERS_NAME), 'w') as markers:
+            markers.writelines(f"{marker}\n" for marker in memory_error_markers)
+
+        process = subprocess.Popen(
+            ["sh", os.path.join(self.tools, 'judge_harness.sh'), "2000", "1000000", batch.MANIFEST_NAME, batch.MARKERS_NAME] + program,
+            cwd=workspace, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        threading.Thread(target=batch.feed_inputs, args=(process.stdin.buffer, inputs), daemon=True).start()
+        verdicts = {int(line.split()[0]): line.split()[1] for line in process.stdout}
+        process.wait()
+        # Wejścia testów nie zostają w katalogu roboczym
+        self.assertFalse([name for name in os.listdir(workspace) if name.startswith('input_')])
+        return verdicts
+
+    def test_inputs_streamed_in_manifest_order(self):
+        verdicts = self.run_harness(["sh", "-c", "read a b; echo $((a + b))"], [
+            (1, '0', b"1 2\n", b"3\n"),
+            (2, '0', b"2 2\n", b"5\n"),
+            (3, '0', b"3 3\n", b"6\n"),  # Pominięty po niezaliczonym teście grupy
+            (4, '-', b"10 20\n", b"30\n"),
+        ])
+        self.assertEqual(verdicts, {1: 'OK', 2: 'WA', 3: 'SKIP', 4: 'OK'})
+
+    def test_large_input(self):
+        data = b"x" * (3 * 1024 * 1024)
+        verdicts = self.run_harness(["wc", "-c"], [(1, '-', data, str(len(data)).encode()), (2, '-', b"", b"0")])
+        self.assertEqual(verdicts, {1: 'OK', 2: 'OK'})
+
+    def test_memory_error_markers(self):
+        program = ["sh", "-c", "read a; [ $a = 1 ] && echo 'java.lang.OutOfMemoryError: Java heap space' >&2; echo $a; exit $a"]
+        tests = [(1, '-', b"1\n", b"1\n"), (2, '-', b"0\n", b"0\n")]
+        self.assertEqual(self.run_harness(program, tests, ["java.lang.OutOfMemoryError"]), {1: 'MLE', 2: 'OK'})
+        self.assertEqual(self.run_harness(program, tests), {1: 'ERR', 2: 'OK'})
+
+
+class DockerApiSandboxTests(SimpleTestCase):
+    """DockerApiSandbox na udawanym demonie Dockera (fake_docker_daemon)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        socket_path = os.path.join(cls.root, 'docker.sock')
+        cls.server = Server(socket_path, Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            SPRAWDZARKA_DOCKER_SOCKET=socket_path,
+            SPRAWDZARKA_JUDGE_TOOLS_ROOT=os.path.join(cls.root, 'judge_tools'),
+            MEDIA_ROOT=os.path.join(cls.root, 'media')
+        )
+        cls.settings_override.enable()
+        docker_api._client = None  # Klient z połączeniami do udawanego demona
+
+    @classmethod
+    def tearDownClass(cls):
+        docker_api.get_client().close()
+        docker_api._client = None
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(dir=self.root)
+        self.sandbox = docker_api.DockerApiSandbox('gcc:9', self.workspace)
+
+    def test_stdout_and_exit_code(self):
+        result = self.sandbox.execute(["sh", "-c", "echo hello; echo oops >&2; exit 3"])
+        self.assertEqual(result.stdout, "hello\n")
+        self.assertEqual(result.stderr, "oops\n")
+        self.assertEqual(result.returncode, 3)
+
+    def test_runs_in_workspace(self):
+        with open(os.path.join(self.workspace, 'input.txt'), 'w') as input_file:
+            input_file.write("from workspace")
+        self.assertEqual(self.sandbox.execute(["cat", "input.txt"]).stdout, "from workspace")
+
+    def test_stdin(self):
+        with self.sandbox.execute_bounded(["cat"], stdin=ReadOnlyStream(b"1 2\n3\n")) as result:
+            self.assertEqual(result.stdout.read(), b"1 2\n3\n")
+            self.assertEqual(result.returncode, 0)
+
+    def test_output_limit(self):
+        with self.sandbox.execute_bounded(["sh", "-c", "while true; do echo yyyyyyyy; done"], output_limit=4000, timeout=10) as result:
+            self.assertTrue(result.output_exceeded)
+            self.assertEqual(len(result.stdout.read()), 4000)
+
+    def test_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.sandbox.execute_bounded(["sleep", "10"], timeout=0.5)
+
+    def delayed(self, method, delay):
+        original = getattr(docker_api.DockerClient, method)
+
+        def call(client, *args, **kwargs):
+            time.sleep(delay)
+            return original(client, *args, **kwargs)
+        return mock.patch.object(docker_api.DockerClient, method, call)
+
+    def test_timeout_before_start(self):
+        # Czas mija przed utworzeniem kontenera albo między utworzeniem a startem
+        for method in ['create_container', 'start']:
+            with self.subTest(method=method), self.delayed(method, 0.5):
+                started = time.monotonic()
+                with self.assertRaises(subprocess.TimeoutExpired):
+                    self.sandbox.execute(["sleep", "10"], timeout=0.2)
+                self.assertLess(time.monotonic() - started, 5)
+                self.assertEqual(Handler.containers, {})
+
+    def test_spawn_killed_before_start(self):
+        with self.delayed('start', 0.5):
+            process = self.sandbox.spawn(["sleep", "10"])
+            process.kill()
+            self.assertIsNotNone(process.wait(timeout=5))
+        self.assertEqual(Handler.containers, {})
+
+    def test_spawn_with_stdin(self):
+        process = self.sandbox.spawn(["cat"], stdin=True)
+        process.stdin.buffer.write(b"1 2 3\n")
+        process.stdin.buffer.close()
+        self.assertEqual(process.stdout.read(), "1 2 3\n")
+        self.assertEqual(process.wait(timeout=10), 0)
+
+    def test_task_files_are_not_mounted(self):
+        binds = self.sandbox._config(["true"], False)['HostConfig']['Binds']
+        self.assertFalse([bind for bind in binds if bind.startswith(os.path.abspath(os.path.join(self.root, 'media')))])
@@ -36,6 +36,7 @@ urlpatterns = [
     path('user-solutions/', views.UserSolutionsView.as_view(), name='user_solutions'),
     path('send_solution/', views.send_solution_view, name='send_solution'),
     path('solution_raport/<int:id>/', views.solution_raport_view, name='solution_raport'),
+    path('solution_progress/<int:id>/', views.solution_progress_view, name='solution_progress'),
     path('ranking/', views.contest_ranking_view, name='contest_ranking'),
     path('questions/user/', views.question_user_view, name='question_user_view'),
     path('questions/content/<int:question_id>/', views.question_content_view, name='question_content_view'),
@@ -45,4 +46,7 @@ urlpatterns = [
     path('download/<int:test_id>/<int:in_out>', views.download_file, name='download_file'),
     path('delete-group/<int:group_id>/', views.delete_group, name='delete_group'),
     path('delete-test/<int:test_id>/', views.delete_test, name='delete_test'),
+    path('judge-stats/', views.judge_stats_view, name='judge_stats'),
+    path('rejudge/', views.rejudge_view, name='rejudge'),
+    path('rejudge/<int:batch_id>/', views.rejudge_progress_view, name='rejudge_progress'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
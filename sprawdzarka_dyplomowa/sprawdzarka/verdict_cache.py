@@ -0,0 +1,89 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+from . import metrics
+from .fingerprint import file_hash, task_test_set_fingerprint
+from .models import SolutionTestResult
+
+# Pamięć werdyktów we wspólnym cache (Redis): ocena rozwiązania zapamiętywana pod kluczem
+# (skrót źródła, język, odcisk zestawu testów zadania). Odcisk obejmuje treść i grupy testów,
+# punkty grup oraz limity czasu i pamięci, więc każda zmiana testów, grup albo limitów zadania
+# daje nowy klucz i stare werdykty przestają pasować. Identyczne zgłoszenie dostaje kopię
+# wyników testów i punktów od razu, bez oceniania.
+VERDICT_PREFIX = 'sprawdzarka:verdict:'
+RESULT_FIELDS = ['test_id', 'passed', 'final_status', 'time', 'wall_time', 'memory', 'fingerprint']
+
+
+def make_key(src_path, lang, test_set_fingerprint):
+    """Klucz werdyktu albo None, gdy odcisku zestawu testów nie da się ustalić."""
+    if not settings.SPRAWDZARKA_VERDICT_CACHE or test_set_fingerprint is None:
+        return None
+    key = hashlib.sha256()
+    for part in (file_hash(src_path), lang, test_set_fingerprint):
+        key.update(part.encode())
+        key.update(b'\0')
+    return VERDICT_PREFIX + key.hexdigest()
+
+
+def store(key, results):
+    """Zapamiętuje zapisaną ocenę rozwiązania (status 'done') z bufora wyników `results`.
+
+    Pomija oceny, w których wynik któregoś testu zależał od awarii po stronie sędziego
+    (ResultBuffer.clean) - kolejne identyczne zgłoszenie zostanie wtedy ocenione od nowa.
+    """
+    solution = results.solution
+    if key is None:
+        return
+    if not results.clean:
+        print(f"Solution {solution.id}: verdict not cached, it depends on a judge-side failure")
+        return
+    try:
+        rows = list(SolutionTestResult.objects.filter(solution=solution).values(*RESULT_FIELDS))
+        cache.set(key, {'final_points': solution.final_points, 'results': rows}, timeout=settings.SPRAWDZARKA_VERDICT_CACHE_TIMEOUT)
+    except Exception as e:
+        print(f"Could not store verdict of solution {solution.id}: {e}")
+
+
+def reuse(solution, src_path):
+    """Ocenia nowe rozwiązanie (status 'waiting') kopią zapamiętanego werdyktu.
+
+    Zwraca True, gdy werdykt się znalazł - rozwiązania nie trzeba wtedy przekazywać do oceny.
+    """
+    if not settings.SPRAWDZARKA_VERDICT_CACHE:
+        return False
+    task = solution.contest_task.task
+    try:
+        test_set = task_test_set_fingerprint(task)
+        key = make_key(src_path, solution.lang, test_set)
+        verdict = cache.get(key) if key is not None else None
+    except Exception as e:
+        print(f"Could not look up verdict of solution {solution.id}: {e}")
+        return False
+    if verdict is None:
+        metrics.incr('verdict_cache_misses')
+        return False
+
+    with transaction.atomic():
+        SolutionTestResult.objects.bulk_create([
+            SolutionTestResult(solution=solution, **row) for row in verdict['results']
+        ])
+        solution.status = 'done'
+        solution.final_points = verdict['final_points']
+        solution.judging_started_at = now()
+        solution.test_set_version = task.test_set_version if task.test_set_fingerprint == test_set else None
+        solution.save(update_fields=['status', 'final_points', 'judging_started_at', 'test_set_version'])
+    metrics.incr('verdict_cache_hits')
+    print(f"Solution {solution.id}: verdict reused from an identical submission")
+    return True
+
+
+def stats():
+    hits = metrics.get('verdict_cache_hits')
+    misses = metrics.get('verdict_cache_misses')
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
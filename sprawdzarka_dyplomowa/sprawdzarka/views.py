@@ -11,10 +11,10 @@ from django.contrib import messages
 from django.views.generic import ListView
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
-from .forms import LoginForm, RegisterForm, LectureForm, TaskForm, EditTaskForm, TestCreateForm, ContestForm, SendSolutionForm, QuestionForm, AnswerForm, EditLectureForm
+from .forms import LoginForm, RegisterForm, LectureForm, TaskForm, EditTaskForm, TestCreateForm, ContestForm, SendSolutionForm, QuestionForm, AnswerForm, EditLectureForm, RejudgeForm
 from .decorators import not_logged_in_required, logged_in_required, user_not_teacher, user_not_admin
 from django.contrib.auth.decorators import login_required
-from .models import User, Contest, Lecture, Task, Test, TestGroup, ContestLecture, ContestTask, ContestSigned, Solution, SolutionTestResult, Question
+from .models import User, Contest, Lecture, Task, Test, TestGroup, ContestLecture, ContestTask, ContestSigned, Solution, SolutionTestResult, Question, RejudgeBatch
 from django.db.models import Max
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
@@ -23,8 +23,10 @@ from django.views import View
 from django.http import JsonResponse, Http404, FileResponse, HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Sum, Q, Prefetch, Max, F, Count
-from .tasks import execute_cpp, execute_java, execute_cs
-from datetime import datetime
+from .dispatch import enqueue_solution, pending_count, queue_wait_p95
+from . import admission, compile_cache, fingerprint, rejudge, rescore, test_cache, verdict_cache
+from .results import get_progress
+from datetime import datetime, timedelta
 from django.utils.timezone import now
 from django.core.paginator import Paginator
 from django.db import transaction
@@ -409,7 +411,10 @@ def edit_task_view(request, task_id):
                         destination.write(chunk)
 
                 task.pdf_file = path_on_server
-            form.save()
+            with transaction.atomic():
+                form.save()
+                # Zmiana limitów zmienia zestaw testów zadania
+                fingerprint.refresh_test_set(task.id)
             messages.success(request, "Poprawnie zmodyfikowano zadanie!")
             return redirect('edit_task', task_id=task.id)
         else:
@@ -439,7 +444,10 @@ def create_group_view(request, task_id):
                 return JsonResponse({'status': 'error', 'message': 'Suma punktów dla wszystkich grup nie może przekraczać 100.'}, status=400)
 
             # Tworzenie nowej grupy
-            new_group = TestGroup.objects.create(task=task, name=name, points=points)
+            with transaction.atomic():
+                new_group = TestGroup.objects.create(task=task, name=name, points=points)
+                fingerprint.refresh_test_set(task.id)
+                rescore.schedule(task.id)
             return JsonResponse({
                 'status': 'success',
                 'group': {
@@ -460,9 +468,12 @@ def update_group_view(request, group_id):
             data = json.loads(request.body)
             points = data.get('points')
 
-            group = TestGroup.objects.get(id=group_id)
-            group.points = points
-            group.save()
+            with transaction.atomic():
+                group = TestGroup.objects.get(id=group_id)
+                group.points = points
+                group.save()
+                fingerprint.refresh_test_set(group.task_id)
+                rescore.schedule(group.task_id)
 
             return JsonResponse({'status': 'success'})
         except TestGroup.DoesNotExist:
@@ -494,22 +505,26 @@ def create_test_view(request):
             in_file_path = os.path.join(tests_dir, in_file.name)
             out_file_path = os.path.join(tests_dir, out_file.name)
 
-            with open(in_file_path, 'wb+') as f:
-                for chunk in in_file.chunks():
-                    f.write(chunk)
-
-            with open(out_file_path, 'wb+') as f:
-                for chunk in out_file.chunks():
-                    f.write(chunk)
+            # Zapis przez plik tymczasowy i podmianę, żeby workery czytające stary plik
+            # (zmapowany w pamięci podręcznej testów) nie zobaczyły go w połowie zapisu
+            for uploaded_file, file_path in ((in_file, in_file_path), (out_file, out_file_path)):
+                tmp_path = f"{file_path}.tmp-{os.getpid()}"
+                with open(tmp_path, 'wb+') as f:
+                    for chunk in uploaded_file.chunks():
+                        f.write(chunk)
+                os.replace(tmp_path, file_path)
 
-            # Tworzenie rekordu w bazie
-            new_test = Test.objects.create(
-                task=task,
-                name=name,
-                group=group,
-                in_file=in_file.name,
-                out_file=out_file.name,
-            )
+            # Tworzenie rekordu w bazie razem z nową wersją zestawu testów
+            with transaction.atomic():
+                new_test = Test.objects.create(
+                    task=task,
+                    name=name,
+                    group=group,
+                    in_file=in_file.name,
+                    out_file=out_file.name,
+                    content_hash=fingerprint.compute_content_hash(in_file_path, out_file_path),
+                )
+                fingerprint.refresh_test_set(task.id)
 
             # Przygotowanie danych do odpowiedzi
             response_data = {
@@ -536,14 +551,17 @@ def edit_test_view(request):
             test_id = data.get('test_id')
             group_id = data.get('group_id')
 
-            test = Test.objects.get(id=test_id)
-            if group_id:
-                group = TestGroup.objects.get(id=group_id)
-                test.group = group
-            else:
-                test.group = None
-
-            test.save()
+            with transaction.atomic():
+                test = Test.objects.get(id=test_id)
+                if group_id:
+                    group = TestGroup.objects.get(id=group_id)
+                    test.group = group
+                else:
+                    test.group = None
+
+                test.save()
+                fingerprint.refresh_test_set(test.task_id)
+                rescore.schedule(test.task_id)
             return JsonResponse({'status': 'success', 'message': 'Grupa testu została zmodyfikowana.'})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -1088,6 +1106,13 @@ def send_solution_view(request):
                 context['error_message'] = "Kurs się już zakończył!"
                 return render(request, 'send_solution.html', context)
 
+            # Limit wysyłek kursu: tyle rozwiązań autora może naraz czekać na ocenę
+            send_limit = contest_task.contest.send_limit
+            if send_limit and pending_count(user, contest_task.contest) >= send_limit:
+                context['form'] = form
+                context['error_message'] = f"Masz już {send_limit} rozwiązań czekających na ocenę w tym kursie. Poczekaj na ich wyniki."
+                return render(request, 'send_solution.html', context)
+
             contest_name = contest_task.contest.name
             task_name = contest_task.task.name
             timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")
@@ -1116,13 +1141,10 @@ def send_solution_view(request):
         solution.status = 'waiting'
         solution.save()
 
-        # Execute the appropriate task based on language
-        if lang == 'C/C++':
-            execute_cpp.delay(solution.id)
-        elif lang == 'Java':
-            execute_java.delay(solution.id)
-        elif lang == 'C#':
-            execute_cs.delay(solution.id)
+        # Identyczne rozwiązanie ocenione na tym samym zestawie testów - kopia werdyktu zamiast oceniania
+        if not verdict_cache.reuse(solution, file_path):
+            # Execute the appropriate task based on language (queue per language, contest submissions first)
+            enqueue_solution(solution)
 
         return redirect('user_solutions')
 
@@ -1145,6 +1167,7 @@ def solution_raport_view(request, id):
         context = {
             'solution': solution,
             'is_done': False,
+            'progress': get_progress(solution.id),
         }
         return render(request, 'solution_raport.html', context)
 
@@ -1171,6 +1194,26 @@ def solution_raport_view(request, id):
     return render(request, 'solution_raport.html', context)
 
 
+@login_required
+def solution_progress_view(request, id):
+    solution = get_object_or_404(Solution, pk=id)
+
+    user = request.user
+    if not (
+        user == solution.author or
+        user == solution.contest_task.contest.teacher or
+        user.role == 'admin'
+    ):
+        return JsonResponse({'error': 'Brak dostępu.'}, status=403)
+
+    # Postęp oceniania z cache - wyniki testów trafiają do bazy dopiero na końcu
+    return JsonResponse({
+        'status': solution.status,
+        'final_points': solution.final_points,
+        'progress': get_progress(solution.id) if solution.status == 'testing' else None,
+    })
+
+
 @login_required
 def contest_ranking_view(request):
     user = request.user
@@ -1413,6 +1456,8 @@ def delete_group(request, group_id):
                 
                 # Usunięcie grupy
                 group.delete()
+                fingerprint.refresh_test_set(group.task_id)
+                rescore.schedule(group.task_id)
             
             return JsonResponse({"status": "success", "message": "Grupa została pomyślnie usunięta."})
         except Exception as e:
@@ -1422,14 +1467,80 @@ def delete_group(request, group_id):
 def delete_test(request, test_id):
     if request.method == "POST":
         try:
-            # Pobierz test
-            test = get_object_or_404(Test, id=test_id)
-            
-            # Usuń test
-            test.delete()
+            with transaction.atomic():
+                # Pobierz test
+                test = get_object_or_404(Test, id=test_id)
+
+                # Usuń test
+                test.delete()
+                fingerprint.refresh_test_set(test.task_id)
+                rescore.schedule(test.task_id)
             
             return JsonResponse({"status": "success", "message": "Test został pomyślnie usunięty."})
         except Exception as e:
             return JsonResponse({"status": "error", "message": f"Wystąpił błąd: {str(e)}"})
-        
 
+
+@user_not_admin
+def judge_stats_view(request):
+    # Zadania zużywające najwięcej czasu sędziego
+    task_usage = SolutionTestResult.objects.values('test__task__special_id').annotate(
+        runs=Count('id'),
+        cpu_ms=Sum('time'),
+        wall_ms=Sum('wall_time'),
+        peak_kb=Max('memory'),
+    ).order_by(F('wall_ms').desc(nulls_last=True))[:20]
+
+    return JsonResponse({
+        'admission': admission.stats(),
+        'compile_cache': compile_cache.stats(),
+        'test_cache': test_cache.stats(),
+        'verdict_cache': verdict_cache.stats(),
+        'queue_wait_p95_per_user': queue_wait_p95(now() - timedelta(days=7)),
+        'task_usage': list(task_usage),
+    })
+
+
+@login_required
+@user_not_teacher
+def rejudge_view(request):
+    user = request.user
+    if request.method == 'POST':
+        form = RejudgeForm(request.POST, user=user)
+        if form.is_valid():
+            data = form.cleaned_data
+            solutions = rejudge.solutions_for(
+                user,
+                contest=data['contest'],
+                task=data['task'],
+                lang=data['lang'],
+                status=data['status'],
+                since=data['since'],
+                stale=data['stale'],
+            )
+            description = " / ".join(
+                str(part) for part in (
+                    data['contest'], data['task'], data['lang'], data['status'], data['since'],
+                    "sprzed zmiany testów" if data['stale'] else None
+                ) if part
+            )
+            batch = rejudge.start_rejudge(solutions, user, description, full=data['full'])
+            messages.success(request, f"Rozpoczęto ponowną ocenę {batch.total} rozwiązań.")
+            return redirect('rejudge')
+    else:
+        form = RejudgeForm(user=user)
+
+    batches = RejudgeBatch.objects.all() if user.role == 'admin' else RejudgeBatch.objects.filter(created_by=user)
+    return render(request, 'rejudge.html', {
+        'form': form,
+        'batches': [rejudge.progress(batch) for batch in batches.order_by('-created_at')[:20]],
+    })
+
+
+@login_required
+@user_not_teacher
+def rejudge_progress_view(request, batch_id):
+    batch = get_object_or_404(RejudgeBatch, id=batch_id)
+    if request.user != batch.created_by and request.user.role != 'admin':
+        return JsonResponse({'error': 'Brak dostępu.'}, status=403)
+    return JsonResponse(rejudge.progress(batch))
@@ -2,6 +2,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from django.conf import settings
+from kombu import Queue
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sprawdzarka_dyplomowa.settings')
 
@@ -9,5 +10,48 @@ app = Celery('sprawdzarka_dyplomowa')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Osobna kolejka dla każdego języka, żeby workery można było dobrać do obrazu Dockera
+# (np. `celery -A sprawdzarka_dyplomowa worker -Q judge_java --concurrency=2`).
+# Worker uruchomiony bez -Q obsługuje wszystkie kolejki. W trybie potokowym
+# (SPRAWDZARKA_PIPELINE) kolejki judge_* tylko kompilują, a testy uruchamiane są z kolejek run_*.
+JUDGE_QUEUES = {
+    'sprawdzarka.tasks.execute_cpp': 'judge_cpp',
+    'sprawdzarka.tasks.execute_java': 'judge_java',
+    'sprawdzarka.tasks.execute_cs': 'judge_cs',
+    'sprawdzarka.tasks.run_cpp': 'run_cpp',
+    'sprawdzarka.tasks.run_java': 'run_java',
+    'sprawdzarka.tasks.run_cs': 'run_cs',
+}
+
+app.conf.task_queues = [Queue('celery')] + [Queue(queue, routing_key=queue) for queue in JUDGE_QUEUES.values()]
+app.conf.task_routes = {task: {'queue': queue} for task, queue in JUDGE_QUEUES.items()}
+
+# Priorytety w Redisie: każdy poziom kolejki to osobna lista, a w obrębie kolejki worker
+# pobiera najpierw z poziomu o najniższym numerze (0 = najważniejsze). Poziomy nadaje
+# sprawdzarka.dispatch (parametr priority= przy wysyłaniu zadania). Kolejki obsługiwane przez
+# jednego workera (-Q judge_java,judge_cs) czytane są na zmianę (domyślne round_robin), więc
+# zaległości w jednym języku nie blokują pozostałych.
+app.conf.broker_transport_options = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+app.conf.task_default_priority = 5
+# Worker bierze zadanie dopiero, gdy skończy poprzednie - inaczej pobrane zawczasu
+# zadania o niskim priorytecie wyprzedzałyby te, które przyjdą później
+app.conf.worker_prefetch_multiplier = 1
+app.conf.task_acks_late = True
+
+# Okresowe przekazywanie czekających rozwiązań (celery beat): rozwiązanie nie utknie w bazie,
+# gdy żadne zgłoszenie ani koniec oceniania nie wywoła dispatch_pending, np. po awarii workera
+# albo po wygaśnięciu limitu SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT_TIMEOUT.
+app.conf.beat_schedule = {
+    'dispatch-pending-solutions': {
+        'task': 'sprawdzarka.tasks.dispatch_solutions',
+        'schedule': settings.SPRAWDZARKA_DISPATCH_INTERVAL,
+        # Zaległe wywołania nie gromadzą się w kolejce, gdy workery są zajęte
+        'options': {'expires': settings.SPRAWDZARKA_DISPATCH_INTERVAL},
+    },
+}
+
 # Load tasks from all registered Django app configs.
 app.autodiscover_tasks()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,6 +32,14 @@ ALLOWED_HOSTS = ['192.168.0.112', 'localhost', '127.0.0.1']
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'django-db'
 
+# Shared cache, used for judge metrics collected from all workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }
+}
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -137,3 +146,165 @@ MEDIA_SAVE = os.path.join(SPRAWDZARKA_ROOT, 'media')
 AUTH_USER_MODEL = 'sprawdzarka.User'
 
 LOGIN_URL = '/login/'
+
+# Judge sandbox: per-worker pool of pre-started containers that tests are exec'd into.
+# With SPRAWDZARKA_SANDBOX_POOL = False every command runs in a fresh `docker run --rm`.
+SPRAWDZARKA_SANDBOX_POOL = True
+SPRAWDZARKA_SANDBOX_POOL_IMAGES = ['gcc:9', 'openjdk:17', 'mono']
+SPRAWDZARKA_SANDBOX_POOL_WARM = 1  # containers started per image when a worker process boots
+SPRAWDZARKA_SANDBOX_POOL_SIZE = 4  # max containers per image in one worker process
+SPRAWDZARKA_SANDBOX_MAX_REUSE = 50  # solutions judged in one container before it is recreated
+SPRAWDZARKA_SANDBOX_MEMORY = 2048  # MB, container limit outside of test runs (compilation, cleanup)
+SPRAWDZARKA_SANDBOX_ROOT = os.path.join(BASE_DIR, 'media', 'sandbox')
+
+# Sandbox backend per language: 'docker' (containers above), 'docker-api' (a container per
+# command like the non-pool mode, created through the Docker Engine API over a pooled
+# Unix-socket connection instead of the docker CLI) or 'native' - judge_jail runs
+# commands straight on the host in Linux namespaces, a cgroup v2 and setrlimit limits,
+# on the language image's filesystem exported once per host (same toolchain, no container start).
+# 'native' needs unprivileged user namespaces and a cgroup v2 subtree delegated to the worker
+# (e.g. systemd Delegate=yes) with the memory and pids controllers available.
+SPRAWDZARKA_SANDBOX_BACKENDS = {'C/C++': 'docker', 'Java': 'docker', 'C#': 'docker'}
+SPRAWDZARKA_NATIVE_ROOTFS_ROOT = os.path.join(BASE_DIR, 'media', 'rootfs')
+SPRAWDZARKA_NATIVE_CGROUP_ROOT = '/sys/fs/cgroup/sprawdzarka/sandboxes'
+SPRAWDZARKA_NATIVE_TMPFS_SIZE = 64  # MB, private /tmp of a sandbox
+SPRAWDZARKA_NATIVE_FILE_SIZE = 256  # MB, RLIMIT_FSIZE
+SPRAWDZARKA_NATIVE_OPEN_FILES = 256  # RLIMIT_NOFILE
+SPRAWDZARKA_DOCKER_SOCKET = '/var/run/docker.sock'
+SPRAWDZARKA_DOCKER_API_VERSION = 'v1.41'
+SPRAWDZARKA_DOCKER_API_POOL_SIZE = 8  # idle connections kept per worker process
+
+# Tests of one solution run concurrently on up to this many sandboxes (0 = all cores,
+# always capped at os.cpu_count()). With the pool enabled each concurrent test needs its
+# own container, so keep SPRAWDZARKA_SANDBOX_POOL_SIZE at least this large.
+SPRAWDZARKA_JUDGE_PARALLELISM = 1
+
+# Compiled programs cached by source hash, language, compiler image and command.
+SPRAWDZARKA_COMPILE_CACHE = True
+SPRAWDZARKA_COMPILE_CACHE_ROOT = os.path.join(BASE_DIR, 'compile_cache')
+SPRAWDZARKA_COMPILE_CACHE_SIZE = 1024  # MB, least recently used entries are evicted above this
+
+# 'per_test': one sandbox command per test (parallel when SPRAWDZARKA_JUDGE_PARALLELISM > 1).
+# 'batch': one sandbox session per solution; an in-sandbox harness runs all tests and
+# streams back one verdict line per test.
+# 'async': like per_test, but compilations and tests of every solution judged by a worker
+# process are driven by one asyncio event loop (asyncio.create_subprocess_exec, asyncio
+# timeouts). Run the worker with a thread pool (`celery worker -P threads`) so many solutions
+# share the loop; SPRAWDZARKA_ASYNC_* below bound how many commands run at once.
+# Test files never enter the sandbox: per_test feeds stdin straight from MEDIA_ROOT/tasks, and
+# the batch harness gets the inputs streamed on its stdin, so submitted code cannot read the
+# expected outputs (or other tasks' tests).
+SPRAWDZARKA_JUDGE_MODE = 'per_test'
+
+# Resource budget of the asyncio orchestrator (judge mode 'async'), per worker process.
+# A test reserves one core and the task memory limit plus the language overhead, a compilation
+# one core and SPRAWDZARKA_ASYNC_COMPILE_MEMORY; commands wait until their reservation fits.
+SPRAWDZARKA_ASYNC_CPUS = 0  # 0 = os.cpu_count()
+SPRAWDZARKA_ASYNC_MEMORY = 0  # MB, 0 = 3/4 of the host memory
+SPRAWDZARKA_ASYNC_COMPILE_MEMORY = 512  # MB
+
+# Host directory with judge tools (statically built judge_runner, batch harness), mounted
+# read-only at /judge in every sandbox. judge_runner times each test run, reports CPU time,
+# wall time and peak RSS, and detects OOM kills from the container's cgroup.
+SPRAWDZARKA_JUDGE_TOOLS_ROOT = os.path.join(BASE_DIR, 'judge_tools')
+
+# JVM startup for Java tests. With SPRAWDZARKA_JAVA_CDS a class data sharing archive of the
+# JDK classes that solutions commonly use is built in the background when a worker starts
+# (once per host, again after the image changes) in the judge tools directory, and mapped by
+# every test's JVM instead of loading and verifying those classes again. Until it is ready
+# tests run without it.
+# SPRAWDZARKA_JAVA_OPTIONS are added to every test run; '-XX:TieredStopAtLevel=1' would
+# start faster still, but makes long-running solutions slower. Compare with
+# `python manage.py sandbox_benchmark --lang Java --startup`.
+SPRAWDZARKA_JAVA_CDS = True
+SPRAWDZARKA_JAVA_OPTIONS = ['-XX:+UseSerialGC', '-XX:-UsePerfData']
+
+# Languages whose programs are compiled ahead of time after the regular compilation, so that
+# tests start from native code instead of JIT-compiling it in every run. Supported: 'C#'
+# (mono --aot, the Main.exe.so image is cached together with the compiled program). A failed
+# AOT step is not a compilation error; the program then runs under the JIT.
+SPRAWDZARKA_AOT_LANGUAGES = []
+
+# Runtime startup CPU time per language (ms), added to the time limit of every test and
+# subtracted from the measured times. Calibrate with the "program CPU mean" reported by
+# `python manage.py sandbox_benchmark --lang <language> --startup` on the judging host:
+# the 'tuned' variant for Java, 'aot' for 'C# AOT' (C# with AOT enabled) and 'jit' for 'C#'.
+SPRAWDZARKA_TIME_OVERHEAD = {'C/C++': 0, 'Java': 0, 'C#': 0, 'C# AOT': 0}
+
+# Program output per test. judge_runner kills the program as soon as its stdout exceeds
+# SPRAWDZARKA_OUTPUT_LIMIT (verdict OLE); the worker keeps at most
+# SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD bytes in memory and spills the rest to a temp file.
+SPRAWDZARKA_OUTPUT_LIMIT = 64 * 1024 * 1024  # bytes
+SPRAWDZARKA_OUTPUT_SPILL_THRESHOLD = 1024 * 1024  # bytes
+
+# Admission control: before judging, a worker reserves CPU cores and memory for the solution
+# on its host - per_test/async: SPRAWDZARKA_JUDGE_PARALLELISM cores and that many times
+# (Task.memory_limit + language memory_overhead), batch: one core and one test's memory.
+# A solution that does not fit the free budget goes back to the queue and is retried after
+# SPRAWDZARKA_ADMISSION_RETRY_DELAY seconds (possibly on another worker). Reservations of all
+# worker processes on a host are kept in SPRAWDZARKA_ADMISSION_LEDGER.
+SPRAWDZARKA_ADMISSION = True
+SPRAWDZARKA_ADMISSION_CPUS = 0  # 0 = os.cpu_count()
+SPRAWDZARKA_ADMISSION_MEMORY = 0  # MB, 0 = 3/4 of the host memory
+SPRAWDZARKA_ADMISSION_RETRY_DELAY = 2  # s
+SPRAWDZARKA_ADMISSION_LEDGER = os.path.join(tempfile.gettempdir(), 'sprawdzarka_admission.json')
+
+# CPU pinning: every sandbox that runs tests gets a dedicated core for the duration of the
+# solution's tests (docker --cpuset-cpus / cpuset.cpus of the native sandbox cgroup), handed out
+# from a host-wide pool shared by all worker processes (SPRAWDZARKA_CPU_PINNING_CPUS, cpuset list
+# syntax like '2-15', None = every core the worker may run on). A solution gets at most as many
+# parallel sandboxes as there are free cores. With SPRAWDZARKA_CPU_PINNING_SIBLINGS the
+# hyperthread siblings of a handed-out core are reserved too and stay idle. The native backend
+# needs the cpuset controller delegated as well. Admission control then budgets pool cores.
+SPRAWDZARKA_CPU_PINNING = False
+SPRAWDZARKA_CPU_PINNING_CPUS = None
+SPRAWDZARKA_CPU_PINNING_SIBLINGS = False
+SPRAWDZARKA_CPU_PINNING_LEDGER = os.path.join(tempfile.gettempdir(), 'sprawdzarka_cpuset.json')
+
+# Verdict cache in the shared cache (Redis): a solution judged 'done' is remembered under
+# (source hash, language, task test-set fingerprint). The fingerprint covers test contents,
+# group membership, group points and the task time/memory limits, so any change to tests,
+# groups or limits yields new keys. A byte-identical submission gets a copy of the test
+# results and points right away and is never queued.
+SPRAWDZARKA_VERDICT_CACHE = True
+SPRAWDZARKA_VERDICT_CACHE_TIMEOUT = 7 * 24 * 3600  # s
+
+# Pipelined judging: the judge_* queues only compile; the compiled program is stored under
+# SPRAWDZARKA_ARTIFACT_ROOT and its handle is queued on the language's run_* queue, where
+# the tests run. Compile and run workers are started separately with their own concurrency.
+# The artifact root must be shared by both kinds of workers, like media. Artifacts left
+# behind by crashed workers are removed after SPRAWDZARKA_ARTIFACT_MAX_AGE.
+SPRAWDZARKA_PIPELINE = False
+SPRAWDZARKA_ARTIFACT_ROOT = os.path.join(BASE_DIR, 'media', 'artifacts')
+SPRAWDZARKA_ARTIFACT_MAX_AGE = 24 * 3600  # s
+
+# Per-worker-process cache of memory-mapped test files (inputs and expected outputs), keyed
+# by test id and file identity, so re-uploaded tests are read again. LRU above the size.
+SPRAWDZARKA_TEST_CACHE = True
+SPRAWDZARKA_TEST_CACHE_SIZE = 256  # MB per worker process
+
+# Fair share: new solutions wait in the database and are handed to Celery round-robin across
+# authors, with at most SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT solutions of one author per contest
+# queued or judged at a time. Contest.send_limit caps how many unjudged solutions an author
+# may have in a contest. Solutions dispatched more than SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT_TIMEOUT
+# ago and still unjudged (e.g. after a worker crash) count towards neither limit.
+SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT = 1
+SPRAWDZARKA_FAIR_SHARE_IN_FLIGHT_TIMEOUT = 1800  # s, older in-flight solutions stop counting
+SPRAWDZARKA_FAIR_SHARE_SCAN = 1000  # oldest waiting solutions considered per dispatch
+# Besides on submission and after each judged solution, waiting solutions are dispatched
+# periodically by Celery beat, so nothing stays stuck after a lost message or a worker crash.
+SPRAWDZARKA_DISPATCH_INTERVAL = 30  # s
+
+# Mass rejudge: every SPRAWDZARKA_REJUDGE_INTERVAL seconds up to SPRAWDZARKA_REJUDGE_RATE
+# solutions of a batch are sent to the judge at the lowest priority, with at most
+# SPRAWDZARKA_REJUDGE_MAX_IN_FLIGHT of them queued or being judged at once. An item still not
+# started SPRAWDZARKA_REJUDGE_ITEM_TIMEOUT seconds after it was queued (lost message) is sent
+# again, and one started longer ago and still unfinished (worker crash) is marked as failed.
+SPRAWDZARKA_REJUDGE_INTERVAL = 5  # s
+SPRAWDZARKA_REJUDGE_RATE = 10
+SPRAWDZARKA_REJUDGE_MAX_IN_FLIGHT = 20
+SPRAWDZARKA_REJUDGE_ITEM_TIMEOUT = 3600  # s
+
+# Rescoring after a scoring change (groups, points, test membership) works from stored
+# test results only, SPRAWDZARKA_RESCORE_BATCH solutions per query/update round.
+SPRAWDZARKA_RESCORE_BATCH = 2000